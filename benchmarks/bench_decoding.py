@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of response decoding in TrendReq._get_data.
+
+Compares the former path (response.text charset detection, sliced string copy, json.loads) with
+pytrends.parsing.loads_trimmed over the fixtures of explore, multiline, relatedsearches and comparedgeo responses.
+
+Example query:
+python -m benchmarks.bench_decoding -n 2000
+"""
+
+import os, argparse, json, timeit
+
+import requests
+
+from pytrends import parsing
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+# endpoint fixture -> trim_chars used by TrendReq
+FIXTURES = {'explore.txt': 4, 'multiline.txt': 5, 'relatedsearches.txt': 5, 'comparedgeo.txt': 5}
+
+
+def _response(content):
+    """ A requests response as google sends it: json body without charset in the Content-Type header.
+    """
+    response = requests.Response()
+    response._content = content
+    response.status_code = 200
+    response.headers['Content-Type'] = 'application/json'
+    return response
+
+
+def text_path(content, trim_chars):
+    # a new response every time so that requests does not reuse a decoded text
+    return json.loads(_response(content).text[trim_chars:])
+
+
+def bytes_path(content, trim_chars, backend=None):
+    return parsing.loads_trimmed(_response(content).content, trim_chars, backend=backend)
+
+
+def run(number):
+    backends = ['json'] + [name for name in ('ujson', 'orjson') if getattr(parsing, name) is not None]
+    results = dict()
+    for fixture, trim_chars in sorted(FIXTURES.items()):
+        with open(os.path.join(FIXTURES_DIR, fixture), 'rb') as fixture_file:
+            content = fixture_file.read()
+        assert text_path(content, trim_chars) == bytes_path(content, trim_chars)
+        timings = {'text+json.loads': timeit.timeit(lambda: text_path(content, trim_chars), number=number)}
+        for backend in backends:
+            timings['bytes+{0}'.format(backend)] = timeit.timeit(
+                lambda: bytes_path(content, trim_chars, backend), number=number)
+        results[fixture] = {name: 1e6 * seconds / number for name, seconds in timings.items()}
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', help='decodings per fixture and path', type=int, default=1000)
+    args = parser.parse_args()
+
+    for fixture, timings in run(args.number).items():
+        baseline = timings['text+json.loads']
+        print('>>> {0}'.format(fixture))
+        for name, usec in sorted(timings.items(), key=lambda x: -x[1]):
+            print('{0:>20}: {1:9.1f} us/call, speedup x{2:.2f}'.format(name, usec, baseline / usec))
@@ -0,0 +1,201 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Offline benchmark suite running the crawlers against the local mock server of benchmarks.mock_server.
+
+Measures, at every concurrency level:
+    payload      build_payload then interest_over_time round trips of request2.TrendReq, one client per thread
+    dailydata    dailydata.get_daily_data over two years (one monthly and 24 daily requests)
+    dailydata_multiplex
+                 the same with multiplex, five months per payload (one monthly and 5 daily requests)
+    crawler      crawler.BatchCrawler over synthetic records
+plus the response decoding cost of benchmarks.bench_decoding. Results are written to a json report; pass the
+report of a previous run as baseline to print the speedup of every throughput.
+
+Example query:
+python -m benchmarks.bench_suite -o report.json --latency 0.02 -c 1 4 8
+python -m benchmarks.bench_suite -o new.json --baseline report.json
+"""
+
+import os, argparse, json, platform, shutil, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks import bench_decoding
+from benchmarks.mock_server import MockTrendsServer
+from pytrends import crawler, dailydata, parsing, request, request2
+from pytrends.cookies import CookieCache
+from pytrends.exceptions import ResponseError
+from pytrends.ratelimit import RateLimiter
+from pytrends.tokens import DEFAULT_TOKEN_CACHE
+
+REPORT_VERSION = 1
+
+
+def _rate_limiter():
+    """ No rate limit, and short pauses on injected 429s so that a run does not stall.
+    """
+    return RateLimiter(backoff=.05, max_backoff=.5)
+
+
+def _reset(server):
+    """ Zero the server counters and forget the tokens of previous runs.
+    """
+    server.reset()
+    DEFAULT_TOKEN_CACHE.clear()
+
+
+def _summary(server, latencies, seconds):
+    latencies = np.asarray(latencies)
+    num_requests = sum(server.hits.values())
+    return {'seconds': seconds,
+            'requests': num_requests,
+            'throttled': server.num_throttled,
+            'requests_per_sec': num_requests / seconds,
+            'p50_ms': 1e3 * float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p95_ms': 1e3 * float(np.percentile(latencies, 95)) if len(latencies) else None}
+
+
+def bench_payload(server, concurrency, number):
+    """ number build_payload + interest_over_time round trips spread over concurrency threads.
+    """
+    cookie_cache = CookieCache()
+
+    def roundtrip(idx):
+        trends = clients[idx % concurrency]
+        start = time.perf_counter()
+        trends.build_payload(['keyword {0}'.format(idx)], timeframe='2017-01-01 2017-06-30')
+        trends.interest_over_time()
+        return time.perf_counter() - start
+
+    clients = [request2.TrendReq(cookie_cache=cookie_cache, rate_limiter=_rate_limiter())
+               for _ in range(concurrency)]
+    _reset(server)
+    start = time.perf_counter()
+    latencies = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for result in [pool.submit(roundtrip, idx) for idx in range(number)]:
+            try:
+                latencies.append(result.result())
+            except Exception:
+                pass
+    seconds = time.perf_counter() - start
+    result = _summary(server, latencies, seconds)
+    result.update(payloads=len(latencies), payloads_per_sec=len(latencies) / seconds)
+    return result
+
+
+def bench_dailydata(server, concurrency, multiplex=False):
+    """ Daily data of one word over 2016-2017, the months five per payload if multiplex.
+    """
+    _reset(server)
+    start = time.perf_counter()
+    error = None
+    try:
+        dailydata.get_daily_data('benchmark', 2016, 1, 2017, 12, verbose=False, rate_limiter=_rate_limiter(),
+                                 max_workers=concurrency, multiplex=multiplex)
+    except ResponseError as e:
+        # every payload is retried three times, four 429s in a row abort the run
+        error = str(e)
+    seconds = time.perf_counter() - start
+    result = _summary(server, [], seconds)
+    result.update(error=error)
+    return result
+
+
+def bench_crawler(server, concurrency, number):
+    """ number records crawled by BatchCrawler, each a topic lookup plus its query periods.
+    """
+    work_dir = tempfile.mkdtemp(prefix='pytrends-bench-')
+    try:
+        input_path = os.path.join(work_dir, 'queries.json')
+        with open(input_path, 'w') as input_file:
+            for idx in range(number):
+                input_file.write(json.dumps({'keyword': 'artist {0} - song {0}'.format(idx),
+                                             'gt_queries': '"artist {0}" "song {0}"'.format(idx),
+                                             'start_date': '2015-{0:02d}-01'.format(1 + idx % 12)}) + '\n')
+        batch_crawler = crawler.BatchCrawler(os.path.join(work_dir, 'state'), max_workers=concurrency,
+                                             rate_limiter=_rate_limiter())
+        _reset(server)
+        start = time.perf_counter()
+        try:
+            num_crawled = batch_crawler.run(input_path, os.path.join(work_dir, 'out.json'))
+        finally:
+            batch_crawler.close()
+        seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir)
+    result = _summary(server, [], seconds)
+    result.update(records=num_crawled, records_per_sec=num_crawled / seconds)
+    return result
+
+
+def run(concurrency_levels=(1, 4, 8), latency=.02, throttle_every=0, payloads=64, records=8, decodings=500):
+    results = {'decoding_us': bench_decoding.run(decodings)}
+    with MockTrendsServer(latency=latency, throttle_every=throttle_every) as server, \
+            server.patched(request.TrendReq, request2.TrendReq):
+        for concurrency in concurrency_levels:
+            level = 'concurrency_{0}'.format(concurrency)
+            results.setdefault('payload', {})[level] = bench_payload(server, concurrency, payloads)
+            results.setdefault('dailydata', {})[level] = bench_dailydata(server, concurrency)
+            results.setdefault('dailydata_multiplex', {})[level] = bench_dailydata(server, concurrency, True)
+            results.setdefault('crawler', {})[level] = bench_crawler(server, concurrency, records)
+    return results
+
+
+def report(results, config):
+    return {'version': REPORT_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'json_backend': parsing.JSON_BACKEND, 'numpy': np.__version__},
+            'config': config,
+            'results': results}
+
+
+def _flatten(tree, prefix=''):
+    for key, value in tree.items():
+        name = '{0}.{1}'.format(prefix, key) if prefix else key
+        if isinstance(value, dict):
+            for item in _flatten(value, name):
+                yield item
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(baseline, current):
+    """ Print every throughput of current next to its baseline value.
+    """
+    if baseline.get('version') != current['version']:
+        print('>>> Baseline report version {0} differs, skipping comparison'.format(baseline.get('version')))
+        return
+    old = dict(_flatten(baseline['results']))
+    for name, value in _flatten(current['results']):
+        if name.endswith('_per_sec') and old.get(name):
+            print('{0:>45}: {1:10.1f} -> {2:10.1f}, x{3:.2f}'.format(name, old[name], value, value / old[name]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', help='json report path', default='benchmark_report.json')
+    parser.add_argument('-c', '--concurrency', help='concurrency levels', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--latency', help='seconds the mock server waits per request', type=float, default=.02)
+    parser.add_argument('--throttle-every', help='mock server answers every nth request with a 429', type=int,
+                        default=0)
+    parser.add_argument('--payloads', help='payload round trips per level', type=int, default=64)
+    parser.add_argument('--records', help='records crawled per level', type=int, default=8)
+    parser.add_argument('--decodings', help='decodings per fixture and path', type=int, default=500)
+    parser.add_argument('--baseline', help='previous report to compare with', default=None)
+    args = parser.parse_args()
+
+    config = {'concurrency': args.concurrency, 'latency': args.latency, 'throttle_every': args.throttle_every,
+              'payloads': args.payloads, 'records': args.records, 'decodings': args.decodings}
+    current = report(run(args.concurrency, args.latency, args.throttle_every, args.payloads, args.records,
+                         args.decodings), config)
+    with open(args.output, 'w') as output_file:
+        json.dump(current, output_file, indent=2, sort_keys=True)
+    print('>>> Report written to {0}'.format(args.output))
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            compare(json.load(baseline_file), current)
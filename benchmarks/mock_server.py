@@ -0,0 +1,341 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Google Trends API, serving the endpoints used by the TrendReq clients over plain http.
+
+explore and widgetdata/multiline answers are generated from the request, so that every keyword list and timeframe
+gets consistent widgets and timelines: daily points for timeframes up to 269 days, monthly points otherwise, the
+busiest point at 100. Items of one request may cover different timeframes, see timeline(). autocomplete suggests
+a song echoing the query, and the hot searches of every region shift by one entry every trending_period requests.
+Hot searches carry an ETag, and a request whose If-None-Match matches the current body is answered with a 304.
+widgetdata/relatedsearches, widgetdata/comparedgeo and the category picker replay the fixtures of benchmarks/fixtures,
+and so does multiline for relative timeframes like 'today 5-y'. The fixtures are synthetic, written in the shape of
+google's responses rather than recorded from it. Every api answer but the hot searches carries the garbage prefix
+google sends.
+Latency and 429s can be injected to reproduce a throttling server.
+
+Example:
+with MockTrendsServer(latency=0.02) as server, server.patched(TrendReq):
+    pytrend = TrendReq()
+    pytrend.build_payload(['Pizza'], timeframe='2017-01-01 2017-06-30')
+    pytrend.interest_over_time()
+
+or stand-alone, for clients whose *_URL attributes are set to its urls, see url():
+python -m benchmarks.mock_server -p 8080 --latency 0.05 --throttle-every 20
+"""
+
+import os, argparse, json, socket, threading, time, zlib
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse, urlunparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# longest timeframe google answers with daily points
+MAX_DAILY_DAYS = 269
+
+EXPLORE_PREFIX = b")]}'\n"
+WIDGETDATA_PREFIX = b")]}',\n"
+
+
+def _parse_timeframe(timeframe):
+    """ (start, end) dates of an absolute 'YYYY-MM-DD YYYY-MM-DD' timeframe, None otherwise.
+    """
+    try:
+        start, end = timeframe.split()
+        return date.fromisoformat(start), date.fromisoformat(end)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _keyword_restriction(keyword):
+    return {'keyword': [{'type': 'BROAD', 'value': keyword}]}
+
+
+def _token(*parts):
+    return 'APP6_UEAAAAA{0:08X}'.format(zlib.crc32(json.dumps(parts, sort_keys=True).encode('utf-8')))
+
+
+def explore_widgets(req):
+    """ Widgets google returns for an explore request: one time series and one geo map comparing all keywords,
+    then related topics and queries of every keyword.
+    """
+    items = req.get('comparisonItem', [])
+    options = {'property': req.get('property', ''), 'backend': 'IZG', 'category': req.get('category', 0)}
+    timeframe = items[0]['time'] if items else 'today 12-m'
+    geo = items[0].get('geo', '') if items else ''
+    geo_restriction = {'country': geo} if geo else {}
+    spans = [_parse_timeframe(item['time']) for item in items] or [None]
+    resolution = 'DAY' if None not in spans and max((end - start).days for start, end in spans) < MAX_DAILY_DAYS \
+        else 'MONTH'
+
+    comparison = [{'geo': {'country': item['geo']} if item.get('geo') else {},
+                   'complexKeywordsRestriction': _keyword_restriction(item['keyword']), 'time': item['time']}
+                  for item in items]
+    timeseries = {'time': timeframe, 'resolution': resolution, 'locale': 'en-US',
+                  'comparisonItem': comparison, 'requestOptions': options}
+    geo_map = {'geo': geo_restriction, 'comparisonItem': comparison, 'resolution': 'REGION' if geo else 'COUNTRY',
+               'locale': 'en-US', 'requestOptions': options}
+    widgets = [{'id': 'TIMESERIES', 'title': 'Interest over time', 'request': timeseries,
+                'token': _token('TIMESERIES', timeseries), 'type': 'fe_line_chart'},
+               {'id': 'GEO_MAP', 'title': 'Compared breakdown by region', 'request': geo_map,
+                'token': _token('GEO_MAP', geo_map), 'type': 'fe_geo_chart_explore'}]
+    for idx, item in enumerate(items):
+        suffix = '' if len(items) == 1 else '_{0}'.format(idx)
+        for widget_id, keyword_type in (('RELATED_TOPICS', 'ENTITY'), ('RELATED_QUERIES', 'QUERY')):
+            request = {'restriction': {'geo': geo_restriction, 'time': item['time'],
+                                       'complexKeywordsRestriction': _keyword_restriction(item['keyword'])},
+                       'keywordType': keyword_type, 'metric': ['TOP', 'RISING'], 'trendinessSettings': {},
+                       'requestOptions': options, 'language': 'en'}
+            widgets.append({'id': widget_id + suffix, 'request': request, 'token': _token(widget_id, request),
+                            'type': 'fe_related_searches'})
+    return {'widgets': widgets, 'keywords': [{'keyword': item['keyword']} for item in items]}
+
+
+def suggestions(query):
+    """ Autocomplete answer for query: a song whose title and artist both echo the query, so that song lookups
+    match, then a plain topic.
+    """
+    title = query.title()
+    mid = '{0:08x}'.format(zlib.crc32(query.encode('utf-8')))
+    return {'default': {'topics': [{'mid': '/m/0' + mid, 'title': title, 'type': 'Song by ' + title},
+                                   {'mid': '/g/11' + mid, 'title': title, 'type': 'Topic'}]}}
+
+
+# regions of the hot searches payload
+TRENDING_REGIONS = ('united_states', 'united_kingdom', 'japan', 'germany', 'india')
+
+
+def trending_searches(cycle):
+    """ Hot searches of every region on the cycle-th request: twenty entries, one replaced per cycle.
+    """
+    return {region: ['{0} trend {1}'.format(region, idx) for idx in range(cycle, cycle + 20)]
+            for region in TRENDING_REGIONS}
+
+
+def _volume(keyword, day):
+    """ Deterministic daily search volume of keyword.
+    """
+    seed = zlib.crc32(keyword.encode('utf-8'))
+    return 1 + (seed % 50) + (zlib.crc32('{0}{1}'.format(seed, day.toordinal()).encode('ascii')) % 50)
+
+
+def _points(keyword, start, end, daily):
+    """ (date, volume) points of keyword from start to end, by day or summed by month.
+    """
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    if daily:
+        return [(day, _volume(keyword, day)) for day in days]
+    months = dict()
+    for day in days:
+        month = day.replace(day=1)
+        months[month] = months.get(month, 0) + _volume(keyword, day)
+    return sorted(months.items())
+
+
+def _column(day, value):
+    return {'time': str(int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())),
+            'formattedTime': day.strftime('%b %d, %Y'), 'formattedAxisTime': day.strftime('%b %d'),
+            'value': value, 'hasData': value > 0, 'formattedValue': str(value)}
+
+
+def timeline(req):
+    """ timelineData of a multiline request with absolute timeframes, None for relative ones.
+
+    Volumes depend on the keyword and geo of each item. Items sharing one timeframe get one point per date with a
+    value per item. Items over different timeframes get
+    their points under columnData, aligned by position, like google compares date ranges.
+    """
+    items = req['comparisonItem']
+    spans = [_parse_timeframe(item.get('time', req.get('time'))) for item in items]
+    if not spans or None in spans:
+        return None
+    # the volume of a keyword depends on the geo of its item
+    keywords = [item['complexKeywordsRestriction']['keyword'][0]['value'] +
+                ''.join('@' + geo for geo in item.get('geo', {}).values()) for item in items]
+    daily = max((end - start).days + 1 for start, end in spans) <= MAX_DAILY_DAYS
+    series = [_points(keyword, start, end, daily) for keyword, (start, end) in zip(keywords, spans)]
+    peak = max([value for points in series for _, value in points] or [1])
+    series = [[(day, int(round(100. * value / peak))) for day, value in points] for points in series]
+    if len(set(spans)) == 1:
+        data = []
+        for idx, (day, _) in enumerate(series[0]):
+            point = _column(day, 0)
+            values = [points[idx][1] for points in series]
+            point.update(value=values, hasData=[value > 0 for value in values],
+                         formattedValue=[str(value) for value in values])
+            data.append(point)
+        return data
+    return [{'columnData': [_column(*points[idx]) if idx < len(points) else {'hasData': False, 'value': 0}
+                            for points in series]}
+            for idx in range(max(len(points) for points in series))]
+
+
+class MockTrendsServer(object):
+    """ Threaded http server answering like trends.google.com, see the module docstring.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0., throttle_every=0, fixtures_dir=FIXTURES_DIR,
+                 trending_period=1):
+        """ :param host: interface to listen on
+        :param port: port to listen on, 0 picks a free one
+        :param latency: seconds every api request waits before being answered
+        :param throttle_every: answer every nth api request with a 429, 0 never does
+        :param fixtures_dir: directory of the synthetic responses
+        :param trending_period: number of hot searches requests answered with the same body
+        """
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.trending_period = trending_period
+        self.fixtures = dict()
+        for name in ('multiline', 'relatedsearches', 'comparedgeo', 'category'):
+            with open(os.path.join(fixtures_dir, '{0}.txt'.format(name)), 'rb') as fixture_file:
+                self.fixtures[name] = fixture_file.read()
+        # endpoint -> number of requests received, 429s included
+        self.hits = dict()
+        self.num_throttled = 0
+        self._num_api_requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    def url(self, url):
+        """ The mock counterpart of a google trends url, same path on this server.
+        """
+        parsed = urlparse(url)
+        return urlunparse(parsed._replace(scheme='http', netloc=urlparse(self.base_url).netloc))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={'poll_interval': .05},
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextmanager
+    def patched(self, *classes):
+        """ Point the *_URL attributes of the client classes to this server while in the block.
+        """
+        saved = []
+        for cls in classes:
+            for name in dir(cls):
+                if name.endswith('_URL'):
+                    saved.append((cls, name, cls.__dict__.get(name)))
+                    setattr(cls, name, self.url(getattr(cls, name)))
+        try:
+            yield self
+        finally:
+            for cls, name, value in reversed(saved):
+                if value is None:
+                    delattr(cls, name)
+                else:
+                    setattr(cls, name, value)
+
+    def reset(self):
+        with self._lock:
+            self.hits = dict()
+            self.num_throttled = 0
+            self._num_api_requests = 0
+
+    def respond(self, path, query, headers=None):
+        """ (status, content type, body, extra headers) of a GET request.
+        """
+        headers = headers or {}
+        segments = path.rstrip('/').split('/')
+        endpoint = 'autocomplete' if 'autocomplete' in segments[:-1] else segments[-1]
+        if endpoint == '':
+            return 200, 'text/html; charset=UTF-8', b'<html></html>', [('Set-Cookie', 'NID=mock; Path=/')]
+        if endpoint not in ('explore', 'multiline', 'relatedsearches', 'comparedgeo', 'category', 'autocomplete',
+                            'data'):
+            return 404, 'text/html; charset=UTF-8', b'Not Found', []
+        with self._lock:
+            self.hits[endpoint] = self.hits.get(endpoint, 0) + 1
+            self._num_api_requests += 1
+            throttled = self.throttle_every > 0 and self._num_api_requests % self.throttle_every == 0
+            if throttled:
+                self.num_throttled += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if throttled:
+            return 429, 'text/html; charset=UTF-8', b'<html>Too Many Requests</html>', []
+        try:
+            req = json.loads(query.get('req', ['{}'])[0])
+        except ValueError:
+            return 400, 'text/html; charset=UTF-8', b'Bad Request', []
+        if endpoint == 'data':
+            body = json.dumps(trending_searches(1 + (self.hits['data'] - 1) // self.trending_period)).encode('utf-8')
+            etag = '"{0:08x}"'.format(zlib.crc32(body))
+            if headers.get('If-None-Match') == etag:
+                return 304, 'application/json; charset=utf-8', b'', [('ETag', etag)]
+            return 200, 'application/json; charset=utf-8', body, [('ETag', etag)]
+        elif endpoint == 'autocomplete':
+            body = WIDGETDATA_PREFIX + json.dumps(suggestions(unquote(segments[-1]))).encode('utf-8')
+        elif endpoint == 'explore':
+            body = EXPLORE_PREFIX + json.dumps(explore_widgets(req)).encode('utf-8')
+        elif endpoint == 'multiline' and timeline(req) is not None:
+            body = WIDGETDATA_PREFIX + json.dumps({'default': {'timelineData': timeline(req)}}).encode('utf-8')
+        else:
+            body = self.fixtures[endpoint]
+        return 200, 'application/json; charset=utf-8', body, []
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, so that clients reuse their pooled connections as with google
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                # headers and body are written separately, don't let Nagle delay the body
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                status, content_type, body, headers = server.respond(parsed.path, parse_qs(parsed.query), self.headers)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help='interface to listen on', default='127.0.0.1')
+    parser.add_argument('-p', '--port', help='port to listen on', type=int, default=8080)
+    parser.add_argument('--latency', help='seconds added to every api request', type=float, default=0.)
+    parser.add_argument('--throttle-every', help='answer every nth api request with a 429', type=int, default=0)
+    args = parser.parse_args()
+
+    mock = MockTrendsServer(args.host, args.port, latency=args.latency, throttle_every=args.throttle_every)
+    print('>>> Serving google trends on {0}, ctrl-c to stop'.format(mock.base_url))
+    try:
+        mock._httpd.serve_forever()
+    except KeyboardInterrupt:
+        mock._httpd.server_close()
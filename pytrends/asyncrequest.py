@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio flavour of the google trends crawler in request2.
+AsyncTrendReq wraps a request2.TrendReq, which holds the payload state, session and caches and builds the arguments of
+every request, and only awaits an async transport to send them. Widget requests of one payload and independent payloads
+are fetched concurrently, bounded by a semaphore.
+"""
+
+import asyncio
+from functools import partial
+
+from pytrends import exceptions
+from pytrends.categories import default_path, load_categories, stored_categories
+from pytrends.parsing import geo_timeline_frame, related_frame
+from pytrends.request2 import TrendReq
+
+
+class ExecutorTransport(object):
+    """ Default transport: runs the blocking TrendReq._get_data of a client in an executor.
+
+    Requests keep going through the client's pooled session and cookie cache.
+    """
+
+    def __init__(self, client, executor=None):
+        """ :param client: the TrendReq whose _get_data performs the request
+        :param executor: a concurrent.futures executor, None uses the loop default executor
+        """
+        self.client = client
+        self.executor = executor
+
+    async def __call__(self, url, method=TrendReq.GET_METHOD, trim_chars=0, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(
+            self.client._get_data, url, method=method, trim_chars=trim_chars, **kwargs))
+
+
+class AsyncTrendReq(object):
+    """
+    Google Trends API with coroutine methods, wrapping a request2.TrendReq
+    """
+
+    def __init__(self, client=None, transport=None, max_concurrency=5, **kwargs):
+        """
+        client is the TrendReq holding the payload state, session and caches,
+        one is built from the other keyword arguments if None
+        transport is an async callable (url, method, trim_chars, **kwargs) returning the parsed json,
+        e.g. a local stand-in for tests; defaults to running TrendReq._get_data of client in an executor
+        max_concurrency bounds the number of requests in flight
+        """
+        self.client = client if client is not None else TrendReq(**kwargs)
+        self.transport = transport if transport is not None else ExecutorTransport(self.client)
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+
+    @property
+    def kw_list(self):
+        return self.client.kw_list
+
+    @property
+    def token_cache(self):
+        return self.client.token_cache
+
+    async def _get_data_async(self, url, method=TrendReq.GET_METHOD, trim_chars=0, **kwargs):
+        """Send a request through the transport once a concurrency slot is free"""
+        # created lazily so that it belongs to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await self.transport(url, method=method, trim_chars=trim_chars, **kwargs)
+
+    async def categories(self, refresh=False, path=None):
+        """Return the category tree, see TrendReq.categories, downloading it through the transport"""
+        client = self.client
+        path = path or default_path(client.hl)
+        tree = None if refresh else stored_categories(path)
+        if tree is None:
+            data = await self._get_data_async(**client._categories_args())
+            tree = load_categories(lambda: data, path=path, refresh=True)
+        return tree
+
+    async def _category_id(self, cat):
+        """Category id of a build_payload cat given by id or by name"""
+        if isinstance(cat, int):
+            return cat
+        return (await self.categories()).resolve(cat)
+
+    async def build_payload(self, kw_list, cat=0, timeframe='today 5-y', geo='',
+                            gprop=''):
+        """Create the payload for related queries, interest over time and interest by region"""
+        self.client._set_payload(kw_list, await self._category_id(cat), timeframe, geo, gprop)
+        # get tokens
+        await self._tokens()
+        return
+
+    async def build_payload_timeframes(self, keyword, timeframes, cat=0, geo='', gprop=''):
+        """Create the payload comparing keyword over up to five timeframes in one explore request"""
+        timeframes = list(timeframes)
+        self.client._set_payload(TrendReq._window_keywords(keyword, timeframes), await self._category_id(cat),
+                                 timeframes, geo, gprop)
+        await self._tokens()
+        return
+
+    async def prefetch_tokens(self, kw_list, timeframes, cat=0, geo='', gprop=''):
+        """Fetch the tokens of kw_list for every timeframe concurrently
+        Returns a dict mapping each timeframe to its widgets, failed timeframes are left out
+        """
+        client = self.client
+        geo = geo or client.geo
+        cat = await self._category_id(cat)
+        responses = await asyncio.gather(*[self._widgets_async(
+            *client._explore_request(kw_list, cat, timeframe, geo, gprop)) for timeframe in timeframes],
+            return_exceptions=True)
+        result = dict()
+        for timeframe, widget_dict in zip(timeframes, responses):
+            if isinstance(widget_dict, exceptions.ResponseError):
+                print(widget_dict)
+            elif isinstance(widget_dict, BaseException):
+                raise widget_dict
+            else:
+                result[timeframe] = widget_dict
+        return result
+
+    async def _tokens(self):
+        """Makes request to Google to get API tokens for interest over time, interest by region and related queries"""
+        widget_dict = await self._widgets_async(self.client.token_payload, self.client.token_key)
+        self.client._assign_widgets(widget_dict)
+        return
+
+    async def _widgets_async(self, token_payload, token_key=None):
+        """Widgets of an explore request, from the token cache if they were fetched recently"""
+        client = self.client
+        widget_dict = client._cached_widgets(token_key)
+        if widget_dict is None:
+            widget_dict = client._store_widgets(
+                token_key, token_payload, await self._get_data_async(**client._explore_args(token_payload)))
+        return widget_dict
+
+    async def interest_over_time(self):
+        """Request data from Google's Interest Over Time section and return a dataframe"""
+        client = self.client
+        req_json = await self._get_data_async(
+            **client._widget_args(client.INTEREST_OVER_TIME_URL, client.interest_over_time_widget))
+        return client._parse_interest_over_time(req_json, client.kw_list)
+
+    async def interest_over_time_windows(self):
+        """Request the Interest Over Time section of a build_payload_timeframes payload and return
+        one dataframe per timeframe
+        """
+        client = self.client
+        if not client.timeframes:
+            raise ValueError('No timeframes, call build_payload_timeframes first')
+        req_json = await self._get_data_async(
+            **client._widget_args(client.INTEREST_OVER_TIME_URL, client.interest_over_time_widget))
+        return client._parse_interest_over_time_windows(req_json, client.kw_list[0], len(client.timeframes))
+
+    async def interest_over_time_geos(self, keyword, geos, cat=0, timeframe='today 5-y', gprop='', anchor=None):
+        """Request the interest over time of keyword in every geo of geos, five geos per payload and
+        all payloads concurrently, see TrendReq.interest_over_time_geos
+        """
+        client = self.client
+        cat = await self._category_id(cat)
+        batches = client._geo_batches(geos, anchor)
+
+        async def fetch(batch):
+            widget_dict = await self._widgets_async(
+                *client._explore_request([keyword] * len(batch), cat, timeframe, batch, gprop))
+            return (await self._get_data_async(**client._widget_args(
+                client.INTEREST_OVER_TIME_URL, client._timeseries_widget(widget_dict))))['default']['timelineData']
+
+        timelines = await asyncio.gather(*[fetch(batch) for batch in batches])
+        return geo_timeline_frame(zip(batches, timelines), anchor=anchor)
+
+    async def interest_by_region(self, resolution='COUNTRY', inc_low_vol=False, inc_geo_code=False):
+        """Request data from Google's Interest by Region section and return a dataframe"""
+        client = self.client
+        req_json = await self._get_data_async(**client._region_args(resolution, inc_low_vol))
+        return client._parse_interest_by_region(req_json, client.kw_list, inc_geo_code)
+
+    async def related_topics(self):
+        """Request data from Google's Related Topics section and return a long format dataframe
+        Widgets of all keywords are fetched concurrently
+        """
+        return await self._related_async(self.client.related_topics_widget_list)
+
+    async def related_queries(self):
+        """Request data from Google's Related Queries section and return a long format dataframe
+        Widgets of all keywords are fetched concurrently
+        """
+        return await self._related_async(self.client.related_queries_widget_list)
+
+    async def _related_async(self, widgets):
+        client = self.client
+        widgets = list(widgets)
+        responses = await asyncio.gather(*[self._get_data_async(
+            **client._widget_args(client.RELATED_QUERIES_URL, widget)) for widget in widgets])
+        return related_frame([(client._widget_keyword(widget), req_json)
+                              for widget, req_json in zip(widgets, responses)])
+
+    async def _payload_over_time(self, kw_list, cat=0, timeframe='today 5-y', geo='', gprop=''):
+        """Fetch tokens then interest over time of one payload without touching the client state"""
+        client = self.client
+        geo = geo or client.geo
+        cat = await self._category_id(cat)
+        widget_dict = await self._widgets_async(*client._explore_request(kw_list, cat, timeframe, geo, gprop))
+        req_json = await self._get_data_async(
+            **client._widget_args(client.INTEREST_OVER_TIME_URL, client._timeseries_widget(widget_dict)))
+        return client._parse_interest_over_time(req_json, kw_list)
+
+    async def interest_over_time_many(self, payloads):
+        """Fetch interest over time of several independent payloads concurrently
+        payloads is a list of dicts with the build_payload arguments (kw_list, cat, timeframe, geo, gprop)
+        Returns the dataframes in the order of payloads
+        """
+        return await asyncio.gather(*[self._payload_over_time(**payload)
+                                      for payload in payloads])
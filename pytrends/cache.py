@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of google trends api responses.
+Responses are stored zlib-compressed in a SQLite file, keyed by a hash of the canonical (url, params) pair,
+and expire after a time to live that depends on the endpoint and on whether the requested timeframe is closed.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+
+# an explicit timeframe: 'YYYY-MM-DD YYYY-MM-DD' or 'YYYY-MM-DDTHH YYYY-MM-DDTHH'
+_EXPLICIT_TIMEFRAME = re.compile(r'^\d{4}-\d{2}-\d{2}(T\d{2})? (\d{4}-\d{2}-\d{2})(T\d{2})?$')
+
+# data of windows ending earlier than this many days ago is final
+CLOSED_AFTER_DAYS = 3
+
+# default time to live in seconds, None never expires
+TOKEN_TTL = 10 * 60
+OPEN_TTL = 60 * 60
+CLOSED_TTL = None
+
+
+def _iter_timeframes(obj):
+    """ Yield every 'time' string of a (nested) request payload.
+    """
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key == 'time' and isinstance(value, str):
+                yield value
+            else:
+                for timeframe in _iter_timeframes(value):
+                    yield timeframe
+    elif isinstance(obj, list):
+        for item in obj:
+            for timeframe in _iter_timeframes(item):
+                yield timeframe
+
+
+def is_closed_timeframe(timeframe, today=None):
+    """ Whether a timeframe is an explicit window that ended long enough ago for its data to be final.
+    Relative timeframes such as 'today 5-y' or 'now 7-d' are never closed.
+    """
+    match = _EXPLICIT_TIMEFRAME.match(timeframe.strip())
+    if match is None:
+        return False
+    end_date = datetime.strptime(match.group(2), '%Y-%m-%d').date()
+    today = today or date.today()
+    return end_date < today - timedelta(days=CLOSED_AFTER_DAYS)
+
+
+def _decode_req(params):
+    req = params.get('req')
+    if isinstance(req, str):
+        try:
+            return json.loads(req)
+        except ValueError:
+            return req
+    return req
+
+
+class ResponseCache(object):
+    """ Size-bounded SQLite store of response bodies with per-endpoint time to live.
+
+    Explore requests return short-lived tokens, so they only live token_ttl seconds. Widget data of closed
+    historical timeframes never changes and lives closed_ttl seconds (forever by default), other widget data
+    lives open_ttl seconds. When the stored bodies exceed max_size bytes the least recently used are evicted.
+    """
+
+    def __init__(self, path=None, max_size=256 * 1024 * 1024, token_ttl=TOKEN_TTL, open_ttl=OPEN_TTL,
+                 closed_ttl=CLOSED_TTL, compress_level=6):
+        """ :param path: SQLite file, defaults to ~/.cache/pytrends/responses.sqlite
+        :param max_size: maximum total size of the compressed bodies in bytes
+        :param token_ttl: time to live of explore token responses
+        :param open_ttl: time to live of responses covering recent or relative timeframes
+        :param closed_ttl: time to live of responses covering closed historical timeframes
+        :param compress_level: zlib compression level
+        """
+        if path is None:
+            path = os.path.join(os.path.expanduser('~'), '.cache', 'pytrends', 'responses.sqlite')
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_size = max_size
+        self.token_ttl = token_ttl
+        self.open_ttl = open_ttl
+        self.closed_ttl = closed_ttl
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                           'key TEXT PRIMARY KEY, url TEXT, expires REAL, accessed REAL, size INTEGER, body BLOB)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self._conn.commit()
+
+    @staticmethod
+    def key(url, params=None):
+        """ Hash of the canonical form of a request.
+
+        The json encoded 'req' parameter is re-encoded with sorted keys. Widget tokens change on every explore
+        request while the data they unlock does not, so the 'token' parameter is left out.
+        """
+        params = dict(params or {})
+        params.pop('token', None)
+        if 'req' in params:
+            params['req'] = _decode_req(params)
+        canonical = json.dumps([url, params], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+    def ttl_for(self, url, params=None):
+        """ Time to live of the response to a request, None if it never expires.
+        """
+        if url.rstrip('/').endswith('/explore'):
+            return self.token_ttl
+        timeframes = list(_iter_timeframes(_decode_req(params or {})))
+        if timeframes and all(is_closed_timeframe(timeframe) for timeframe in timeframes):
+            return self.closed_ttl
+        return self.open_ttl
+
+    def get(self, url, params=None):
+        """ Return the cached body of a request, None if missing or expired.
+        """
+        key = self.key(url, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT expires, body FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[0] is not None and row[0] < now:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+        return zlib.decompress(row[1])
+
+    def set(self, url, params, body, ttl=-1):
+        """ Store the body of a request.
+
+        :param body: response body as bytes
+        :param ttl: time to live in seconds, None never expires, defaults to ttl_for(url, params)
+        """
+        if ttl == -1:
+            ttl = self.ttl_for(url, params)
+        if ttl is not None and ttl <= 0:
+            return
+        now = time.time()
+        compressed = zlib.compress(body, self.compress_level)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                               (self.key(url, params), url, None if ttl is None else now + ttl, now,
+                                len(compressed), compressed))
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, url, params=None):
+        """ Drop the cached body of a request, e.g. an explore response whose tokens google refused.
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (self.key(url, params),))
+            self._conn.commit()
+
+    def _evict(self):
+        """ Drop expired entries, then least recently used ones until the cache fits in max_size.
+        """
+        self._conn.execute('DELETE FROM responses WHERE expires IS NOT NULL AND expires < ?', (time.time(),))
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_size:
+            return
+        rows = self._conn.execute('SELECT key, size FROM responses ORDER BY accessed').fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+    def clear(self):
+        """ Drop every cached response.
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Google trends category tree, fetched once from the category picker and kept in a local json file.
+"""
+
+import json
+import os
+import threading
+import time
+
+# the tree barely changes, refresh the local copy once a month
+CATEGORIES_TTL = 30 * 24 * 60 * 60
+
+# path -> CategoryTree loaded by this process
+_TREES = dict()
+_TREES_LOCK = threading.Lock()
+
+
+def default_path(hl='en-US'):
+    """ Local copy of the category tree in language hl, ~/.cache/pytrends/categories-<hl>.json
+    """
+    return os.path.join(os.path.expanduser('~'), '.cache', 'pytrends', 'categories-{0}.json'.format(hl))
+
+
+class CategoryTree(object):
+    """ Category tree with indexes by id, by lower case name and of the chain of parents of every category.
+
+    Nodes are the dicts of the picker response: {'name': ..., 'id': ..., 'children': [...]}, the root being
+    'All categories' with id 0.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        # id -> node
+        self.nodes = dict()
+        # lower case name -> ids, names are not unique across the tree
+        self.names = dict()
+        # id -> tuple of ids from the root down to the category
+        self.chains = dict()
+        stack = [(tree, ())]
+        while stack:
+            node, parent_chain = stack.pop()
+            cat_id = node['id']
+            chain = parent_chain + (cat_id,)
+            self.nodes[cat_id] = node
+            self.chains[cat_id] = chain
+            self.names.setdefault(node['name'].strip().lower(), []).append(cat_id)
+            for child in reversed(node.get('children', [])):
+                stack.append((child, chain))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, cat_id):
+        return cat_id in self.nodes
+
+    def __getitem__(self, cat_id):
+        return self.nodes[cat_id]
+
+    def name(self, cat_id):
+        return self.nodes[cat_id]['name']
+
+    def parent(self, cat_id):
+        """ Id of the parent category, None for the root.
+        """
+        chain = self.chains[cat_id]
+        return chain[-2] if len(chain) > 1 else None
+
+    def path(self, cat_id):
+        """ Names of the categories from the root down to cat_id.
+        """
+        return [self.nodes[ancestor]['name'] for ancestor in self.chains[cat_id]]
+
+    def children(self, cat_id):
+        return [child['id'] for child in self.nodes[cat_id].get('children', [])]
+
+    def find(self, name):
+        """ Ids of the categories called name, case insensitive.
+        """
+        return list(self.names.get(name.strip().lower(), []))
+
+    def resolve(self, cat):
+        """ Id of a category given by id, by numeric string or by name.
+
+        :raise ValueError: if the category does not exist or if several categories carry the name
+        """
+        if isinstance(cat, str) and cat.strip().isdigit():
+            cat = int(cat)
+        if isinstance(cat, int):
+            if cat not in self.nodes:
+                raise ValueError('Unknown category id {0}'.format(cat))
+            return cat
+        ids = self.names.get(cat.strip().lower(), [])
+        if len(ids) == 0:
+            raise ValueError('Unknown category {0!r}'.format(cat))
+        if len(ids) > 1:
+            raise ValueError('Ambiguous category {0!r}: {1}'.format(
+                cat, ', '.join('{0} ({1})'.format(cat_id, ' > '.join(self.path(cat_id))) for cat_id in ids)))
+        return ids[0]
+
+
+def stored_categories(path=None, ttl=CATEGORIES_TTL):
+    """ Return the category tree this process loaded from path, or the one stored at path if younger than ttl seconds,
+    None if it has to be downloaded.
+
+    :param path: json file holding the tree, defaults to default_path()
+    :param ttl: seconds before the file is downloaded again, None keeps it forever
+    :return: a CategoryTree or None
+    """
+    path = path or default_path()
+    with _TREES_LOCK:
+        return _stored(path, ttl)
+
+
+def _stored(path, ttl):
+    if path in _TREES:
+        return _TREES[path]
+    if os.path.exists(path) and (ttl is None or time.time() - os.path.getmtime(path) < ttl):
+        try:
+            with open(path, 'r') as tree_file:
+                _TREES[path] = CategoryTree(json.load(tree_file))
+        except ValueError:
+            # a truncated file, download it again
+            return None
+        return _TREES[path]
+    return None
+
+
+def load_categories(fetch, path=None, ttl=CATEGORIES_TTL, refresh=False):
+    """ Return the category tree stored at path, calling fetch() to download it if missing, older than ttl seconds
+    or if refresh. Trees are also kept in memory, so a process reads each file at most once.
+
+    :param fetch: callable returning the category tree as a dict
+    :param path: json file holding the tree, defaults to default_path()
+    :param ttl: seconds before the file is downloaded again, None keeps it forever
+    :param refresh: download the tree whatever the state of the file
+    :return: a CategoryTree
+    """
+    path = path or default_path()
+    with _TREES_LOCK:
+        if not refresh:
+            stored = _stored(path, ttl)
+            if stored is not None:
+                return stored
+        tree = fetch()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written aside then renamed, so that concurrent readers never see half a file
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as tree_file:
+            json.dump(tree, tree_file)
+        os.replace(tmp_path, path)
+        _TREES[path] = CategoryTree(tree)
+        return _TREES[path]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide cache of the NID cookie that Google Trends requires on its api endpoints.
+"""
+
+import threading
+import time
+
+# response codes telling that google did not accept the cookie we sent
+COOKIE_REJECTED_CODES = (401, 403)
+
+
+class CookieCache(object):
+    """ Thread-safe cache of google cookies with a time to live.
+
+    Cookies are fetched lazily on first use and shared by every crawler holding the same cache.
+    Entries are keyed, e.g. by proxy url, so that each exit ip keeps its own cookie.
+    """
+
+    def __init__(self, ttl=3600):
+        """ :param ttl: seconds before a cached cookie is fetched again, None keeps it until invalidated
+        """
+        self.ttl = ttl
+        self._entries = dict()
+        self._locks = dict()
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def _is_fresh(self, entry):
+        return self.ttl is None or time.monotonic() - entry[0] < self.ttl
+
+    def get(self, key, fetch):
+        """ Return the cookies stored under key, calling fetch() to obtain them if missing or expired.
+
+        :param key: cache key, e.g. the proxy url or None for a direct connection
+        :param fetch: callable returning a dict of cookies
+        :return: a dict of cookies
+        """
+        entry = self._entries.get(key)
+        if entry is not None and self._is_fresh(entry):
+            return entry[1]
+        # only one thread bootstraps a given key, others wait and reuse its result
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry):
+                return entry[1]
+            cookies = fetch()
+            self._entries[key] = (time.monotonic(), cookies)
+            return cookies
+
+    def invalidate(self, key):
+        """ Drop the cookies stored under key, the next get will fetch them again.
+        """
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """ Drop every cached cookie.
+        """
+        self._entries.clear()
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and self._is_fresh(entry)
+
+
+# cache shared by all crawlers of the process unless they are given their own
+DEFAULT_COOKIE_CACHE = CookieCache()
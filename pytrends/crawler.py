@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming, resumable batch crawler of daily search interest.
+
+Input records are read one line at a time and crawled by a pool of workers sharing one rate limiter. Each request
+result (topic lookup, all time monthly interest, every query period) is checkpointed in a compact state file, so a
+crash or a run of 429s only loses the requests in flight: the next run skips finished records without reading the
+output file, and resumes unfinished ones from their last saved query period. Song topics are resolved through a
+topics.TopicIndex kept next to the output, so a keyword seen in any record of any run is never looked up twice.
+
+Example query:
+python -m pytrends.crawler -i data/example_queries.json -o data/example_out.json -w 4 -v
+"""
+
+import argparse, json, logging, os, sys, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from pytrends.cache import ResponseCache
+from pytrends.exceptions import ResponseError
+from pytrends.metrics import MetricsAggregator
+from pytrends.parsing import MAX_COMPARISON_ITEMS
+from pytrends.ratelimit import RateLimiter
+from pytrends.request import TrendReq
+from pytrends.session import build_session
+from pytrends.topics import TopicIndex, TopicResolver
+from pytrends.utils import calendar_days, match_topic, rescale_by_month_weights
+
+# query period from 2009-12-01 to 2017-06-30
+ALL_PERIOD = '2009-12-01 2017-06-30'
+
+# explore requests in flight when prefetching the tokens of a record
+PREFETCH_WORKERS = 4
+
+# time range for backwards querying, every 8 month
+QUERY_PERIODS = ['2016-11-01 2017-06-30', '2016-03-01 2016-10-31', '2015-07-01 2016-02-29',
+                 '2014-11-01 2015-06-30', '2014-03-01 2014-10-31', '2013-07-01 2014-02-28',
+                 '2012-11-01 2013-06-30', '2012-03-01 2012-10-31', '2011-07-01 2012-02-29',
+                 '2010-11-01 2011-06-30', '2010-03-01 2010-10-31', '2009-12-01 2010-02-28']
+
+# set group property
+GPROP = 'youtube'
+
+
+def _to_ranges(indices):
+    """ Compress a set of ints into a sorted list of inclusive [start, end] ranges.
+    """
+    ranges = []
+    for idx in sorted(indices):
+        if ranges and ranges[-1][1] == idx - 1:
+            ranges[-1][1] = idx
+        else:
+            ranges.append([idx, idx])
+    return ranges
+
+
+def match_song(keyword, topics):
+    """ Select the song mid with the highest relevant score from a list of topics.
+
+    :param keyword: 'artist - title'
+    :param topics: autocomplete suggestions or related topics, the latter scored by 'value'
+    :return: the first song topic scored above 40 or whose artist and title contain those of keyword, else None
+    """
+    # every keyword comes with its own topics, an index of them would serve a single lookup
+    return match_topic(keyword, topics)
+
+
+class CrawlState(object):
+    """ Progress of a batch crawl, persisted as an append-only log of json lines.
+
+    Finished records are identified by their line number in the input file. Unfinished records keep the result of
+    every request already made, keyed by step ('topic', the all time period or a query period). On load, and every
+    compact_every appended events, the log is compacted into a single snapshot line holding finished records as ranges,
+    which drops the steps of finished records.
+    """
+
+    def __init__(self, path, compact_every=1000):
+        """ :param path: file of the log
+        :param compact_every: number of events appended between two compactions
+        """
+        self.path = path
+        self.compact_every = compact_every
+        self.done = set()
+        self.steps = dict()
+        self._lock = threading.Lock()
+        self._num_events = 0
+        if os.path.exists(path):
+            self._load()
+        self._compact()
+        self._log = open(path, 'a')
+
+    def _load(self):
+        with open(self.path, 'r') as state_file:
+            for line in state_file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # the last line may be cut short by a crash
+                    continue
+                for start, end in event.get('done', []):
+                    self.done.update(range(start, end + 1))
+                for idx, steps in event.get('steps', {}).items():
+                    self.steps.setdefault(int(idx), {}).update(steps)
+                if 'r' in event:
+                    if 's' in event:
+                        self.steps.setdefault(event['r'], {})[event['s']] = event['v']
+                    else:
+                        self.done.add(event['r'])
+        for idx in self.done:
+            self.steps.pop(idx, None)
+
+    def _compact(self):
+        tmp_path = '{0}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as state_file:
+            state_file.write('{0}\n'.format(json.dumps({'done': _to_ranges(self.done), 'steps': self.steps},
+                                                       separators=(',', ':'))))
+        os.replace(tmp_path, self.path)
+        self._num_events = 0
+
+    def _append(self, event):
+        """ Write event to the log, the lock being held.
+        """
+        self._log.write('{0}\n'.format(json.dumps(event, separators=(',', ':'))))
+        self._log.flush()
+        self._num_events += 1
+        if self._num_events >= self.compact_every:
+            self._log.close()
+            self._compact()
+            self._log = open(self.path, 'a')
+
+    def is_done(self, idx):
+        return idx in self.done
+
+    def get_steps(self, idx):
+        """ Results already fetched for record idx, as a dict step -> value.
+        """
+        with self._lock:
+            return dict(self.steps.get(idx, {}))
+
+    def save_step(self, idx, step, value):
+        with self._lock:
+            self.steps.setdefault(idx, {})[step] = value
+            self._append({'r': idx, 's': step, 'v': value})
+
+    def mark_done(self, idx):
+        with self._lock:
+            self.done.add(idx)
+            self.steps.pop(idx, None)
+            self._append({'r': idx})
+
+    def close(self):
+        self._log.close()
+
+
+def _is_throttled(error):
+    return isinstance(error, ResponseError) and getattr(error.response, 'status_code', None) == 429
+
+
+class BatchCrawler(object):
+    """ Crawl daily search interest of many songs, see the module docstring.
+    """
+
+    def __init__(self, state_path, max_workers=1, rate_limiter=None, cache=None, end_date='2017-06-30',
+                 all_period=ALL_PERIOD, query_periods=QUERY_PERIODS, gprop=GPROP, verbose=False, hooks=None,
+                 multiplex=False, topic_index=None, max_retries=3):
+        """ :param state_path: file checkpointing the progress
+        :param max_workers: number of records crawled concurrently
+        :param rate_limiter: RateLimiter shared by all workers, defaults to one request every 5 secs
+        :param cache: optional ResponseCache
+        :param end_date: end date of all videos
+        :param all_period: period of the monthly interest used to weight query periods
+        :param query_periods: consecutive query periods covering all_period, latest first
+        :param gprop: google property to filter to
+        :param verbose: log every fetched series
+        :param hooks: optional Hooks receiving the request events of all workers
+        :param multiplex: request the query periods of a record five per payload, one comparison item per period.
+            Periods are then relative to the busiest day among them, which rescale_by_month_weights ignores, but
+            quiet periods lose precision since google rounds to integers
+        :param topic_index: TopicIndex of the keywords already resolved, kept across runs if it has a path. Defaults
+            to an index in memory
+        :param max_retries: times a throttled record is crawled again within the run, from its checkpoint
+        """
+        self.state = CrawlState(state_path)
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter(rate=0.2, backoff=60)
+        self.cache = cache
+        self.hooks = hooks
+        self.session = build_session(pool_connections=1, pool_maxsize=max_workers * PREFETCH_WORKERS)
+        self.end_date_str = end_date
+        self.end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
+        self.all_period = all_period
+        self.query_periods = query_periods
+        self.gprop = gprop
+        self.verbose = verbose
+        self.multiplex = multiplex
+        self.max_retries = max_retries
+        self.topic_resolver = TopicResolver(self._suggestions, self._related_topics, index=topic_index,
+                                            match=match_song)
+        self.num_requests = 0
+        self._lock = threading.Lock()
+
+    def _trend_req(self):
+        return TrendReq(session=self.session, rate_limiter=self.rate_limiter, cache=self.cache, hooks=self.hooks)
+
+    def _step(self, idx, steps, step, fetch):
+        """ Return the checkpointed result of step, or fetch and checkpoint it.
+        """
+        if step not in steps:
+            steps[step] = fetch()
+            with self._lock:
+                self.num_requests += 1
+            self.state.save_step(idx, step, steps[step])
+        return steps[step]
+
+    def _interest_over_time(self, query_keyword, timeframe):
+        trends_crawler = self._trend_req()
+        trends_crawler.build_payload(keyword=query_keyword, timeframe=timeframe, gprop=self.gprop)
+        interest = trends_crawler.interest_over_time()
+        return None if interest is None else interest.tolist()
+
+    def _interest_over_time_windows(self, query_keyword, timeframes):
+        trends_crawler = self._trend_req()
+        trends_crawler.build_payload_timeframes(query_keyword, timeframes, gprop=self.gprop)
+        return [None if interest is None else interest.tolist()
+                for interest in trends_crawler.interest_over_time_windows()]
+
+    def _step_windows(self, idx, steps, query_keyword, timeframes):
+        """ Fetch the timeframes not checkpointed yet five per payload, and checkpoint each of them.
+        """
+        timeframes = [timeframe for timeframe in timeframes if timeframe not in steps]
+        for i in range(0, len(timeframes), MAX_COMPARISON_ITEMS):
+            group = timeframes[i:i + MAX_COMPARISON_ITEMS]
+            windows = self._interest_over_time_windows(query_keyword, group)
+            with self._lock:
+                self.num_requests += 1
+            for timeframe, window in zip(group, windows):
+                steps[timeframe] = window
+                self.state.save_step(idx, timeframe, window)
+
+    def _prefetch_tokens(self, query_keyword, timeframes, steps):
+        """ Fetch at once the tokens of the timeframes not checkpointed yet.
+        """
+        timeframes = [timeframe for timeframe in timeframes if timeframe not in steps]
+        if len(timeframes) > 1:
+            self._trend_req().prefetch_tokens(query_keyword, timeframes, gprop=self.gprop,
+                                              max_workers=PREFETCH_WORKERS)
+
+    def _resolve_topic(self, keyword, gt_queries):
+        """ Song topic of keyword, from the topic index, the autocomplete suggestions or the related topics of
+        gt_queries, in that order.
+        """
+        return self.topic_resolver.resolve(keyword, related_query=gt_queries)
+
+    def _suggestions(self, query):
+        return self._trend_req().suggestions(query)
+
+    def _related_topics(self, gt_queries):
+        trends_crawler = self._trend_req()
+        trends_crawler.build_payload(keyword=gt_queries, timeframe=self.all_period, gprop=self.gprop)
+        return trends_crawler.related_topics()
+
+    def crawl_record(self, idx, query_json):
+        """ Crawl one input record and return it with its daily search interest under 'trends'.
+        """
+        start_time = time.time()
+        steps = self.state.get_steps(idx)
+        keyword = query_json['keyword']
+        gt_queries = query_json['gt_queries']
+
+        # get the topic id if no topic exists
+        if 'topic_id' not in query_json:
+            topic_quad = self._step(idx, steps, 'topic', lambda: self._resolve_topic(keyword, gt_queries))
+            topic_id = None
+            if topic_quad is not None:
+                topic_id = topic_quad['mid']
+                query_json.update(topic_quad)
+        else:
+            topic_id = query_json['topic_id']
+
+        start_date_str = query_json['start_date']
+        start_date_obj = datetime.strptime(start_date_str, '%Y-%m-%d')
+        # in Google trends setting, both ends are inclusive
+        num_days = (self.end_date_obj - start_date_obj).days + 1
+
+        if topic_id is None:
+            query_keyword = gt_queries
+            logging.info('>>> Query for term {0}'.format(gt_queries))
+        else:
+            query_keyword = topic_id
+            logging.info('>>> Query for term {0}, topic "{1}", title "{2}", type "{3}", score {4}'.format(
+                gt_queries, topic_id, query_json.get('title'), query_json.get('type'), query_json.get('value')))
+
+        # result dict
+        google_trends = {'start_date': start_date_str, 'end_date': self.end_date_str, 'daily_search': []}
+
+        # ----------- crawl branch 1 -----------
+        # if start date is within the latest query period, we only request once to get daily interest
+        if start_date_str >= self.query_periods[0].split()[0]:
+            query_period = '{0} {1}'.format(start_date_str, self.end_date_str)
+            daily_search = self._step(idx, steps, query_period,
+                                      lambda: self._interest_over_time(query_keyword, query_period))
+            if daily_search is not None:
+                google_trends['daily_search'] = daily_search
+                if self.verbose:
+                    logging.info('start date: {0}; number of days: {1}'.format(start_date_str, len(daily_search)))
+                    logging.info(','.join(map(str, daily_search)))
+            else:
+                logging.error('+++ No enough data for term ({0})'.format(gt_queries))
+        # ----------- crawl branch 2 -----------
+        # otherwise we query monthly data first then rescale to daily data
+        else:
+            num_periods = next((i + 1 for i, period in enumerate(self.query_periods)
+                                if period.split()[0] <= start_date_str), len(self.query_periods))
+            if not self.multiplex:
+                # all tokens up front, the query periods are then requested back to back
+                self._prefetch_tokens(query_keyword, [self.all_period] + self.query_periods[:num_periods], steps)
+            alltime_search = self._step(idx, steps, self.all_period,
+                                        lambda: self._interest_over_time(query_keyword, self.all_period))
+            if alltime_search is None:
+                logging.error('+++ No enough data for term ({0})'.format(gt_queries))
+            else:
+                if self.verbose:
+                    logging.info('>>> ALL TIME query period: {0}'.format(self.all_period))
+                    logging.info('>>> {0}'.format(','.join(map(str, alltime_search))))
+
+                if self.multiplex:
+                    # all query periods up front, five per payload. all_period stays alone, google would return
+                    # the periods of its payload by month
+                    self._step_windows(idx, steps, query_keyword, self.query_periods[:num_periods])
+
+                num_months_after = 0
+                for request_idx, batch_query_period in enumerate(self.query_periods):
+                    batch_start_date, batch_end_date = batch_query_period.split()
+                    if self.verbose:
+                        logging.info('>> batch query period: {0}, request {1}'.format(batch_query_period,
+                                                                                    request_idx + 1))
+                    # weights of the months in this period, counted from the end of all time interest
+                    batch_num_months = len(calendar_days(batch_start_date, batch_end_date))
+                    batch_month_weight = alltime_search[len(alltime_search) - num_months_after - batch_num_months:
+                                                        len(alltime_search) - num_months_after]
+                    num_months_after += batch_num_months
+
+                    batch_raw_interest = self._step(
+                        idx, steps, batch_query_period,
+                        lambda: self._interest_over_time(query_keyword, batch_query_period))
+                    if batch_raw_interest is not None:
+                        # rescale by the weight of each month
+                        batch_scaled_interest = rescale_by_month_weights(batch_raw_interest, batch_month_weight,
+                                                                         batch_start_date, batch_end_date).tolist()
+                    else:
+                        batch_num_days = (datetime.strptime(batch_end_date, '%Y-%m-%d') -
+                                          datetime.strptime(batch_start_date, '%Y-%m-%d')).days + 1
+                        batch_raw_interest = [0] * batch_num_days
+                        batch_scaled_interest = [0] * batch_num_days
+
+                    if self.verbose:
+                        logging.info('>>> {0}'.format(','.join(map(str, batch_raw_interest))))
+                    batch_scaled_interest.extend(google_trends['daily_search'])
+                    google_trends['daily_search'] = batch_scaled_interest
+                    # stop once the period covers the start date
+                    if batch_start_date <= start_date_str:
+                        break
+
+        if len(google_trends['daily_search']) > 0:
+            # slicing the last 'num_days' elements, this removes the days before the start date
+            google_trends['daily_search'] = google_trends['daily_search'][-num_days:]
+            query_json['trends'] = google_trends
+
+        logging.info('>>> Running time of record {0}: {1}'.format(
+            idx, str(timedelta(seconds=time.time() - start_time))[:-3]))
+        return query_json
+
+    def run(self, input_path, output_path):
+        """ Crawl every unfinished record of input_path and append the results to output_path.
+
+        :return: number of records crawled in this run
+        """
+        num_crawled = 0
+        pending = dict()
+        retries = dict()
+        with open(input_path, 'r') as input_data, open(output_path, 'a') as output_data, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+
+            def submit(idx, record):
+                pending[pool.submit(self.crawl_record, idx, record)] = (idx, record)
+
+            def collect(futures):
+                count = 0
+                for future in futures:
+                    idx, record = pending.pop(future)
+                    try:
+                        query_json = future.result()
+                    except Exception as e:
+                        logging.error('+++ Error on record {0}: {1}'.format(idx, str(e)))
+                        if _is_throttled(e) and retries.get(idx, 0) < self.max_retries:
+                            # crawled again from its checkpoint, its requests wait out the limiter's backoff
+                            retries[idx] = retries.get(idx, 0) + 1
+                            submit(idx, record)
+                        # other unfinished records are retried from their checkpoint on the next run
+                        continue
+                    output_data.write('{0}\n'.format(json.dumps(query_json)))
+                    output_data.flush()
+                    self.state.mark_done(idx)
+                    count += 1
+                return count
+
+            for idx, line in enumerate(input_data):
+                if self.state.is_done(idx) or not line.strip():
+                    continue
+                submit(idx, json.loads(line.rstrip()))
+                # keep a bounded number of records in flight, the input is never loaded at once
+                if len(pending) >= 2 * self.max_workers:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    num_crawled += collect(done)
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                num_crawled += collect(done)
+        logging.info('>>> Total request sent: {0}'.format(self.num_requests))
+        return num_crawled
+
+    def close(self):
+        self.state.close()
+        self.topic_resolver.index.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', help='input file path of vevo en queries', required=True)
+    parser.add_argument('-o', '--output', help='output file path of search interests', required=True)
+    parser.add_argument('-s', '--state', help='checkpoint file path, defaults to the output path + .state')
+    parser.add_argument('-w', '--workers', help='number of records crawled concurrently', type=int, default=1)
+    parser.add_argument('-r', '--rate', help='initial requests per second', type=float, default=0.2)
+    parser.add_argument('--max-rate', help='highest requests per second to probe', type=float, default=1.)
+    parser.add_argument('-c', '--cache', help='sqlite file caching google responses across runs', default=None)
+    parser.add_argument('-t', '--topics', help='file indexing the resolved topics across runs, defaults to the '
+                                               'output path + .topics')
+    parser.add_argument('-m', '--metrics', help='file to dump request metrics to, as json', default=None)
+    parser.add_argument('--multiplex', help='request five query periods per payload', action='store_true',
+                        default=False)
+    parser.add_argument('-v', '--verbose', dest='verbose', action='store_true', default=False)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(filename='./google_trends_crawler.log', level=logging.INFO)
+    if not os.path.exists(args.input):
+        print('>>> Input file does not exist!')
+        print('>>> Exit...')
+        return 1
+
+    metrics = MetricsAggregator() if args.metrics else None
+    crawler = BatchCrawler(args.state or '{0}.state'.format(args.output),
+                           max_workers=args.workers,
+                           rate_limiter=RateLimiter(rate=args.rate, max_rate=args.max_rate, backoff=60),
+                           cache=ResponseCache(args.cache) if args.cache else None,
+                           verbose=args.verbose,
+                           multiplex=args.multiplex,
+                           topic_index=TopicIndex(args.topics or '{0}.topics'.format(args.output)),
+                           hooks=metrics.hooks() if metrics is not None else None)
+    try:
+        num_crawled = crawler.run(args.input, args.output)
+    finally:
+        crawler.close()
+        if metrics is not None:
+            with open(args.metrics, 'w') as metrics_file:
+                metrics_file.write(metrics.to_json(indent=2))
+    print('>>> Crawled {0} records'.format(num_crawled))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
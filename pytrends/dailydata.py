@@ -1,11 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from functools import partial
-from time import sleep
 from calendar import monthrange
+import threading
 
 import pandas as pd
 
+from pytrends.cache import ResponseCache
 from pytrends.exceptions import ResponseError
+from pytrends.parsing import MAX_COMPARISON_ITEMS
+from pytrends.proxies import ProxyPool
+from pytrends.ratelimit import RateLimiter
 from pytrends.request2 import TrendReq
 
 
@@ -26,22 +31,120 @@ def convert_dates_to_timeframe(start: date, stop: date) -> str:
 
 
 def _fetch_data(pytrends, build_payload, timeframe: str) -> pd.DataFrame:
-    """Attempts to fecth data and retries in case of a ResponseError."""
-    attempts, fetched = 0, False
-    while not fetched:
+    """Attempts to fecth data and retries in case of a ResponseError.
+    Waiting between attempts is left to the rate limiter of pytrends, which
+    backs off after every refused request.
+    """
+    def fetch():
+        build_payload(timeframe=timeframe)
+        return pytrends.interest_over_time()
+
+    return _with_retries(fetch)
+
+
+def _fetch_windows(pytrends, word: str, geo: str, timeframes: list) -> list:
+    """Fetches word over up to five timeframes with a single payload and
+    returns one dataframe per timeframe, each rescaled to peak at 100 as if
+    it had been fetched alone.
+    """
+    def fetch():
+        pytrends.build_payload_timeframes(word, timeframes, cat=0, geo=geo,
+                                          gprop='')
+        return pytrends.interest_over_time_windows()
+
+    windows = []
+    for window in _with_retries(fetch):
+        if word in window and window[word].max() > 0:
+            window[word] = window[word] * 100 / window[word].max()
+        windows.append(window)
+    return windows
+
+
+def _with_retries(fetch, retries: int = 3):
+    """Calls fetch, which builds a payload and requests its data, trying both
+    again up to retries times on a ResponseError. The error of the last
+    attempt is raised, so that no data is read from stale widgets.
+    """
+    attempts = 0
+    while True:
         try:
-            build_payload(timeframe=timeframe)
+            return fetch()
         except ResponseError as err:
             print(err)
-            print(f'Trying again in {60 + 5 * attempts} seconds.')
-            sleep(60 + 5 * attempts)
             attempts += 1
-            if attempts > 3:
-                print('Failed after 3 attemps, abort fetching.')
-                break
+            if attempts > retries:
+                print(f'Failed after {retries} retries, abort fetching.')
+                raise
+            print('Trying again after backing off.')
+
+
+class _TrendReqPool(object):
+    """Hands out one TrendReq per worker thread, all sharing the same proxy
+    pool (if any), rate limiter and cache.
+    """
+
+    def __init__(self, rate_limiter: RateLimiter, cache: ResponseCache,
+                 proxies: list = None):
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        # every request picks the healthiest proxy of the shared pool
+        self.proxy_pool = ProxyPool(proxies) if proxies else ''
+        self._local = threading.local()
+
+    def get(self) -> TrendReq:
+        if not hasattr(self._local, 'pytrends'):
+            # Start pytrends for US region
+            self._local.pytrends = TrendReq(hl='en-US', tz=360,
+                                            proxies=self.proxy_pool,
+                                            rate_limiter=self.rate_limiter,
+                                            cache=self.cache)
+        return self._local.pytrends
+
+
+def _fetch_timeframes(pool: _TrendReqPool, kw_list: list, geo: str,
+                      timeframes: list, verbose: bool,
+                      max_workers: int = 1, multiplex: bool = False) -> list:
+    """Fetches kw_list over each timeframe, with up to max_workers requests
+    in flight, and returns the dataframes in the order of timeframes.
+    The tokens of all timeframes are requested up front, so the data requests
+    follow each other without an explore round trip in between.
+    With multiplex, kw_list holds a single word and up to five timeframes go
+    in every payload instead, see _fetch_windows.
+    """
+    if multiplex:
+        if len(kw_list) != 1:
+            raise ValueError('Timeframes are multiplexed for a single word')
+        groups = [timeframes[i:i + MAX_COMPARISON_ITEMS]
+                  for i in range(0, len(timeframes), MAX_COMPARISON_ITEMS)]
+
+        def fetch_group(group):
+            if verbose:
+                print(f'{kw_list[0]}:{",".join(group)}')
+            return _fetch_windows(pool.get(), kw_list[0], geo, group)
+
+        if max_workers <= 1:
+            results = [fetch_group(group) for group in groups]
         else:
-            fetched = True
-    return pytrends.interest_over_time()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(fetch_group, groups))
+        return [window for windows in results for window in windows]
+
+    pool.get().prefetch_tokens(kw_list, timeframes, cat=0, geo=geo, gprop='',
+                               max_workers=max_workers)
+
+    def fetch(timeframe):
+        pytrends = pool.get()
+        # Initialize build_payload with the words we need data for
+        build_payload = partial(pytrends.build_payload,
+                                kw_list=kw_list, cat=0, geo=geo, gprop='')
+        if verbose:
+            print(f'{",".join(kw_list)}:{timeframe}')
+        return _fetch_data(pytrends, build_payload, timeframe)
+
+    if max_workers <= 1:
+        return [fetch(timeframe) for timeframe in timeframes]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fetch, timeframes))
 
 
 def get_daily_data(word: str,
@@ -51,7 +154,12 @@ def get_daily_data(word: str,
                    stop_mon: int,
                    geo: str = 'US',
                    verbose: bool = True,
-                   wait_time: float = 5.0) -> pd.DataFrame:
+                   wait_time: float = 5.0,
+                   rate_limiter: RateLimiter = None,
+                   cache: ResponseCache = None,
+                   max_workers: int = 1,
+                   proxies: list = None,
+                   multiplex: bool = False) -> pd.DataFrame:
     """Given a word, fetches daily search volume data from Google Trends and
     returns results in a pandas DataFrame.
     Details: Due to the way Google Trends scales and returns data, special
@@ -71,6 +179,22 @@ def get_daily_data(word: str,
         geo (str): geolocation
         verbose (bool): If True, then prints the word and current time frame
             we are fecthing the data for.
+        wait_time (float): Seconds taken by each pair of explore and
+            multiline requests, through each proxy if proxies are given,
+            used when no rate_limiter is given. The rate then climbs as long
+            as Google answers.
+        rate_limiter (RateLimiter): Limiter spacing the requests and backing
+            off on 429s, can be shared with other crawlers.
+        cache (ResponseCache): On-disk response cache, overlapping or repeated
+            runs then only download what they have not seen yet.
+        max_workers (int): Number of requests sent concurrently, each worker
+            with its own TrendReq. All workers share the rate limiter.
+        proxies (list): Https proxies shared by the workers, each request
+            goes through the healthiest available one.
+        multiplex (bool): Fetch five months per payload, one comparison item
+            per month, which divides the number of requests by about five.
+            Each month is rescaled to peak at 100, quiet months lose some
+            precision since Google rounds to integers.
     Returns:
         complete (pd.DataFrame): Contains 4 columns.
             The column named after the word argument contains the daily search
@@ -89,35 +213,289 @@ def get_daily_data(word: str,
     start_date = date(start_year, start_mon, 1)
     stop_date = get_last_date_of_month(stop_year, stop_mon)
 
-    # Start pytrends for US region
-    pytrends = TrendReq(hl='en-US', tz=360)
-    # Initialize build_payload with the word we need data for
-    build_payload = partial(pytrends.build_payload,
-                            kw_list=[word], cat=0, geo=geo, gprop='')
+    pool = _TrendReqPool(_rate_limiter(rate_limiter, wait_time, proxies),
+                         cache, proxies)
+    monthly, daily = _fetch_monthly_and_daily(pool, [word], start_date,
+                                              stop_date, geo, verbose,
+                                              max_workers, multiplex)
+    return _scale_daily(daily[word], monthly[word], word)
+
+
+def _rate_limiter(rate_limiter: RateLimiter, wait_time: float,
+                  proxies: list = None) -> RateLimiter:
+    """Returns rate_limiter, or one sending a pair of requests every
+    wait_time seconds to start with, through each proxy if proxies are given
+    so that the crawl scales with the proxy pool."""
+    # don't go too fast or Google will send 429s, every timeframe costs an
+    # explore and a multiline request
+    if rate_limiter is None:
+        rate = 2 / wait_time if wait_time > 0 else None
+        if proxies:
+            rate_limiter = RateLimiter(per_proxy_rate=rate, per_proxy_burst=2)
+        else:
+            rate_limiter = RateLimiter(rate=rate, burst=2)
+    return rate_limiter
 
-    # Obtain monthly data for all months in years [start_year, stop_year]
-    monthly = _fetch_data(pytrends, build_payload,
-                          convert_dates_to_timeframe(start_date, stop_date))
 
-    # Get daily data, month by month
-    results = {}
-    # if a timeout or too many requests error occur we need to adjust wait time
+def _fetch_monthly_and_daily(pool: _TrendReqPool, kw_list: list,
+                             start_date: date, stop_date: date, geo: str,
+                             verbose: bool, max_workers: int = 1,
+                             multiplex: bool = False):
+    """Fetches the data of kw_list over the whole period at once (monthly)
+    and month by month (daily). Returns both dataframes, without isPartial.
+    With multiplex, the months of a single word are fetched five at a time.
+    """
+    # monthly data for all months in years [start_year, stop_year] first,
+    # then daily data, month by month
+    timeframes = [convert_dates_to_timeframe(start_date, stop_date)]
     current = start_date
     while current < stop_date:
         last_date_of_month = get_last_date_of_month(current.year, current.month)
-        timeframe = convert_dates_to_timeframe(current, last_date_of_month)
-        if verbose:
-            print(f'{word}:{timeframe}')
-        results[current] = _fetch_data(pytrends, build_payload, timeframe)
+        timeframes.append(convert_dates_to_timeframe(current, last_date_of_month))
         current = last_date_of_month + timedelta(days=1)
-        sleep(wait_time)  # don't go too fast or Google will send 429s
 
-    daily = pd.concat(results.values()).drop(columns=['isPartial'])
-    complete = daily.join(monthly, lsuffix='_unscaled', rsuffix='_monthly')
+    if multiplex:
+        # the monthly request stays alone, google would return every window
+        # of its payload by month
+        results = _fetch_timeframes(pool, kw_list, geo, timeframes[:1],
+                                    verbose) + \
+            _fetch_timeframes(pool, kw_list, geo, timeframes[1:], verbose,
+                              max_workers, multiplex=True)
+    else:
+        results = _fetch_timeframes(pool, kw_list, geo, timeframes, verbose,
+                                    max_workers)
+    monthly = results[0]
+    # results are in date order whatever order the workers finished in
+    daily = pd.concat(results[1:]).drop(columns=['isPartial'])
+    return monthly.drop(columns=['isPartial']), daily
+
+
+def _scale_daily(daily: pd.Series, monthly: pd.Series, word: str) -> pd.DataFrame:
+    """Joins the daily data of word with its monthly data and scales it by the
+    monthly weights, see get_daily_data for the returned columns.
+    """
+    complete = daily.rename(f'{word}_unscaled').to_frame().join(
+        monthly.rename(f'{word}_monthly'))
 
     # Scale daily data by monthly weights so the data is comparable
-    complete[f'{word}_monthly'].ffill(inplace=True)  # fill NaN values
+    complete[f'{word}_monthly'] = complete[f'{word}_monthly'].ffill()  # fill NaN values
     complete['scale'] = complete[f'{word}_monthly'] / 100
     complete[word] = complete[f'{word}_unscaled'] * complete.scale
 
     return complete
+
+
+def get_daily_data_batch(words: list,
+                         start_year: int,
+                         start_mon: int,
+                         stop_year: int,
+                         stop_mon: int,
+                         geo: str = 'US',
+                         anchor: str = None,
+                         verbose: bool = True,
+                         wait_time: float = 5.0,
+                         rate_limiter: RateLimiter = None,
+                         cache: ResponseCache = None,
+                         max_workers: int = 1,
+                         proxies: list = None) -> dict:
+    """Given a list of words, fetches daily search volume data of up to five
+    words per request and returns a pandas DataFrame for each word.
+    Details: Google Trends compares up to five keywords in one payload, so
+    words are packed in batches of five (four plus the anchor if given) and
+    every batch costs the requests get_daily_data spends on a single word.
+    Within a month the daily values of a batch are relative to the busiest
+    word, so each word is rescaled to peak at 100 in every month, like data
+    fetched for that word alone, before being scaled by the monthly weights.
+    Words far less searched than their batch mates lose precision since
+    Google rounds to integers.
+    The monthly values are comparable within a batch. To make them comparable
+    across batches, pass an anchor word: it is added to every batch and the
+    monthly values of each batch are rescaled so that the anchor total matches
+    its total in the first batch. A ValueError is raised if the anchor has no
+    search volume in a batch, since that batch could not be aligned.
+    Args:
+        words (list): Words to fetch daily data for.
+        start_year (int): the start year
+        start_mon (int): start 1st day of the month
+        stop_year (int): the end year
+        stop_mon (int): end at the last day of the month
+        geo (str): geolocation
+        anchor (str): Word added to every batch to align their scales.
+        verbose (bool): If True, then prints the words and current time frame
+            we are fecthing the data for.
+        wait_time (float): Seconds taken by each pair of explore and
+            multiline requests, through each proxy if proxies are given,
+            used when no rate_limiter is given. The rate then climbs as long
+            as Google answers.
+        rate_limiter (RateLimiter): Limiter spacing the requests and backing
+            off on 429s, can be shared with other crawlers.
+        cache (ResponseCache): On-disk response cache.
+        max_workers (int): Number of requests sent concurrently, each worker
+            with its own TrendReq. All workers share the rate limiter.
+        proxies (list): Https proxies shared by the workers, each request
+            goes through the healthiest available one.
+    Returns:
+        frames (dict): Maps each word to a DataFrame with the columns
+            returned by get_daily_data.
+    """
+    start_date = date(start_year, start_mon, 1)
+    stop_date = get_last_date_of_month(stop_year, stop_mon)
+    pool = _TrendReqPool(_rate_limiter(rate_limiter, wait_time, proxies),
+                         cache, proxies)
+
+    words = [word for word in words if word != anchor]
+    batch_size = 5 if anchor is None else 4
+    reference_total = None
+    frames = {}
+    for i in range(0, len(words), batch_size):
+        batch = words[i:i + batch_size]
+        kw_list = batch if anchor is None else [anchor] + batch
+        monthly, daily = _fetch_monthly_and_daily(pool, kw_list, start_date,
+                                                  stop_date, geo, verbose,
+                                                  max_workers)
+
+        if anchor is not None:
+            # align the monthly scale of this batch on the first one
+            anchor_total = monthly[anchor].sum()
+            if anchor_total <= 0:
+                raise ValueError(f'The anchor {anchor!r} has no search volume '
+                                 f'next to {batch}, pick a more searched one.')
+            if reference_total is None:
+                reference_total = anchor_total
+            monthly = monthly * (reference_total / anchor_total)
+
+        # each word peaks at 100 within every month, as if fetched alone
+        month_max = daily.groupby(daily.index.to_period('M')).transform('max')
+        daily = (daily * 100 / month_max.where(month_max > 0)).fillna(0)
+
+        for word in batch:
+            frames[word] = _scale_daily(daily[word], monthly[word], word)
+    return frames
+
+
+def plan_windows(start_date: date, stop_date: date, max_days: int = 269,
+                 overlap: int = 30) -> list:
+    """Given two dates, returns the list of (start, stop) windows of at most
+    max_days days covering them, each window overlapping the previous one by
+    overlap days. Google Trends returns daily data for windows shorter than
+    about 270 days.
+    """
+    if not 0 <= overlap < max_days:
+        raise ValueError('overlap must be between 0 and max_days - 1')
+    windows = []
+    current = start_date
+    while True:
+        last = min(current + timedelta(days=max_days - 1), stop_date)
+        windows.append((current, last))
+        if last >= stop_date:
+            return windows
+        current = last - timedelta(days=overlap - 1)
+
+
+def _chain_scale(previous: pd.Series, current: pd.Series) -> float:
+    """Returns the factor s minimising sum((previous - s * current) ** 2) over
+    the days both series cover, previous being already scaled.
+    """
+    previous, current = previous.align(current, join='inner')
+    denominator = (current * current).sum()
+    if denominator == 0:
+        # no signal over the overlap, assume the scale did not change
+        return 1.
+    return float((previous * current).sum() / denominator)
+
+
+def get_daily_data_stitched(word: str,
+                            start_year: int,
+                            start_mon: int,
+                            stop_year: int,
+                            stop_mon: int,
+                            geo: str = 'US',
+                            max_days: int = 269,
+                            overlap: int = 30,
+                            verbose: bool = True,
+                            wait_time: float = 5.0,
+                            rate_limiter: RateLimiter = None,
+                            cache: ResponseCache = None,
+                            max_workers: int = 1,
+                            proxies: list = None,
+                            multiplex: bool = False) -> pd.DataFrame:
+    """Given a word, fetches daily search volume data from Google Trends in
+    overlapping windows and stitches them into one comparable series.
+    Details: instead of one request per calendar month plus a monthly
+    request, the period is covered by the longest windows Google still
+    returns at daily resolution (max_days), consecutive windows sharing
+    overlap days. Every window is scaled by the factor fitting it, in the
+    least-squares sense, to the already scaled previous window over their
+    common days. Five years cost 8 requests with the defaults instead of 61.
+    Days covered by two windows keep the values of the earlier one. Windows
+    whose overlap has no search volume keep the scale of the previous one.
+    A ValueError naming the timeframe is raised if a window comes back empty.
+    Args:
+        word (str): Word to fetch daily data for.
+        start_year (int): the start year
+        start_mon (int): start 1st day of the month
+        stop_year (int): the end year
+        stop_mon (int): end at the last day of the month
+        geo (str): geolocation
+        max_days (int): Length in days of each window.
+        overlap (int): Number of days shared by consecutive windows.
+        verbose (bool): If True, then prints the word and current time frame
+            we are fecthing the data for.
+        wait_time (float): Seconds taken by each pair of explore and
+            multiline requests, through each proxy if proxies are given,
+            used when no rate_limiter is given. The rate then climbs as long
+            as Google answers.
+        rate_limiter (RateLimiter): Limiter spacing the requests and backing
+            off on 429s, can be shared with other crawlers.
+        cache (ResponseCache): On-disk response cache.
+        max_workers (int): Number of requests sent concurrently, each worker
+            with its own TrendReq. All workers share the rate limiter.
+        proxies (list): Https proxies shared by the workers, each request
+            goes through the healthiest available one.
+        multiplex (bool): Fetch five windows per payload, one comparison item
+            per window.
+    Returns:
+        complete (pd.DataFrame): Contains 3 columns.
+            The column named after the word argument contains the daily search
+            volume scaled and comparable through time, peaking at 100.
+            The column f'{word}_unscaled' is the original daily data of the
+            window each day was taken from.
+            The column 'scale' contains the scale used to obtain the scaled
+            daily data.
+    """
+    start_date = date(start_year, start_mon, 1)
+    stop_date = get_last_date_of_month(stop_year, stop_mon)
+    pool = _TrendReqPool(_rate_limiter(rate_limiter, wait_time, proxies),
+                         cache, proxies)
+    windows = plan_windows(start_date, stop_date, max_days, overlap)
+    timeframes = [convert_dates_to_timeframe(*window) for window in windows]
+    # windows are fetched concurrently, then chained in date order
+    results = _fetch_timeframes(pool, [word], geo, timeframes, verbose,
+                                max_workers, multiplex)
+
+    parts = []
+    scaled = None
+    for timeframe, result in zip(timeframes, results):
+        if word not in result:
+            # no data or retries exhausted, the next windows could not be
+            # chained to the previous ones
+            raise ValueError(f'Google returned no data for {timeframe}.')
+        window = result[word]
+        if len(window) > 1 and (window.index[1] - window.index[0]).days != 1:
+            raise ValueError(f'Google did not return daily data for {timeframe}, '
+                             f'use a smaller max_days.')
+        scale = 1. if scaled is None else _chain_scale(scaled, window)
+        scaled = window * scale
+        if parts:
+            # keep overlapping days from the earlier window
+            window = window[window.index > parts[-1].index[-1]]
+        parts.append(pd.DataFrame({f'{word}_unscaled': window, 'scale': scale}))
+
+    complete = pd.concat(parts)
+    complete[word] = complete[f'{word}_unscaled'] * complete.scale
+    # express everything relative to the busiest day, like Google does
+    peak = complete[word].max()
+    if peak > 0:
+        complete['scale'] = complete.scale * 100 / peak
+        complete[word] = complete[word] * 100 / peak
+    return complete
@@ -6,3 +6,7 @@ class ResponseError(Exception):
 
         # pass response so it can be handled upstream
         self.response = response
+
+
+class ProxyPoolExhausted(Exception):
+    """Every proxy of the pool failed, requests would otherwise leave without a proxy"""
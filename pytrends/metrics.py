@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Request hooks and an in-memory metrics aggregator for the TrendReq clients.
+
+Every request made by TrendReq._get_data is described by an event dict passed to the callbacks registered on
+TrendReq.hooks:
+
+    before_request  the request is about to be sent (proxy selected, rate limiter passed)
+    after_response  a response was received and handled, or answered from the response cache
+    on_error        the request failed: transport error, non-json response or unparsable body
+    on_retry        the request is sent again, e.g. after google rejected the cookie
+
+Event fields: event, endpoint ('explore', 'multiline', ...), url, method, proxy, attempt, status, bytes, cached,
+error, and the timings in seconds ttfb (request sent to response headers parsed, as measured by requests),
+total (whole round trip including connection setup and body download) and parse (json decoding). DNS and
+connect times are not exposed by requests and are part of ttfb and total.
+"""
+
+import json
+import threading
+from bisect import bisect_left
+from urllib.parse import urlparse
+
+EVENTS = ('before_request', 'after_response', 'on_error', 'on_retry')
+
+# upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+
+PHASES = ('ttfb', 'total', 'parse')
+
+
+def endpoint_name(url):
+    """ Short name of a google trends endpoint, the last segment of its path: 'explore', 'multiline'...
+    Autocomplete urls end with the keyword and are all named 'autocomplete'.
+    """
+    parsed = urlparse(url)
+    segments = parsed.path.rstrip('/').split('/')
+    if 'autocomplete' in segments:
+        return 'autocomplete'
+    return segments[-1] or parsed.netloc
+
+
+def request_event(url, method):
+    """ A fresh event dict describing one call of TrendReq._get_data.
+    """
+    return {'event': None, 'endpoint': endpoint_name(url), 'url': url, 'method': method, 'proxy': None,
+            'attempt': 0, 'status': None, 'bytes': 0, 'cached': False, 'error': None,
+            'ttfb': None, 'total': None, 'parse': None}
+
+
+class Hooks(object):
+    """ Callbacks registered per event, called in registration order with the event dict.
+
+    Callbacks run in the thread issuing the request and should return quickly; exceptions they raise propagate
+    to the caller of the TrendReq method.
+    """
+
+    def __init__(self):
+        self._callbacks = {name: [] for name in EVENTS}
+        self._lock = threading.Lock()
+
+    def register(self, name, callback):
+        """ Call callback(event) on every event name, one of EVENTS.
+        """
+        if name not in self._callbacks:
+            raise ValueError('Unknown event {0}, expected one of {1}'.format(name, ', '.join(EVENTS)))
+        with self._lock:
+            self._callbacks[name] = self._callbacks[name] + [callback]
+
+    def unregister(self, name, callback):
+        with self._lock:
+            self._callbacks[name] = [cb for cb in self._callbacks[name] if cb is not callback]
+
+    def emit(self, name, event):
+        callbacks = self._callbacks[name]
+        if not callbacks:
+            return
+        event['event'] = name
+        for callback in callbacks:
+            callback(event)
+
+
+class _Histogram(object):
+    """ Cumulative histogram in the Prometheus sense, plus sum and count.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+    def to_dict(self):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {'buckets': dict(zip(bounds, self.cumulative())), 'sum': self.sum, 'count': self.count}
+
+
+class MetricsAggregator(object):
+    """ Counters and latency histograms per endpoint, fed by Hooks events.
+
+    Example:
+    metrics = MetricsAggregator()
+    pytrend = TrendReq(hooks=metrics.hooks())
+    ...
+    print(metrics.to_prometheus())
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (endpoint, status) -> count, status is 'cached' for cache hits
+            self.responses = dict()
+            self.errors = dict()
+            self.retries = dict()
+            self.bytes = dict()
+            # (endpoint, phase) -> _Histogram
+            self.latency = dict()
+
+    def hooks(self, hooks=None):
+        """ Register the aggregator on hooks, a new Hooks object by default, and return it.
+        """
+        hooks = hooks if hooks is not None else Hooks()
+        hooks.register('after_response', self.after_response)
+        hooks.register('on_error', self.on_error)
+        hooks.register('on_retry', self.on_retry)
+        return hooks
+
+    def after_response(self, event):
+        endpoint = event['endpoint']
+        status = 'cached' if event['cached'] else str(event['status'])
+        with self._lock:
+            self._incr(self.responses, (endpoint, status))
+            self._incr(self.bytes, endpoint, event['bytes'])
+            for phase in PHASES:
+                if event[phase] is not None:
+                    self._histogram(endpoint, phase).observe(event[phase])
+
+    def on_error(self, event):
+        with self._lock:
+            self._incr(self.errors, (event['endpoint'], event['error'] or 'unknown'))
+
+    def on_retry(self, event):
+        with self._lock:
+            self._incr(self.retries, event['endpoint'])
+
+    @staticmethod
+    def _incr(counter, key, value=1):
+        counter[key] = counter.get(key, 0) + value
+
+    def _histogram(self, endpoint, phase):
+        key = (endpoint, phase)
+        if key not in self.latency:
+            self.latency[key] = _Histogram(self.buckets)
+        return self.latency[key]
+
+    def snapshot(self):
+        """ All metrics as a dict of plain types, keyed by endpoint.
+        """
+        with self._lock:
+            result = dict()
+
+            def endpoint(name):
+                return result.setdefault(name, {'responses': {}, 'errors': {}, 'retries': 0, 'bytes': 0,
+                                                'latency': {}})
+
+            for (name, status), count in self.responses.items():
+                endpoint(name)['responses'][status] = count
+            for (name, error), count in self.errors.items():
+                endpoint(name)['errors'][error] = count
+            for name, count in self.retries.items():
+                endpoint(name)['retries'] = count
+            for name, count in self.bytes.items():
+                endpoint(name)['bytes'] = count
+            for (name, phase), histogram in self.latency.items():
+                endpoint(name)['latency'][phase] = histogram.to_dict()
+            return result
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.snapshot(), sort_keys=True, **kwargs)
+
+    def to_prometheus(self, prefix='pytrends'):
+        """ Metrics in the Prometheus text exposition format.
+        """
+        def labels(**values):
+            return '{' + ','.join('{0}="{1}"'.format(k, str(v).replace('"', '\\"'))
+                                  for k, v in values.items()) + '}'
+
+        with self._lock:
+            lines = []
+            counters = [('responses_total', 'Responses received by endpoint and status.', self.responses,
+                         lambda key: labels(endpoint=key[0], status=key[1])),
+                        ('errors_total', 'Failed requests by endpoint and error.', self.errors,
+                         lambda key: labels(endpoint=key[0], error=key[1])),
+                        ('retries_total', 'Retried requests by endpoint.', self.retries,
+                         lambda key: labels(endpoint=key)),
+                        ('response_bytes_total', 'Bytes of response bodies by endpoint.', self.bytes,
+                         lambda key: labels(endpoint=key))]
+            for name, help_text, counter, label in counters:
+                lines.append('# HELP {0}_{1} {2}'.format(prefix, name, help_text))
+                lines.append('# TYPE {0}_{1} counter'.format(prefix, name))
+                for key, value in sorted(counter.items()):
+                    lines.append('{0}_{1}{2} {3}'.format(prefix, name, label(key), value))
+
+            name = '{0}_request_duration_seconds'.format(prefix)
+            lines.append('# HELP {0} Request latency by endpoint and phase (ttfb, total, parse).'.format(name))
+            lines.append('# TYPE {0} histogram'.format(name))
+            for (endpoint, phase), histogram in sorted(self.latency.items()):
+                bounds = [repr(bound) for bound in histogram.buckets] + ['+Inf']
+                for bound, count in zip(bounds, histogram.cumulative()):
+                    lines.append('{0}_bucket{1} {2}'.format(name, labels(endpoint=endpoint, phase=phase, le=bound),
+                                                            count))
+                lines.append('{0}_sum{1} {2!r}'.format(name, labels(endpoint=endpoint, phase=phase), histogram.sum))
+                lines.append('{0}_count{1} {2}'.format(name, labels(endpoint=endpoint, phase=phase), histogram.count))
+            return '\n'.join(lines) + '\n'
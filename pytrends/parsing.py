@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Parsers turning google trends widget responses into NumPy arrays and pandas DataFrames.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+# use the fastest json backend installed, orjson and ujson are optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'ujson' if ujson is not None else 'json'
+
+_decoder = json.JSONDecoder()
+
+
+def loads_trimmed(content, trim_chars=0, backend=None):
+    """ Parse a json response body after skipping its first trim_chars bytes.
+
+    Google prefixes its responses with garbage like ")]}'," which is ascii, so characters and bytes match. The
+    body is never copied to drop the prefix: orjson reads a memoryview starting after it, the standard library
+    decodes the bytes once and starts its decoder at the offset. That decode is a small fraction of the parse, the
+    stdlib path mainly saves the charset detection of response.text.
+
+    :param content: response body as bytes (response.content)
+    :param trim_chars: length of the prefix to skip
+    :param backend: force 'orjson', 'ujson' or 'json', defaults to JSON_BACKEND
+    :return: the parsed json
+    """
+    backend = backend or JSON_BACKEND
+    if backend == 'orjson':
+        return orjson.loads(memoryview(content)[trim_chars:])
+    if backend == 'ujson':
+        return ujson.loads(content[trim_chars:])
+    text = content.decode('utf-8')
+    start = trim_chars
+    while start < len(text) and text[start] in ' \t\n\r':
+        start += 1
+    obj, end = _decoder.raw_decode(text, start)
+    if text[end:].strip():
+        raise ValueError('Extra data after json document at position {0}'.format(end))
+    return obj
+
+
+def timeline_arrays(timeline_data):
+    """ Read the points of a multiline response in one pass.
+
+    :param timeline_data: the req_json['default']['timelineData'] list
+    :return: (times, values, is_partial) where times is an int64 array of unix seconds, values an int64 array
+        of shape (number of points, number of keywords) and is_partial a bool array
+    """
+    num_points = len(timeline_data)
+    if num_points == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.int64), np.empty(0, dtype=bool)
+    num_columns = len(timeline_data[0]['value'])
+    times = np.fromiter((point['time'] for point in timeline_data), dtype=np.int64, count=num_points)
+    values = np.fromiter(chain.from_iterable(point['value'] for point in timeline_data),
+                         dtype=np.int64, count=num_points * num_columns).reshape(num_points, num_columns)
+    is_partial = np.fromiter((point.get('isPartial', False) for point in timeline_data),
+                             dtype=bool, count=num_points)
+    return times, values, is_partial
+
+
+def timeline_frame(timeline_data, kw_list):
+    """ Build the interest over time dataframe of a multiline response.
+
+    :param timeline_data: the req_json['default']['timelineData'] list
+    :param kw_list: column names, in the order google returns the values
+    :return: a dataframe indexed by date with one int column per keyword and a bool isPartial column
+    """
+    if len(timeline_data) == 0:
+        return pd.DataFrame()
+    times, values, is_partial = timeline_arrays(timeline_data)
+    if np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind='stable')
+        times, values, is_partial = times[order], values[order], is_partial[order]
+    columns = list(kw_list)[:values.shape[1]] + list(range(len(kw_list), values.shape[1]))
+    df = pd.DataFrame(values, columns=columns,
+                      index=pd.DatetimeIndex(pd.to_datetime(times, unit='s'), name='date'))
+    df['isPartial'] = is_partial
+    return df
+
+
+# comparison items google accepts in one explore request
+MAX_COMPARISON_ITEMS = 5
+
+
+def timeline_windows(timeline_data, num_items):
+    """ Split the points of a multiline response into one series per comparison item.
+
+    When the items of a request cover different timeframes, google sends the points of every item under
+    'columnData', one dict per item with its own 'time', and the items are aligned by position: once the points of a
+    shorter timeframe run out its columns carry no time. Responses without columnData share the time of each point.
+    Values of all items are relative to the busiest point among them.
+
+    :param timeline_data: the req_json['default']['timelineData'] list
+    :param num_items: number of comparison items of the request
+    :return: one (times, values, is_partial) tuple per item, as timeline_arrays but with one dimensional values
+    """
+    if len(timeline_data) == 0 or 'columnData' not in timeline_data[0]:
+        times, values, is_partial = timeline_arrays(timeline_data)
+        if values.shape[1] == 0:
+            values = np.empty((0, num_items), dtype=np.int64)
+        return [(times, values[:, idx], is_partial) for idx in range(num_items)]
+    windows = []
+    for idx in range(num_items):
+        columns = [point['columnData'][idx] for point in timeline_data
+                   if idx < len(point['columnData']) and 'time' in point['columnData'][idx]]
+        times = np.fromiter((column['time'] for column in columns), dtype=np.int64, count=len(columns))
+        values = np.fromiter((column.get('value', 0) for column in columns), dtype=np.int64, count=len(columns))
+        is_partial = np.fromiter((column.get('isPartial', False) for column in columns), dtype=bool,
+                                 count=len(columns))
+        windows.append((times, values, is_partial))
+    return windows
+
+
+def window_frames(timeline_data, keyword, num_items):
+    """ Build one interest over time dataframe per comparison item of a multiline response, see timeline_windows.
+
+    :param timeline_data: the req_json['default']['timelineData'] list
+    :param keyword: name of the value column
+    :param num_items: number of comparison items of the request
+    :return: a list of dataframes indexed by date with the int column keyword and a bool isPartial column, empty for
+        items without points
+    """
+    frames = []
+    for times, values, is_partial in timeline_windows(timeline_data, num_items):
+        if len(times) == 0:
+            frames.append(pd.DataFrame())
+            continue
+        df = pd.DataFrame({keyword: values}, index=pd.DatetimeIndex(pd.to_datetime(times, unit='s'), name='date'))
+        df['isPartial'] = is_partial
+        frames.append(df)
+    return frames
+
+
+# columns of the interest over time dataframe of a keyword across geos
+GEO_TIMELINE_COLUMNS = ['date', 'geo', 'value', 'isPartial']
+
+
+def geo_timeline_frame(batches, anchor=None):
+    """ Build one long format dataframe out of multiline responses comparing a keyword across geos.
+
+    Every response holds one value column per comparison item, that is per geo, and the columns are split back into
+    one series per geo. Values are relative to the busiest point of their response. With an anchor geo in every
+    batch, the values of each batch are rescaled so that the anchor total matches its total in the first batch with
+    data, which makes all geos comparable, and the anchor rows are kept once. A batch whose anchor has no search volume
+    cannot be rescaled and raises a ValueError.
+
+    :param batches: iterable of (geos, timeline_data) pairs, geos listing the geo of each comparison item in order
+    :param anchor: geo present in every batch, None if the batches are independent
+    :return: a dataframe with the GEO_TIMELINE_COLUMNS, one row per geo and date, value being float when rescaled
+    """
+    columns = {name: [] for name in GEO_TIMELINE_COLUMNS}
+    reference, anchor_done = None, False
+    for geos, timeline_data in batches:
+        times, values, is_partial = timeline_arrays(timeline_data)
+        if len(times) == 0:
+            continue
+        if anchor is not None:
+            values = values.astype(np.float64)
+            total = values[:, geos.index(anchor)].sum()
+            if total <= 0:
+                raise ValueError('The anchor geo {0!r} has no search volume next to {1}'.format(anchor, geos))
+            if reference is None:
+                reference = total
+            else:
+                values = values * (reference / total)
+        for idx, geo in enumerate(geos[:values.shape[1]]):
+            if geo == anchor:
+                if anchor_done:
+                    continue
+                anchor_done = True
+            columns['date'].append(times)
+            columns['geo'].append(np.full(len(times), geo, dtype=object))
+            columns['value'].append(values[:, idx])
+            columns['isPartial'].append(is_partial)
+    if len(columns['date']) == 0:
+        return pd.DataFrame(columns=GEO_TIMELINE_COLUMNS)
+    columns = {name: np.concatenate(arrays) for name, arrays in columns.items()}
+    columns['date'] = pd.to_datetime(columns['date'], unit='s')
+    return pd.DataFrame(columns, columns=GEO_TIMELINE_COLUMNS)
+
+
+def geo_map_arrays(geo_map_data, num_keywords=None):
+    """ Read the rows of a comparedgeo response in one pass.
+
+    :param geo_map_data: the req_json['default']['geoMapData'] list
+    :param num_keywords: number of value columns to keep, all of them by default
+    :return: (codes, names, values) where codes and names are tuples of strings, geoCode being '' for cities, and
+        values an int64 array of shape (number of geos, number of keywords)
+    """
+    num_rows = len(geo_map_data)
+    if num_rows == 0:
+        return (), (), np.empty((0, num_keywords or 0), dtype=np.int64)
+    num_columns = len(geo_map_data[0]['value'])
+    codes = tuple(row.get('geoCode', '') for row in geo_map_data)
+    names = tuple(row['geoName'] for row in geo_map_data)
+    values = np.fromiter(chain.from_iterable(row['value'] for row in geo_map_data),
+                         dtype=np.int64, count=num_rows * num_columns).reshape(num_rows, num_columns)
+    if num_keywords is not None:
+        values = values[:, :num_keywords]
+    return codes, names, values
+
+
+class GeoTables(object):
+    """ Least recently used cache of the geo columns of comparedgeo responses.
+
+    The same country or region breakdown comes back for every keyword, so its sort order, geoName index and geoCode
+    column are built once and shared by the dataframes of every later response listing the same geos.
+    """
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, codes, names):
+        """ (order, index, codes) of a geo list: the permutation sorting it by name, the sorted geoName index and
+        the matching geoCode array.
+        """
+        key = (codes, names)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table
+        order = np.argsort(np.array(names, dtype=object), kind='stable')
+        index = pd.Index(np.array(names, dtype=object)[order], name='geoName')
+        table = (order, index, np.array(codes, dtype=object)[order])
+        with self._lock:
+            self._tables[key] = table
+            while len(self._tables) > self.max_size:
+                self._tables.popitem(last=False)
+        return table
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+    def __len__(self):
+        return len(self._tables)
+
+
+# shared by every client of the process
+GEO_TABLES = GeoTables()
+
+
+def geo_frame(geo_map_data, kw_list, inc_geo_code=False, geo_tables=GEO_TABLES):
+    """ Build the interest by region dataframe of a comparedgeo response.
+
+    :param geo_map_data: the req_json['default']['geoMapData'] list
+    :param kw_list: column names, in the order google returns the values
+    :param inc_geo_code: add the geoCode column
+    :param geo_tables: GeoTables reusing the geo columns of previous responses
+    :return: a dataframe indexed by geoName sorted by name, with an optional geoCode column then one int column per
+        keyword
+    """
+    if len(geo_map_data) == 0:
+        return pd.DataFrame()
+    codes, names, values = geo_map_arrays(geo_map_data, len(kw_list))
+    order, index, sorted_codes = geo_tables.get(codes, names)
+    values = values[order]
+    columns = dict()
+    if inc_geo_code:
+        columns['geoCode'] = sorted_codes
+    for idx, kw in enumerate(kw_list[:values.shape[1]]):
+        columns[kw] = values[:, idx]
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+# columns of the related topics and queries dataframes
+RELATED_COLUMNS = ['keyword', 'rank_type', 'rank', 'mid', 'title', 'type', 'value']
+
+# order of the ranked lists in a relatedsearches response
+RANK_TYPES = ('top', 'rising')
+
+
+def related_frame(keyword_responses):
+    """ Build one long format dataframe out of relatedsearches responses.
+
+    Rows of every response are gathered column by column and the dataframe is allocated once, which is much cheaper
+    than a pair of small dataframes per keyword when thousands of keywords are concatenated.
+
+    :param keyword_responses: iterable of (keyword, req_json) pairs
+    :return: a dataframe with the RELATED_COLUMNS, one row per ranked topic or query, rank counting from 0 within
+        each keyword and rank_type. Queries have no mid nor type (missing values), their title is the query.
+    """
+    columns = {name: [] for name in RELATED_COLUMNS}
+    for keyword, req_json in keyword_responses:
+        ranked_lists = req_json.get('default', {}).get('rankedList', [])
+        for rank_type, ranked_list in zip(RANK_TYPES, ranked_lists):
+            for rank, item in enumerate(ranked_list.get('rankedKeyword', [])):
+                topic = item.get('topic')
+                columns['keyword'].append(keyword)
+                columns['rank_type'].append(rank_type)
+                columns['rank'].append(rank)
+                if topic is not None:
+                    columns['mid'].append(topic.get('mid'))
+                    columns['title'].append(topic.get('title'))
+                    columns['type'].append(topic.get('type'))
+                else:
+                    columns['mid'].append(None)
+                    columns['title'].append(item.get('query'))
+                    columns['type'].append(None)
+                columns['value'].append(item.get('value', 0))
+    columns['rank'] = np.array(columns['rank'], dtype=np.int64)
+    columns['value'] = np.array(columns['value'], dtype=np.int64)
+    return pd.DataFrame(columns, columns=RELATED_COLUMNS)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Pool of https proxies scored by their health.
+"""
+
+import threading
+import time
+
+from pytrends.exceptions import ProxyPoolExhausted
+
+
+class ProxyStats(object):
+    """ Health record of one proxy.
+    """
+
+    def __init__(self):
+        # exponentially weighted moving averages, untried proxies look perfect
+        self.success_rate = 1.
+        self.latency = None
+        self.consecutive_failures = 0
+        self.proxy_errors = 0
+        self.cooldown_until = 0.
+        self.last_used = 0.
+        self.requests = 0
+
+    def score(self):
+        """ Higher is healthier: success rate discounted by latency in seconds.
+        """
+        return self.success_rate / (1. + (self.latency or 0.))
+
+
+class ProxyPool(object):
+    """ Thread-safe set of proxies handing out the healthiest available one.
+
+    Every request reports back its outcome: successes update the latency and success rate averages, failures lower
+    the success rate, and 429s or proxy errors put the proxy in cooldown for a period growing exponentially with
+    consecutive failures. Proxies come back into rotation once their cooldown is over. A 429 only asks to slow down,
+    so only a proxy failing with max_failures proxy errors in a row is dropped from the pool. Among the available proxies whose score is within
+    tolerance of the best one, the least recently used is chosen, which spreads the load. An empty pool raises
+    ProxyPoolExhausted rather than letting requests leave without a proxy.
+    """
+
+    def __init__(self, proxies, cooldown=60., max_cooldown=900., max_failures=5, alpha=.2, tolerance=.2,
+                 clock=time.monotonic, sleep=time.sleep):
+        """ :param proxies: list of proxy urls, e.g. 'https://34.203.233.13:80'
+        :param cooldown: seconds a proxy rests after its first 429 or proxy error
+        :param max_cooldown: longest rest in seconds
+        :param max_failures: consecutive proxy errors after which a proxy is dropped, None keeps it forever
+        :param alpha: weight of the latest outcome in the moving averages
+        :param tolerance: relative score gap within which proxies are considered equally healthy
+        :param clock: monotonic clock returning seconds
+        :param sleep: function used to wait when every proxy is cooling down
+        """
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_failures = max_failures
+        self.alpha = alpha
+        self.tolerance = tolerance
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = dict()
+        self._lock = threading.Lock()
+        for proxy in proxies:
+            self.add(proxy)
+
+    def add(self, proxy):
+        with self._lock:
+            self.stats.setdefault(proxy, ProxyStats())
+
+    def remove(self, proxy):
+        with self._lock:
+            self.stats.pop(proxy, None)
+
+    @property
+    def proxies(self):
+        return list(self.stats)
+
+    def __len__(self):
+        return len(self.stats)
+
+    def __iter__(self):
+        return iter(self.proxies)
+
+    def available(self):
+        """ Proxies not cooling down.
+        """
+        now = self.clock()
+        with self._lock:
+            return [proxy for proxy, stats in self.stats.items() if stats.cooldown_until <= now]
+
+    def choose(self):
+        """ Return the healthiest available proxy, waiting for the first cooldown to end if none is available.
+        Raise ProxyPoolExhausted if the pool is empty.
+        """
+        while True:
+            with self._lock:
+                if len(self.stats) == 0:
+                    raise ProxyPoolExhausted('No proxy left in the pool')
+                now = self.clock()
+                available = [(proxy, stats) for proxy, stats in self.stats.items() if stats.cooldown_until <= now]
+                if available:
+                    best = max(stats.score() for _, stats in available)
+                    healthy = [(proxy, stats) for proxy, stats in available
+                               if stats.score() >= best * (1. - self.tolerance)]
+                    proxy, stats = min(healthy, key=lambda item: item[1].last_used)
+                    stats.last_used = now
+                    stats.requests += 1
+                    return proxy
+                wait = min(stats.cooldown_until for stats in self.stats.values()) - now
+            print('All proxies are cooling down, waiting {0:.0f} seconds.'.format(wait))
+            self.sleep(wait)
+
+    def report_success(self, proxy, latency):
+        """ Record a successful request through proxy that took latency seconds.
+        """
+        with self._lock:
+            stats = self.stats.get(proxy)
+            if stats is None:
+                return
+            stats.success_rate += self.alpha * (1. - stats.success_rate)
+            stats.latency = latency if stats.latency is None else stats.latency + self.alpha * (latency - stats.latency)
+            stats.consecutive_failures = 0
+            stats.proxy_errors = 0
+
+    def report_failure(self, proxy, cooldown=False, proxy_error=False):
+        """ Record a failed request through proxy.
+
+        :param cooldown: rest the proxy, e.g. after a 429, longer on every consecutive rest
+        :param proxy_error: the proxy itself failed, rest it and drop it after max_failures of these in a row
+        """
+        with self._lock:
+            stats = self.stats.get(proxy)
+            if stats is None:
+                return
+            stats.success_rate -= self.alpha * stats.success_rate
+            if proxy_error:
+                stats.proxy_errors += 1
+                if self.max_failures is not None and stats.proxy_errors >= self.max_failures:
+                    print('Proxy {0} failed {1} times in a row, dropping it.'.format(proxy, self.max_failures))
+                    del self.stats[proxy]
+                    return
+            if cooldown or proxy_error:
+                stats.consecutive_failures += 1
+                rest = min(self.max_cooldown, self.cooldown * 2 ** (stats.consecutive_failures - 1))
+                stats.cooldown_until = self.clock() + rest
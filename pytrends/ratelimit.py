@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Rate limiting for google trends crawlers.
+A RateLimiter is shared by any number of TrendReq instances and threads, it spaces requests with token buckets
+(one global, one per proxy) and backs off adaptively when google answers with 429s.
+"""
+
+import threading
+import time
+
+
+class TokenBucket(object):
+    """ Token bucket refilled at a constant rate.
+
+    Tokens are reserved ahead of time: a reservation may drive the bucket into debt and returns how long the
+    caller has to wait before its token is actually available. This keeps concurrent callers evenly spaced.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic):
+        """ :param rate: tokens added per second, None for an unlimited bucket
+        :param capacity: maximum number of tokens, i.e. the allowed burst
+        :param clock: monotonic clock returning seconds
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens=1):
+        """ Take tokens from the bucket and return the number of seconds to wait before using them.
+        """
+        with self._lock:
+            if self.rate is None:
+                return 0.0
+            self._refill(self.clock())
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def set_rate(self, rate):
+        """ Change the refill rate, tokens accumulated so far are kept.
+        """
+        with self._lock:
+            self._refill(self.clock())
+            self.rate = rate
+
+
+class RateLimiter(object):
+    """ Global and per-proxy token buckets with adaptive backoff.
+
+    Every request first calls acquire(proxy), which blocks until both the global and the proxy bucket grant a
+    token and any backoff period is over. Requests report back with on_success(proxy) or on_throttle(proxy):
+    a throttled key is paused for backoff seconds, growing exponentially with consecutive throttles, and its
+    rate is cut by decrease; every success lifts the rate by increase up to max_rate (additive increase,
+    multiplicative decrease), so crawlers settle at the highest rate google tolerates below max_rate.
+    """
+
+    def __init__(self, rate=None, burst=1, per_proxy_rate=None, per_proxy_burst=1,
+                 min_rate=1 / 120., max_rate=1., increase=0.01, decrease=0.5,
+                 backoff=60., backoff_factor=2., max_backoff=900.,
+                 clock=time.monotonic, sleep=time.sleep):
+        """ :param rate: global requests per second, None for unlimited
+        :param burst: global bucket capacity
+        :param per_proxy_rate: requests per second for each proxy, None for unlimited
+        :param per_proxy_burst: capacity of each proxy bucket
+        :param min_rate: lower bound of adapted rates
+        :param max_rate: upper bound of adapted rates, rates set above it are never raised, None lets them climb
+            until google throttles
+        :param increase: requests per second added to a rate after each success
+        :param decrease: factor applied to a rate after each throttle
+        :param backoff: pause in seconds after the first throttle
+        :param backoff_factor: growth of the pause for each consecutive throttle
+        :param max_backoff: longest pause in seconds
+        :param clock: monotonic clock returning seconds
+        :param sleep: function used to wait
+        """
+        self.clock = clock
+        self.sleep = sleep
+        self.rate = rate
+        self.per_proxy_rate = per_proxy_rate
+        self.per_proxy_burst = per_proxy_burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.global_bucket = TokenBucket(rate, burst, clock=clock)
+        self.proxy_buckets = dict()
+        # key -> (number of consecutive throttles, time until which requests are paused)
+        self._penalties = dict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, key):
+        """ Bucket ruling the rate of key: its own bucket for a proxy, the global one otherwise.
+        """
+        if key is None or self.per_proxy_rate is None:
+            return self.global_bucket
+        with self._lock:
+            if key not in self.proxy_buckets:
+                self.proxy_buckets[key] = TokenBucket(self.per_proxy_rate, self.per_proxy_burst, clock=self.clock)
+            return self.proxy_buckets[key]
+
+    def delay(self, key=None):
+        """ Seconds left in the backoff period of key (or of the whole limiter).
+        """
+        now = self.clock()
+        with self._lock:
+            paused_until = max(self._penalties.get(key, (0, 0))[1], self._penalties.get(None, (0, 0))[1])
+        return max(0., paused_until - now)
+
+    def acquire(self, key=None):
+        """ Block until a request through key (a proxy url, or None) is allowed.
+        """
+        wait = self.delay(key)
+        if wait > 0:
+            self.sleep(wait)
+        wait = self.global_bucket.reserve()
+        bucket = self._bucket(key)
+        if bucket is not self.global_bucket:
+            wait = max(wait, bucket.reserve())
+        if wait > 0:
+            self.sleep(wait)
+
+    def on_success(self, key=None):
+        """ Record a successful response and slowly raise the rate.
+        """
+        with self._lock:
+            self._penalties.pop(key, None)
+        bucket = self._bucket(key)
+        if bucket.rate is not None and self.increase:
+            if self.max_rate is None:
+                bucket.set_rate(bucket.rate + self.increase)
+            elif bucket.rate < self.max_rate:
+                bucket.set_rate(min(self.max_rate, bucket.rate + self.increase))
+
+    def on_throttle(self, key=None):
+        """ Record a 429 (or otherwise refused) response: pause key and cut its rate.
+        """
+        now = self.clock()
+        with self._lock:
+            count = self._penalties.get(key, (0, 0))[0] + 1
+            pause = min(self.max_backoff, self.backoff * self.backoff_factor ** (count - 1))
+            self._penalties[key] = (count, now + pause)
+        bucket = self._bucket(key)
+        if bucket.rate is not None:
+            bucket.set_rate(max(self.min_rate, bucket.rate * self.decrease))
@@ -7,10 +7,19 @@ Inspired by https://github.com/GeneralMills/pytrends and modified by Siqi Wu.
 Email: siqi dot wu at anu dot edu dot au
 """
 
-import json, requests
-import pandas as pd
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
 
 from pytrends import exceptions
+from pytrends.cookies import COOKIE_REJECTED_CODES, DEFAULT_COOKIE_CACHE
+from pytrends.metrics import Hooks, request_event
+from pytrends.parsing import MAX_COMPARISON_ITEMS, loads_trimmed, timeline_arrays, timeline_windows
+from pytrends.session import build_session
+from pytrends.tokens import DEFAULT_TOKEN_CACHE, TOKEN_REJECTED_CODES
 
 
 class TrendReq(object):
@@ -20,12 +29,27 @@ class TrendReq(object):
     GET_METHOD = 'get'
     POST_METHOD = 'post'
 
+    HOME_URL = 'https://trends.google.com/'
     GENERAL_URL = 'https://trends.google.com/trends/api/explore'
     INTEREST_OVER_TIME_URL = 'https://trends.google.com/trends/api/widgetdata/multiline'
     RELATED_QUERIES_URL = 'https://trends.google.com/trends/api/widgetdata/relatedsearches'
+    SUGGESTIONS_URL = 'https://trends.google.com/trends/api/autocomplete/'
 
-    def __init__(self, hl='en-US', tz=360, geo='', proxies=''):
+    def __init__(self, hl='en-US', tz=360, geo='', proxies='', pool_connections=10, pool_maxsize=10,
+                 keep_alive=True, session=None, cookie_cache=None, rate_limiter=None, cache=None, hooks=None,
+                 token_cache=None):
         """ Initialize default values for params
+
+        :param pool_connections: number of host pools kept by the http session
+        :param pool_maxsize: maximum number of keep-alive connections per pool
+        :param keep_alive: reuse connections across requests
+        :param session: an existing requests session to share between crawlers, overrides the pool options
+        :param cookie_cache: a CookieCache holding the NID cookie, defaults to the process-wide cache
+        :param rate_limiter: a RateLimiter consulted before each request, may be shared between crawlers
+        :param cache: a ResponseCache answering repeated requests from disk
+        :param hooks: a Hooks whose callbacks receive an event for every request, see metrics.MetricsAggregator
+        :param token_cache: a TokenCache reusing the explore widgets of repeated payloads, defaults to the
+            process-wide cache
         """
         # google rate limit
         self.google_rl = 'You have reached your quota limit. Please try again later.'
@@ -37,19 +61,55 @@ class TrendReq(object):
         self.geo = geo  # geo scope, 'worldwide' is ''
         # we don't support multiple keywords therefore change kw_list to keyword
         self.keyword = None
+        # timeframes of a build_payload_timeframes payload
+        self.timeframes = list()
 
         self.proxies = proxies  # add a proxy option
         # proxies format: {"http": "http://192.168.0.1:8888" , "https": "https://192.168.0.1:8888"}
-        self.cookies = dict(filter(
-            lambda i: i[0] == 'NID',
-            requests.get('https://trends.google.com').cookies.items()
-        ))
+        # one pooled session reused by every request of this crawler
+        if session is None:
+            session = build_session(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                    keep_alive=keep_alive)
+        self.session = session
+        # the NID cookie is fetched on the first request and shared with other crawlers
+        self.cookie_cache = cookie_cache if cookie_cache is not None else DEFAULT_COOKIE_CACHE
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.hooks = hooks if hooks is not None else Hooks()
+        self.token_cache = token_cache if token_cache is not None else DEFAULT_TOKEN_CACHE
 
         # initialize widget payloads
         self.token_payload = dict()
+        self.token_key = None
         self.interest_over_time_widget = dict()
         self.related_topics_widget_list = dict()
 
+    @property
+    def cookies(self):
+        """ The NID cookie for the current proxy, fetched from google on first access.
+        """
+        return self.cookie_cache.get(self._cookie_key(), self._fetch_cookies)
+
+    def _cookie_key(self):
+        if self.proxies != '':
+            return self.proxies.get('https')
+        return None
+
+    def _fetch_cookies(self):
+        """ Request google trends homepage and harvest the NID cookie.
+        """
+        return dict(filter(
+            lambda i: i[0] == 'NID',
+            self.session.get(self.HOME_URL, proxies=self._get_proxies()).cookies.items()
+        ))
+
+    def _get_proxies(self):
+        """ Return the proxies mapping passed to the session, None if no proxy is set.
+        """
+        if self.proxies != '':
+            return self.proxies
+        return None
+
     def _get_data(self, url, method=GET_METHOD, trim_chars=0, **kwargs):
         """ Send a request to Google and return the JSON response as a Python object.
 
@@ -60,13 +120,21 @@ class TrendReq(object):
         :param kwargs: any extra key arguments passed to the request builder (usually query parameters or data)
         :return:
         """
-        s = requests.session()
-        if self.proxies != '':
-            s.proxies.update(self.proxies)
-        if method == TrendReq.POST_METHOD:
-            response = s.post(url, cookies=self.cookies, **kwargs)
-        else:
-            response = s.get(url, cookies=self.cookies, **kwargs)
+        event = request_event(url, method)
+        use_cache = self.cache is not None and method == TrendReq.GET_METHOD
+        if use_cache:
+            body = self.cache.get(url, kwargs.get('params'))
+            if body is not None:
+                event.update(cached=True, status=200, bytes=len(body))
+                return self._parse(event, body)
+
+        response = self._send(event, url, method, **kwargs)
+        if response.status_code in COOKIE_REJECTED_CODES:
+            # google refused the cached cookie, get a fresh one and try once more
+            self.hooks.emit('after_response', event)
+            self.cookie_cache.invalidate(self._cookie_key())
+            self.hooks.emit('on_retry', event)
+            response = self._send(event, url, method, **kwargs)
 
         # check if the response contains json and throw an exception otherwise.
         # Google mostly sends 'application/json' in the Content-Type header,
@@ -78,43 +146,143 @@ class TrendReq(object):
             # trim initial characters
             # some responses start with garbage characters, like ")]}',"
             # these have to be cleaned before being passed to the json parser
-            content = response.text[trim_chars:]
+            # the prefix is skipped by offset, no trimmed copy is made
+            content = response.content
+            if use_cache:
+                self.cache.set(url, kwargs.get('params'), content[trim_chars:])
+            if self.rate_limiter is not None:
+                self.rate_limiter.on_success(self._cookie_key())
 
             # parse json
-            return json.loads(content)
+            return self._parse(event, content, trim_chars)
         else:
+            # google refused the request, usually with a 429: back off
+            if self.rate_limiter is not None:
+                self.rate_limiter.on_throttle(self._cookie_key())
+            if response.status_code in TOKEN_REJECTED_CODES and 'token' in (kwargs.get('params') or {}):
+                # google refused the token of a widget, explore again next time
+                explore_params = self.token_cache.invalidate_token(kwargs['params']['token'])
+                if self.cache is not None:
+                    # the cached explore responses hold the same token
+                    for params in explore_params:
+                        self.cache.delete(self.GENERAL_URL, params)
+            self.hooks.emit('after_response', event)
+            event['error'] = 'status_{0}'.format(response.status_code)
+            self.hooks.emit('on_error', event)
             # this is often the case when the amount of keywords in the payload for the IP
             # is not allowed by Google
             raise exceptions.ResponseError('The request failed: Google returned a '
                                            'response with code {0}.'.format(response.status_code), response=response)
 
+    def _parse(self, event, content, trim_chars=0):
+        """ Decode a response body, timing it for the hooks.
+        """
+        start = time.perf_counter()
+        try:
+            req_json = loads_trimmed(content, trim_chars)
+        except ValueError as e:
+            event['error'] = type(e).__name__
+            self.hooks.emit('on_error', event)
+            raise
+        event['parse'] = time.perf_counter() - start
+        self.hooks.emit('after_response', event)
+        return req_json
+
+    def _send(self, event, url, method, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self._cookie_key())
+        cookies = self.cookies
+        event.update(proxy=self._cookie_key(), attempt=event['attempt'] + 1, status=None, bytes=0, error=None,
+                     ttfb=None, total=None, parse=None)
+        self.hooks.emit('before_request', event)
+        start = time.perf_counter()
+        try:
+            if method == TrendReq.POST_METHOD:
+                response = self.session.post(url, cookies=cookies, proxies=self._get_proxies(), **kwargs)
+            else:
+                response = self.session.get(url, cookies=cookies, proxies=self._get_proxies(), **kwargs)
+        except requests.exceptions.RequestException as e:
+            event.update(total=time.perf_counter() - start, error=type(e).__name__)
+            self.hooks.emit('on_error', event)
+            raise
+        event.update(total=time.perf_counter() - start, ttfb=response.elapsed.total_seconds(),
+                     status=response.status_code, bytes=len(response.content))
+        return response
+
     def build_payload(self, keyword, cat=0, timeframe='today 5-y', geo='', gprop=''):
         """ Create the payload for interest over time.
         """
         self.keyword = keyword
         self.geo = geo
-        self.token_payload = {
+        self.token_payload = self._token_payload(keyword, cat, timeframe, self.geo, gprop)
+        self.token_key = self.token_cache.key(keyword, cat, timeframe, self.geo, gprop, self.hl, self.tz)
+        # get tokens
+        self._tokens()
+        return
+
+    def build_payload_timeframes(self, keyword, timeframes, cat=0, geo='', gprop=''):
+        """ Create the payload of keyword over up to five timeframes, compared in a single explore request.
+
+        :param timeframes: list of timeframes, e.g. consecutive query periods, see interest_over_time_windows
+        """
+        timeframes = list(timeframes)
+        if not 0 < len(timeframes) <= MAX_COMPARISON_ITEMS:
+            raise ValueError('Between 1 and {0} timeframes per payload, got {1}'.format(MAX_COMPARISON_ITEMS,
+                                                                                         len(timeframes)))
+        self.keyword = keyword
+        self.geo = geo
+        self.token_payload = self._token_payload(keyword, cat, timeframes, self.geo, gprop)
+        self.token_key = self.token_cache.key(keyword, cat, tuple(timeframes), self.geo, gprop, self.hl, self.tz)
+        self.timeframes = timeframes
+        # get tokens
+        self._tokens()
+        return
+
+    def _token_payload(self, keyword, cat, timeframe, geo, gprop):
+        """ Build the explore request parameters of a keyword, with one comparison item per timeframe if timeframe
+        is a list.
+        """
+        token_payload = {
             'hl': self.hl,
             'tz': self.tz,
             'req': {'comparisonItem': [], 'category': cat, 'property': gprop}
         }
 
         # build out json for a keyword
-        keyword_payload = {'keyword': keyword, 'time': timeframe, 'geo': self.geo}
-        self.token_payload['req']['comparisonItem'].append(keyword_payload)
+        for item_timeframe in ([timeframe] if isinstance(timeframe, str) else timeframe):
+            keyword_payload = {'keyword': keyword, 'time': item_timeframe, 'geo': geo}
+            token_payload['req']['comparisonItem'].append(keyword_payload)
         # requests will mangle this if it is not a string
-        self.token_payload['req'] = json.dumps(self.token_payload['req'])
-        # get tokens
-        self._tokens()
-        return
+        token_payload['req'] = json.dumps(token_payload['req'])
+        return token_payload
+
+    def prefetch_tokens(self, keyword, timeframes, cat=0, geo='', gprop='', max_workers=4):
+        """ Fetch the tokens of keyword for every timeframe up front, so that build_payload on any of them costs
+        no request.
+
+        :param timeframes: list of timeframes, e.g. consecutive query periods
+        :param max_workers: number of explore requests in flight
+        :return: a dict mapping each timeframe to its widgets, failed timeframes are left out and fetched again by
+            build_payload
+        """
+        def fetch(timeframe):
+            return self._widgets(self._token_payload(keyword, cat, timeframe, geo, gprop),
+                                 self.token_cache.key(keyword, cat, timeframe, geo, gprop, self.hl, self.tz))
+
+        result = dict()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [(timeframe, pool.submit(fetch, timeframe)) for timeframe in timeframes]
+            for timeframe, future in futures:
+                try:
+                    result[timeframe] = future.result()
+                except exceptions.ResponseError as e:
+                    print(e)
+        return result
 
     def _tokens(self):
         """ Makes request to Google to get API tokens for interest over time.
         """
-
-        # make the request and parse the returned json
-        widget_dict = self._get_data(url=TrendReq.GENERAL_URL, method=TrendReq.GET_METHOD, params=self.token_payload,
-                                     trim_chars=4,)['widgets']
+        widget_dict = self._widgets(self.token_payload, self.token_key)
 
         # assign requests
         for widget in widget_dict:
@@ -124,6 +292,20 @@ class TrendReq(object):
                 self.related_topics_widget_list = widget
         return
 
+    def _widgets(self, token_payload, token_key=None):
+        """ Widgets of an explore request, from the token cache if they were fetched recently.
+        """
+        widget_dict = None
+        if token_key is not None:
+            widget_dict = self.token_cache.get(token_key)
+        if widget_dict is None:
+            # make the request and parse the returned json
+            widget_dict = self._get_data(url=self.GENERAL_URL, method=TrendReq.GET_METHOD, params=token_payload,
+                                         trim_chars=4,)['widgets']
+            if token_key is not None:
+                self.token_cache.set(token_key, widget_dict, token_payload)
+        return widget_dict
+
     def interest_over_time(self):
         """ Request data from Google's Interest Over Time section and return a numpy array.
         """
@@ -136,15 +318,34 @@ class TrendReq(object):
         }
 
         # make the request and parse the returned json
-        req_json = self._get_data(url=TrendReq.INTEREST_OVER_TIME_URL, method=TrendReq.GET_METHOD, trim_chars=5,
+        req_json = self._get_data(url=self.INTEREST_OVER_TIME_URL, method=TrendReq.GET_METHOD, trim_chars=5,
                                   params=over_time_payload, )
 
-        df = pd.DataFrame(req_json['default']['timelineData'])
-        if df.empty:
+        times, values, _ = timeline_arrays(req_json['default']['timelineData'])
+        if len(times) == 0:
             return None
 
-        interest_list = df['value'].apply(lambda x: int(str(x)[1: -1])).tolist()
-        return interest_list
+        return values[:, 0]
+
+    def interest_over_time_windows(self):
+        """ Request the Interest Over Time section of a build_payload_timeframes payload.
+
+        :return: one numpy array per timeframe, None for timeframes without data. Values of all timeframes are
+            relative to the busiest day among them.
+        """
+        over_time_payload = {
+            # convert to string as requests will mangle
+            'req': json.dumps(self.interest_over_time_widget['request']),
+            'token': self.interest_over_time_widget['token'],
+            'tz': self.tz
+        }
+
+        # make the request and parse the returned json
+        req_json = self._get_data(url=self.INTEREST_OVER_TIME_URL, method=TrendReq.GET_METHOD, trim_chars=5,
+                                  params=over_time_payload, )
+
+        windows = timeline_windows(req_json['default']['timelineData'], len(self.timeframes))
+        return [values if len(times) > 0 else None for times, values, _ in windows]
 
     def related_topics(self):
         """ Request data from Google's Related Topics section and return a dictionary of dataframes.
@@ -159,9 +360,18 @@ class TrendReq(object):
         }
 
         # make the request and parse the returned json
-        req_json = self._get_data(url=TrendReq.RELATED_QUERIES_URL, method=TrendReq.GET_METHOD, trim_chars=5,
+        req_json = self._get_data(url=self.RELATED_QUERIES_URL, method=TrendReq.GET_METHOD, trim_chars=5,
                                   params=related_payload, )
 
         related_topics_list = req_json['default']['rankedList'][0]['rankedKeyword']
         related_topics_list = [dict(x['topic'], **{'value': x['value']}) for x in related_topics_list]
         return related_topics_list
+
+    def suggestions(self, keyword):
+        """ Request the topics suggested by Google's autocomplete for a keyword, one light request without payload.
+
+        :return: a list of dicts with the keys mid, title and type
+        """
+        req_json = self._get_data(url=self.SUGGESTIONS_URL + quote(keyword, safe=''), method=TrendReq.GET_METHOD,
+                                  trim_chars=5, params={'hl': self.hl, 'tz': self.tz}, )
+        return req_json['default']['topics']
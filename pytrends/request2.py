@@ -7,11 +7,26 @@ Inspired by https://github.com/GeneralMills/pytrends and modified by Siqi Wu.
 Email: siqi dot wu at anu dot edu dot au
 """
 
-import json, requests
+import json, requests, time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import quote
 import pandas as pd
-from pandas.io.json._normalize import nested_to_record
-from urllib3.util.retry import Retry
 from pytrends import exceptions
+from pytrends.categories import default_path, load_categories
+from pytrends.cookies import COOKIE_REJECTED_CODES, DEFAULT_COOKIE_CACHE
+from pytrends.metrics import Hooks, request_event
+from pytrends.parsing import (MAX_COMPARISON_ITEMS, geo_frame, geo_timeline_frame,
+                              loads_trimmed, related_frame, timeline_frame,
+                              window_frames)
+from pytrends.proxies import ProxyPool
+from pytrends.session import build_session
+from pytrends.tokens import DEFAULT_TOKEN_CACHE, TOKEN_REJECTED_CODES
+
+
+def _hashable(value):
+    """Per-item lists of timeframes or geos as tuples, so that they can key the token cache"""
+    return value if isinstance(value, str) else tuple(value)
 
 
 class TrendReq(object):
@@ -20,6 +35,7 @@ class TrendReq(object):
     """
     GET_METHOD = 'get'
     POST_METHOD = 'post'
+    HOME_URL = 'https://trends.google.com/'
     GENERAL_URL = 'https://trends.google.com/trends/api/explore'
     INTEREST_OVER_TIME_URL = 'https://trends.google.com/trends/api/widgetdata/multiline'
     INTEREST_BY_REGION_URL = 'https://trends.google.com/trends/api/widgetdata/comparedgeo'
@@ -31,9 +47,23 @@ class TrendReq(object):
     TODAY_SEARCHES_URL = 'https://trends.google.com/trends/api/dailytrends'
 
     def __init__(self, hl='en-US', tz=360, geo='', timeout=(2, 5), proxies='',
-                 retries=0, backoff_factor=0):
+                 retries=0, backoff_factor=0, pool_connections=10, pool_maxsize=10,
+                 keep_alive=True, session=None, cookie_cache=None,
+                 rate_limiter=None, cache=None, hooks=None, token_cache=None):
         """
         Initialize default values for params
+        retries and backoff_factor are mounted on the pooled session, pool_connections, pool_maxsize
+        and keep_alive configure its connection pool; pass session to share one pool between crawlers
+        cookie_cache holds one NID cookie per proxy, defaults to the process-wide cache
+        rate_limiter is a pytrends.ratelimit.RateLimiter consulted before each request,
+        share one between crawlers to bound their combined rate
+        cache is a pytrends.cache.ResponseCache answering repeated requests from disk
+        proxies is a list of https proxy urls or a pytrends.proxies.ProxyPool shared between crawlers,
+        every request goes through the healthiest available proxy
+        hooks is a pytrends.metrics.Hooks whose callbacks receive an event for every request,
+        see pytrends.metrics.MetricsAggregator
+        token_cache is a pytrends.tokens.TokenCache reusing the explore widgets of repeated payloads,
+        defaults to the process-wide cache
         """
         # google rate limit
         self.google_rl = 'You have reached your quota limit. Please try again later.'
@@ -44,51 +74,110 @@ class TrendReq(object):
         self.geo = geo
         self.kw_list = list()
         self.timeout = timeout
-        self.proxies = proxies  # add a proxy option
+        # add a proxy option, proxies are scored by their health
+        if isinstance(proxies, ProxyPool):
+            self.proxy_pool = proxies
+        elif len(proxies) > 0:
+            self.proxy_pool = ProxyPool(proxies)
+        else:
+            self.proxy_pool = None
         self.retries = retries
         self.backoff_factor = backoff_factor
         self.proxy_index = 0
-        self.cookies = self.GetGoogleCookie()
+        self._proxy = None
+        # one pooled session reused by every request of this crawler
+        if session is None:
+            session = build_session(pool_connections=pool_connections,
+                                    pool_maxsize=pool_maxsize,
+                                    keep_alive=keep_alive,
+                                    retries=retries,
+                                    backoff_factor=backoff_factor)
+        self.session = session
+        self.session.headers.update({'accept-language': self.hl})
+        # cookies are fetched once per proxy on first use
+        self.cookie_cache = cookie_cache if cookie_cache is not None else DEFAULT_COOKIE_CACHE
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.hooks = hooks if hooks is not None else Hooks()
+        self.token_cache = token_cache if token_cache is not None else DEFAULT_TOKEN_CACHE
         # intialize widget payloads
         self.token_payload = dict()
+        self.token_key = None
+        self.timeframes = list()
         self.interest_over_time_widget = dict()
         self.interest_by_region_widget = dict()
         self.related_topics_widget_list = list()
         self.related_queries_widget_list = list()
 
+    @property
+    def proxies(self):
+        """Proxy urls left in the pool, proxies dropped by the pool are left out"""
+        if self.proxy_pool is None:
+            return list()
+        return self.proxy_pool.proxies
+
+    @property
+    def cookies(self):
+        """NID cookie of the current proxy"""
+        return self.GetGoogleCookie()
+
+    def _current_proxy(self):
+        """Proxy url used by the next request, None without proxies"""
+        if self.proxy_pool is None:
+            return None
+        if self._proxy is None:
+            self._select_proxy()
+        return self._proxy
+
+    def _select_proxy(self):
+        """Pick the healthiest available proxy from the pool"""
+        if self.proxy_pool is None:
+            return None
+        self._proxy = self.proxy_pool.choose()
+        proxies = self.proxies
+        if self._proxy in proxies:
+            self.proxy_index = proxies.index(self._proxy)
+        return self._proxy
+
+    def _fetch_cookie(self, proxy):
+        """Request google trends homepage through proxy and harvest the NID cookie"""
+        return dict(filter(lambda i: i[0] == 'NID', self.session.get(
+            '{home}?geo={geo}'.format(
+                home=self.HOME_URL, geo=self.hl[-2:]),
+            timeout=self.timeout,
+            proxies={'https': proxy} if proxy else None
+        ).cookies.items()))
+
     def GetGoogleCookie(self):
         """
-        Gets google cookie (used for each and every proxy; once on init otherwise)
-        Removes proxy from the list on proxy error
+        Gets google cookie of the current proxy from the cookie cache,
+        fetching it only once per proxy (once overall without proxies)
+        Puts the proxy in cooldown and switches to another one on proxy error
         """
+        proxy, cookies = self._cookies_for(self._current_proxy())
+        return cookies
+
+    def _cookies_for(self, proxy):
+        """Return (proxy, cookies), switching proxy on proxy error"""
         while True:
-            if len(self.proxies) > 0:
-                proxy = {'https': self.proxies[self.proxy_index]}
-            else:
-                proxy = ''
             try:
-                return dict(filter(lambda i: i[0] == 'NID', requests.get(
-                    'https://trends.google.com/?geo={geo}'.format(
-                        geo=self.hl[-2:]),
-                    timeout=self.timeout,
-                    proxies=proxy
-                ).cookies.items()))
+                return proxy, self.cookie_cache.get(
+                    proxy, partial(self._fetch_cookie, proxy))
             except requests.exceptions.ProxyError:
+                if proxy is None:
+                    raise
                 print('Proxy error. Changing IP')
-                if len(self.proxies) > 0:
-                    self.proxies.remove(self.proxies[self.proxy_index])
-                else:
-                    print('Proxy list is empty. Bye!')
-                continue
+                self.cookie_cache.invalidate(proxy)
+                self.proxy_pool.report_failure(proxy, proxy_error=True)
+                # waits for a cooldown to end if no proxy is available,
+                # raises ProxyPoolExhausted once every proxy was dropped
+                proxy = self._select_proxy()
 
     def GetNewProxy(self):
         """
-        Increment proxy INDEX; zero on overflow
+        Select the healthiest available proxy for the next request
         """
-        if self.proxy_index < (len(self.proxies) - 1):
-            self.proxy_index += 1
-        else:
-            self.proxy_index = 0
+        self._select_proxy()
 
     def _get_data(self, url, method=GET_METHOD, trim_chars=0, **kwargs):
         """Send a request to Google and return the JSON response as a Python object
@@ -99,76 +188,262 @@ class TrendReq(object):
         :param kwargs: any extra key arguments passed to the request builder (usually query parameters or data)
         :return:
         """
-        s = requests.session()
-        # Retries mechanism. Activated when one of statements >0 (best used for proxy)
-        if self.retries > 0 or self.backoff_factor > 0:
-            retry = Retry(total=self.retries, read=self.retries,
-                          connect=self.retries,
-                          backoff_factor=self.backoff_factor)
-
-        s.headers.update({'accept-language': self.hl})
-        if len(self.proxies) > 0:
-            self.cookies = self.GetGoogleCookie()
-            s.proxies.update({'https': self.proxies[self.proxy_index]})
-        if method == TrendReq.POST_METHOD:
-            response = s.post(url, timeout=self.timeout,
-                              cookies=self.cookies, **kwargs)  # DO NOT USE retries or backoff_factor here
-        else:
-            response = s.get(url, timeout=self.timeout, cookies=self.cookies,
-                             **kwargs)  # DO NOT USE retries or backoff_factor here
+        event = request_event(url, method)
+        use_cache = self.cache is not None and method == TrendReq.GET_METHOD
+        if use_cache:
+            body = self.cache.get(url, kwargs.get('params'))
+            if body is not None:
+                event.update(cached=True, status=200, bytes=len(body))
+                return self._parse(event, body)
+        response = self._request(event, url, method, **kwargs)
+        # trim initial characters
+        # some responses start with garbage characters, like ")]}',"
+        # these have to be cleaned before being passed to the json parser
+        # the prefix is skipped by offset, no trimmed copy is made
+        content = response.content
+        if use_cache:
+            self.cache.set(url, kwargs.get('params'), content[trim_chars:])
+        # parse json
+        return self._parse(event, content, trim_chars)
+
+    def _request(self, event, url, method=GET_METHOD, **kwargs):
+        """Send a request, once more with a new cookie if google rejected the cookie, and
+        report its outcome to the rate limiter and the proxy pool
+        Returns a response with a json body, or a 304 to a conditional request, and raises
+        ResponseError on any other response
+        """
+        # retries and backoff_factor are mounted on the pooled session
+        response, proxy = self._send(event, url, method, **kwargs)
+        if response.status_code in COOKIE_REJECTED_CODES:
+            # google rejected the cookie of this proxy, fetch a new one and retry once
+            self.hooks.emit('after_response', event)
+            self.cookie_cache.invalidate(proxy)
+            self.hooks.emit('on_retry', event)
+            response, proxy = self._send(event, url, method, **kwargs)
         # check if the response contains json and throw an exception otherwise
         # Google mostly sends 'application/json' in the Content-Type header,
         # but occasionally it sends 'application/javascript
         # and sometimes even 'text/javascript
-        if response.status_code == 200 and 'application/json' in \
+        if response.status_code == 304 or response.status_code == 200 and 'application/json' in \
                 response.headers['Content-Type'] or \
                 'application/javascript' in response.headers['Content-Type'] or \
                 'text/javascript' in response.headers['Content-Type']:
-            # trim initial characters
-            # some responses start with garbage characters, like ")]}',"
-            # these have to be cleaned before being passed to the json parser
-            content = response.text[trim_chars:]
-            # parse json
-            self.GetNewProxy()
-            return json.loads(content)
+            if self.rate_limiter is not None:
+                self.rate_limiter.on_success(proxy)
+            if self.proxy_pool is not None:
+                self.proxy_pool.report_success(
+                    proxy, response.elapsed.total_seconds())
+            return response
         else:
-            # error
+            # error, usually a 429: slow down this proxy
+            if self.rate_limiter is not None:
+                self.rate_limiter.on_throttle(proxy)
+            if self.proxy_pool is not None:
+                self.proxy_pool.report_failure(
+                    proxy, cooldown=response.status_code == 429)
+            if response.status_code in TOKEN_REJECTED_CODES and \
+                    'token' in (kwargs.get('params') or {}):
+                # google refused the token of a widget, explore again next time
+                explore_params = self.token_cache.invalidate_token(
+                    kwargs['params']['token'])
+                if self.cache is not None:
+                    # the cached explore responses hold the same token
+                    for params in explore_params:
+                        self.cache.delete(self.GENERAL_URL, params)
+            self.hooks.emit('after_response', event)
+            event['error'] = 'status_{0}'.format(response.status_code)
+            self.hooks.emit('on_error', event)
             raise exceptions.ResponseError(
                 'The request failed: Google returned a '
                 'response with code {0}.'.format(response.status_code),
                 response=response)
 
+    def _parse(self, event, content, trim_chars=0):
+        """Decode a response body, timing it for the hooks"""
+        start = time.perf_counter()
+        try:
+            req_json = loads_trimmed(content, trim_chars)
+        except ValueError as e:
+            event['error'] = type(e).__name__
+            self.hooks.emit('on_error', event)
+            raise
+        event['parse'] = time.perf_counter() - start
+        self.hooks.emit('after_response', event)
+        return req_json
+
+    def _send(self, event, url, method, **kwargs):
+        """Send one request through the healthiest proxy with its cached cookie
+        Returns the response and the proxy it went through
+        """
+        proxy, cookies = self._cookies_for(self._select_proxy())
+        proxies = {'https': proxy} if proxy else None
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(proxy)
+        event.update(proxy=proxy, attempt=event['attempt'] + 1, status=None,
+                     bytes=0, error=None, ttfb=None, total=None, parse=None)
+        self.hooks.emit('before_request', event)
+        start = time.perf_counter()
+        try:
+            if method == TrendReq.POST_METHOD:
+                response = self.session.post(url, timeout=self.timeout,
+                                             cookies=cookies, proxies=proxies,
+                                             **kwargs)
+            else:
+                response = self.session.get(url, timeout=self.timeout,
+                                            cookies=cookies, proxies=proxies,
+                                            **kwargs)
+        except requests.exceptions.RequestException as e:
+            event.update(total=time.perf_counter() - start,
+                         error=type(e).__name__)
+            if isinstance(e, requests.exceptions.ProxyError):
+                # the cookie is tied to the failing proxy, bootstrap again next time
+                self.cookie_cache.invalidate(proxy)
+                if proxy is not None:
+                    self.proxy_pool.report_failure(proxy, proxy_error=True)
+            self.hooks.emit('on_error', event)
+            raise
+        event.update(total=time.perf_counter() - start,
+                     ttfb=response.elapsed.total_seconds(),
+                     status=response.status_code, bytes=len(response.content))
+        return response, proxy
+
     def build_payload(self, kw_list, cat=0, timeframe='today 5-y', geo='',
                       gprop=''):
-        """Create the payload for related queries, interest over time and interest by region"""
+        """Create the payload for related queries, interest over time and interest by region
+        cat is a category id or name, see categories()"""
+        self._set_payload(kw_list, self._category_id(cat), timeframe, geo,
+                          gprop)
+        # get tokens
+        self._tokens()
+        return
+
+    def build_payload_timeframes(self, keyword, timeframes, cat=0, geo='',
+                                 gprop=''):
+        """Create the payload comparing keyword (or a topic mid) over up to five timeframes,
+        one comparison item per timeframe, so that a single explore and a single multiline
+        request cover all of them, see interest_over_time_windows
+        """
+        timeframes = list(timeframes)
+        self._set_payload(self._window_keywords(keyword, timeframes),
+                          self._category_id(cat), timeframes, geo, gprop)
+        # get tokens
+        self._tokens()
+        return
+
+    def _set_payload(self, kw_list, cat, timeframe, geo, gprop):
+        """Store the payload of build_payload, or of build_payload_timeframes if timeframe is a list
+        cat is a category id, the explore request itself is left to the caller"""
         self.kw_list = kw_list
         self.geo = geo or self.geo
-        self.token_payload = {
+        self.token_payload, self.token_key = self._explore_request(
+            kw_list, cat, timeframe, self.geo, gprop)
+        self.timeframes = list() if isinstance(timeframe, str) else timeframe
+
+    @staticmethod
+    def _window_keywords(keyword, timeframes):
+        """Keyword list of a payload comparing keyword over timeframes, one item per timeframe"""
+        if not 0 < len(timeframes) <= MAX_COMPARISON_ITEMS:
+            raise ValueError('Between 1 and {0} timeframes per payload, got {1}'.format(
+                MAX_COMPARISON_ITEMS, len(timeframes)))
+        return [keyword] * len(timeframes)
+
+    def prefetch_tokens(self, kw_list, timeframes, cat=0, geo='', gprop='',
+                        max_workers=4):
+        """Fetch the tokens of kw_list for every timeframe up front, max_workers explore requests
+        in flight, so that build_payload on any of them costs no request
+        Returns a dict mapping each timeframe to its widgets, failed timeframes are left out
+        and fetched again by build_payload
+        """
+        geo = geo or self.geo
+        cat = self._category_id(cat)
+
+        def fetch(timeframe):
+            return self._widgets(*self._explore_request(
+                kw_list, cat, timeframe, geo, gprop))
+
+        result = dict()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [(timeframe, pool.submit(fetch, timeframe))
+                       for timeframe in timeframes]
+            for timeframe, future in futures:
+                try:
+                    result[timeframe] = future.result()
+                except exceptions.ResponseError as e:
+                    print(e)
+        return result
+
+    def _token_payload(self, kw_list, cat=0, timeframe='today 5-y', geo='',
+                       gprop=''):
+        """Build the explore request parameters for a list of keywords
+        timeframe and geo are either shared by all keywords or lists with one value per keyword"""
+        token_payload = {
             'hl': self.hl,
             'tz': self.tz,
             'req': {'comparisonItem': [], 'category': cat, 'property': gprop}
         }
+        if isinstance(timeframe, str):
+            timeframe = [timeframe] * len(kw_list)
+        if isinstance(geo, str):
+            geo = [geo] * len(kw_list)
 
         # build out json for each keyword
-        for kw in self.kw_list:
-            keyword_payload = {'keyword': kw, 'time': timeframe,
-                               'geo': self.geo}
-            self.token_payload['req']['comparisonItem'].append(keyword_payload)
+        for kw, kw_timeframe, kw_geo in zip(kw_list, timeframe, geo):
+            keyword_payload = {'keyword': kw, 'time': kw_timeframe,
+                               'geo': kw_geo}
+            token_payload['req']['comparisonItem'].append(keyword_payload)
         # requests will mangle this if it is not a string
-        self.token_payload['req'] = json.dumps(self.token_payload['req'])
-        # get tokens
-        self._tokens()
-        return
+        token_payload['req'] = json.dumps(token_payload['req'])
+        return token_payload
+
+    def _explore_request(self, kw_list, cat=0, timeframe='today 5-y', geo='',
+                         gprop=''):
+        """Explore request parameters of a payload and its token cache key, see _token_payload"""
+        return (self._token_payload(kw_list, cat=cat, timeframe=timeframe,
+                                    geo=geo, gprop=gprop),
+                self.token_cache.key(kw_list, cat, _hashable(timeframe),
+                                     _hashable(geo), gprop, self.hl, self.tz))
+
+    def _explore_args(self, token_payload):
+        """_get_data arguments of an explore request"""
+        return dict(url=self.GENERAL_URL, method=TrendReq.GET_METHOD,
+                    params=token_payload, trim_chars=4)
 
     def _tokens(self):
         """Makes request to Google to get API tokens for interest over time, interest by region and related queries"""
-        # make the request and parse the returned json
-        widget_dict = self._get_data(
-            url=TrendReq.GENERAL_URL,
-            method=TrendReq.GET_METHOD,
-            params=self.token_payload,
-            trim_chars=4,
-        )['widgets']
+        widget_dict = self._widgets(self.token_payload, self.token_key)
+        self._assign_widgets(widget_dict)
+        return
+
+    def _widgets(self, token_payload, token_key=None):
+        """Widgets of an explore request, from the token cache if they were fetched recently"""
+        widget_dict = self._cached_widgets(token_key)
+        if widget_dict is None:
+            # make the request and parse the returned json
+            widget_dict = self._store_widgets(
+                token_key, token_payload,
+                self._get_data(**self._explore_args(token_payload)))
+        return widget_dict
+
+    def _cached_widgets(self, token_key):
+        """Widgets of token_key in the token cache, None if missing or without a key"""
+        if token_key is None:
+            return None
+        return self.token_cache.get(token_key)
+
+    def _store_widgets(self, token_key, token_payload, req_json):
+        """Widgets of an explore response, kept in the token cache under token_key"""
+        widget_dict = req_json['widgets']
+        if token_key is not None:
+            self.token_cache.set(token_key, widget_dict, token_payload)
+        return widget_dict
+
+    @staticmethod
+    def _timeseries_widget(widget_dict):
+        """Interest over time widget of an explore response"""
+        return next(w for w in widget_dict if w['id'] == 'TIMESERIES')
+
+    def _assign_widgets(self, widget_dict):
+        """Store the widgets returned by the explore request"""
         # order of the json matters...
         first_region_token = True
         # clear self.related_queries_widget_list and self.related_topics_widget_list
@@ -189,101 +464,232 @@ class TrendReq(object):
                 self.related_queries_widget_list.append(widget)
         return
 
-    def interest_over_time(self):
-        """Request data from Google's Interest Over Time section and return a dataframe"""
+    def _widget_args(self, url, widget):
+        """_get_data arguments of a widget data request"""
+        return dict(url=url, method=TrendReq.GET_METHOD, trim_chars=5,
+                    params=self._widget_payload(widget))
 
-        over_time_payload = {
+    def _widget_payload(self, widget):
+        """Build the widgetdata request parameters of a widget"""
+        return {
             # convert to string as requests will mangle
-            'req': json.dumps(self.interest_over_time_widget['request']),
-            'token': self.interest_over_time_widget['token'],
+            'req': json.dumps(widget['request']),
+            'token': widget['token'],
             'tz': self.tz
         }
 
-        # make the request and parse the returned json
-        req_json = self._get_data(
-            url=TrendReq.INTEREST_OVER_TIME_URL,
+    def trending_searches(self, pn='united_states'):
+        """Request data from Google's Hot Searches section and return a dataframe
+        pn is the region in lower case, e.g. 'united_states' or 'japan'"""
+        return pd.DataFrame(self.trending_entries(pn))
+
+    def trending_entries(self, pn='united_states'):
+        """Trending searches of region pn as a list"""
+        lists = self.trending_lists()
+        if pn not in lists:
+            raise ValueError('No trending searches for region {0!r}'.format(pn))
+        return lists[pn]
+
+    def trending_lists(self):
+        """Trending searches of every region as a dict of lists keyed by region,
+        see pytrends.trending.TrendingPoller to follow them"""
+        # one json object with the list of every region, without prefix
+        return self._get_data(
+            url=self.TRENDING_SEARCHES_URL,
             method=TrendReq.GET_METHOD,
-            trim_chars=5,
-            params=over_time_payload,
         )
 
-        df = pd.DataFrame(req_json['default']['timelineData'])
-        if (df.empty):
-            return df
-
-        df['date'] = pd.to_datetime(df['time'].astype(dtype='float64'),
-                                    unit='s')
-        df = df.set_index(['date']).sort_index()
-        # split list columns into seperate ones, remove brackets and split on comma
-        result_df = df['value'].apply(lambda x: pd.Series(
-            str(x).replace('[', '').replace(']', '').split(',')))
-        # rename each column with its search term, relying on order that google provides...
-        for idx, kw in enumerate(self.kw_list):
-            # there is currently a bug with assigning columns that may be
-            # parsed as a date in pandas: use explicit insert column method
-            result_df.insert(len(result_df.columns), kw,
-                             result_df[idx].astype('int'))
-            del result_df[idx]
-
-        if 'isPartial' in df:
-            # make other dataframe from isPartial key data
-            # split list columns into seperate ones, remove brackets and split on comma
-            df = df.fillna(False)
-            result_df2 = df['isPartial'].apply(lambda x: pd.Series(
-                str(x).replace('[', '').replace(']', '').split(',')))
-            result_df2.columns = ['isPartial']
-            # concatenate the two dataframes
-            final = pd.concat([result_df, result_df2], axis=1)
+    def trending_body(self, validators=None):
+        """Raw body of trending_lists and the validators of its response, a dict with the
+        ETag and Last-Modified headers google sent
+        Given the validators of an earlier call the request is conditional: google answers
+        an unchanged body with a 304 and the body returned is None"""
+        headers = dict()
+        validators = dict(validators or {})
+        if validators.get('ETag'):
+            headers['If-None-Match'] = validators['ETag']
+        if validators.get('Last-Modified'):
+            headers['If-Modified-Since'] = validators['Last-Modified']
+        event = request_event(self.TRENDING_SEARCHES_URL, TrendReq.GET_METHOD)
+        response = self._request(event, self.TRENDING_SEARCHES_URL,
+                                 TrendReq.GET_METHOD, headers=headers)
+        self.hooks.emit('after_response', event)
+        for name in ('ETag', 'Last-Modified'):
+            if response.headers.get(name):
+                validators[name] = response.headers[name]
+        if response.status_code == 304:
+            return None, validators
+        return response.content, validators
+
+    def suggestions(self, keyword):
+        """Request data from Google's Keyword Suggestion dropdown and return the suggested topics,
+        a list of dicts with the keys mid, title and type"""
+        return self._get_data(
+            url=self.SUGGESTIONS_URL + quote(keyword, safe=''),
+            method=TrendReq.GET_METHOD,
+            trim_chars=5,
+            params={'hl': self.hl, 'tz': self.tz},
+        )['default']['topics']
+
+    def categories(self, refresh=False, path=None):
+        """Return the category tree as a pytrends.categories.CategoryTree, indexed by id,
+        by lower case name and by chain of parents
+        The tree is downloaded once and kept in path, ~/.cache/pytrends/categories-<hl>.json by default
+        """
+        return load_categories(partial(self._get_data, **self._categories_args()),
+                               path=path or default_path(self.hl),
+                               refresh=refresh)
+
+    def _categories_args(self):
+        """_get_data arguments of the category tree request"""
+        return dict(url=self.CATEGORIES_URL, method=TrendReq.GET_METHOD,
+                    trim_chars=5, params={'hl': self.hl, 'tz': self.tz})
+
+    def _category_id(self, cat):
+        """Category id of a build_payload cat given by id or by name"""
+        if isinstance(cat, int):
+            return cat
+        return self.categories().resolve(cat)
+
+    def interest_over_time(self):
+        """Request data from Google's Interest Over Time section and return a dataframe"""
+
+        # make the request and parse the returned json
+        req_json = self._get_data(**self._widget_args(
+            self.INTEREST_OVER_TIME_URL, self.interest_over_time_widget))
+        return self._parse_interest_over_time(req_json, self.kw_list)
+
+    @staticmethod
+    def _parse_interest_over_time(req_json, kw_list):
+        """Turn a multiline response into a dataframe with one column per keyword"""
+        # values are read straight into a numpy matrix, columns are named
+        # relying on the order that google provides...
+        return timeline_frame(req_json['default']['timelineData'], kw_list)
+
+    def interest_over_time_windows(self):
+        """Request the Interest Over Time section of a build_payload_timeframes payload and return
+        one dataframe per timeframe, in the order of the timeframes
+        Values of all windows are relative to the busiest point among them, they are comparable
+        across windows but quiet windows lose precision since google rounds to integers
+        """
+        if not self.timeframes:
+            raise ValueError('No timeframes, call build_payload_timeframes first')
+        req_json = self._get_data(**self._widget_args(
+            self.INTEREST_OVER_TIME_URL, self.interest_over_time_widget))
+        return self._parse_interest_over_time_windows(req_json, self.kw_list[0],
+                                                      len(self.timeframes))
+
+    @staticmethod
+    def _parse_interest_over_time_windows(req_json, keyword, num_windows):
+        """Split a multiline response comparing several timeframes into one dataframe per timeframe"""
+        return window_frames(req_json['default']['timelineData'], keyword,
+                             num_windows)
+
+    def interest_over_time_geos(self, keyword, geos, cat=0,
+                                timeframe='today 5-y', gprop='', anchor=None,
+                                max_workers=4):
+        """Request the interest over time of keyword in every geo of geos and return a long format
+        dataframe with the columns date, geo, value and isPartial
+        Geos are compared five per payload, one comparison item per geo, and the payloads are fetched
+        concurrently, max_workers at a time. Values are relative to the busiest point of their payload;
+        with an anchor geo added to every payload they are rescaled to be comparable across payloads
+        The payload of build_payload is left untouched
+        """
+        cat = self._category_id(cat)
+        batches = self._geo_batches(geos, anchor)
+
+        def fetch(batch):
+            widget_dict = self._widgets(*self._explore_request(
+                [keyword] * len(batch), cat, timeframe, batch, gprop))
+            return self._get_data(**self._widget_args(
+                self.INTEREST_OVER_TIME_URL,
+                self._timeseries_widget(widget_dict)))['default']['timelineData']
+
+        if max_workers <= 1 or len(batches) <= 1:
+            timelines = [fetch(batch) for batch in batches]
         else:
-            final = result_df
-            final['isPartial'] = False
+            with ThreadPoolExecutor(
+                    max_workers=min(max_workers, len(batches))) as pool:
+                timelines = list(pool.map(fetch, batches))
+        return geo_timeline_frame(zip(batches, timelines), anchor=anchor)
 
-        return final
+    @staticmethod
+    def _geo_batches(geos, anchor=None):
+        """Split geos into payloads of five comparison items, the anchor (if any) first in each"""
+        geos = [geo for geo in dict.fromkeys(geos) if geo != anchor]
+        if anchor is None:
+            return [geos[i:i + MAX_COMPARISON_ITEMS]
+                    for i in range(0, len(geos), MAX_COMPARISON_ITEMS)]
+        size = MAX_COMPARISON_ITEMS - 1
+        return [[anchor] + geos[i:i + size]
+                for i in range(0, len(geos), size)] or [[anchor]]
 
-    def related_topics(self):
-        """Request data from Google's Related Topics section and return a dictionary of dataframes
-        If no top and/or rising related topics are found, the value for the key "top" and/or "rising" will be None
+    def interest_by_region(self, resolution='COUNTRY', inc_low_vol=False,
+                           inc_geo_code=False):
+        """Request data from Google's Interest by Region section and return a dataframe
+        indexed by geoName, with one column per keyword
+        resolution is 'COUNTRY', 'REGION', 'DMA' or 'CITY', the last three only apply within a country
+        inc_low_vol includes the geos with low search volume, inc_geo_code adds the geoCode column
         """
+        # make the request and parse the returned json
+        req_json = self._get_data(
+            **self._region_args(resolution, inc_low_vol))
+        return self._parse_interest_by_region(req_json, self.kw_list,
+                                              inc_geo_code)
 
-        # make the request
-        related_payload = dict()
-        result_dict = dict()
-        for request_json in self.related_topics_widget_list:
-            # ensure we know which keyword we are looking at rather than relying on order
-            kw = request_json['request']['restriction'][
-                'complexKeywordsRestriction']['keyword'][0]['value']
-            # convert to string as requests will mangle
-            related_payload['req'] = json.dumps(request_json['request'])
-            related_payload['token'] = request_json['token']
-            related_payload['tz'] = self.tz
-
-            # parse the returned json
-            req_json = self._get_data(
-                url=TrendReq.RELATED_QUERIES_URL,
-                method=TrendReq.GET_METHOD,
-                trim_chars=5,
-                params=related_payload,
-            )
-
-            # top topics
-            try:
-                top_list = req_json['default']['rankedList'][0][
-                    'rankedKeyword']
-                df_top = pd.DataFrame(
-                    [nested_to_record(d, sep='_') for d in top_list])
-            except KeyError:
-                # in case no top topics are found, the lines above will throw a KeyError
-                df_top = None
-
-            # rising topics
-            try:
-                rising_list = req_json['default']['rankedList'][1][
-                    'rankedKeyword']
-                df_rising = pd.DataFrame(
-                    [nested_to_record(d, sep='_') for d in rising_list])
-            except KeyError:
-                # in case no rising topics are found, the lines above will throw a KeyError
-                df_rising = None
-
-            result_dict[kw] = {'rising': df_rising, 'top': df_top}
-        return result_dict
+    def _region_args(self, resolution='COUNTRY', inc_low_vol=False):
+        """_get_data arguments of the comparedgeo request of the region widget"""
+        # the widget may be shared through the token cache, change a copy
+        request = dict(self.interest_by_region_widget['request'])
+        if self.geo == '' or resolution in ('REGION', 'DMA', 'CITY'):
+            request['resolution'] = resolution
+        request['includeLowSearchVolumeGeos'] = inc_low_vol
+        return self._widget_args(
+            self.INTEREST_BY_REGION_URL,
+            dict(self.interest_by_region_widget, request=request))
+
+    @staticmethod
+    def _parse_interest_by_region(req_json, kw_list, inc_geo_code=False):
+        """Turn a comparedgeo response into a dataframe indexed by geoName"""
+        # values are read straight into a numpy matrix, columns are named
+        # relying on the order that google provides...
+        return geo_frame(req_json['default']['geoMapData'], kw_list,
+                         inc_geo_code=inc_geo_code)
+
+    def related_topics(self, max_workers=5):
+        """Request data from Google's Related Topics section and return a long format dataframe
+        with the columns keyword, rank_type ('top' or 'rising'), rank, mid, title, type and value
+        The widgets of all keywords are fetched concurrently, max_workers at a time
+        """
+        return self._related(self.related_topics_widget_list, max_workers)
+
+    def related_queries(self, max_workers=5):
+        """Request data from Google's Related Queries section and return a long format dataframe
+        with the columns of related_topics, title holding the query, mid and type missing
+        """
+        return self._related(self.related_queries_widget_list, max_workers)
+
+    def _related(self, widgets, max_workers=5):
+        """Fetch relatedsearches widgets over the pooled session and flatten them"""
+        widgets = list(widgets)
+
+        def fetch(widget):
+            return self._get_data(
+                **self._widget_args(self.RELATED_QUERIES_URL, widget))
+
+        if max_workers <= 1 or len(widgets) <= 1:
+            responses = [fetch(widget) for widget in widgets]
+        else:
+            with ThreadPoolExecutor(
+                    max_workers=min(max_workers, len(widgets))) as pool:
+                responses = list(pool.map(fetch, widgets))
+        # ensure we know which keyword we are looking at rather than relying on order
+        return related_frame(
+            [(self._widget_keyword(widget), req_json)
+             for widget, req_json in zip(widgets, responses)])
+
+    @staticmethod
+    def _widget_keyword(widget):
+        """Keyword a related topics/queries widget was issued for"""
+        return widget['request']['restriction'][
+            'complexKeywordsRestriction']['keyword'][0]['value']
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Pooled HTTP session shared by the google trends crawlers.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def build_session(pool_connections=10, pool_maxsize=10, keep_alive=True, retries=0, backoff_factor=0):
+    """ Create a long-lived requests session backed by a configurable connection pool.
+
+    The same session is meant to be reused for every request of a TrendReq, so that explore and widget round trips
+    share already opened TCP+TLS connections to trends.google.com. The mounted HTTPAdapter keeps one pool per host
+    and one proxy manager per proxy url, hence each proxy gets its own set of pooled connections.
+
+    :param pool_connections: number of host pools to cache
+    :param pool_maxsize: maximum number of connections kept alive in each pool
+    :param keep_alive: if False, ask the server to close the connection after every response
+    :param retries: number of connect/read retries, 0 disables retrying
+    :param backoff_factor: backoff factor applied between retries
+    :return: a requests.Session
+    """
+    session = requests.Session()
+    if retries > 0 or backoff_factor > 0:
+        max_retries = Retry(total=retries, read=retries, connect=retries, backoff_factor=backoff_factor)
+    else:
+        max_retries = 0
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers.update({'Connection': 'close'})
+    return session
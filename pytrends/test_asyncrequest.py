@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from pytrends.asyncrequest import AsyncTrendReq
+from pytrends.request2 import TrendReq
+from pytrends.test_categories import TREE
+from pytrends.tokens import TokenCache
+
+
+def _related_widget(kw):
+    return {'id': 'RELATED_TOPICS', 'token': 'tok-' + kw,
+            'request': {'restriction': {'complexKeywordsRestriction': {'keyword': [{'value': kw}]}}}}
+
+
+class _StandInTransport(object):
+    """ Answers explore, multiline and relatedsearches requests locally and tracks concurrency.
+    """
+
+    def __init__(self, kw_list):
+        self.kw_list = kw_list
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.urls = []
+
+    async def __call__(self, url, method='get', trim_chars=0, **kwargs):
+        self.urls.append(url)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if url == TrendReq.CATEGORIES_URL:
+            return TREE
+        if url == TrendReq.GENERAL_URL:
+            widgets = [{'id': 'TIMESERIES', 'token': 'tok', 'request': {}}]
+            return {'widgets': widgets + [_related_widget(kw) for kw in self.kw_list]}
+        if url == TrendReq.INTEREST_OVER_TIME_URL:
+            return {'default': {'timelineData': [
+                {'time': '1483228800', 'value': list(range(len(self.kw_list)))},
+                {'time': '1483315200', 'value': [100] * len(self.kw_list)}]}}
+        return {'default': {'rankedList': [
+            {'rankedKeyword': [{'topic': {'mid': '/m/1', 'title': 't', 'type': 'Song'}, 'value': 100}]},
+            {'rankedKeyword': []}]}}
+
+
+class TestAsyncTrendReq(TestCase):
+
+    def test_interest_over_time(self):
+        transport = _StandInTransport(['a', 'b'])
+        trends_crawler = AsyncTrendReq(transport=transport, token_cache=TokenCache())
+
+        async def run():
+            await trends_crawler.build_payload(['a', 'b'])
+            return await trends_crawler.interest_over_time()
+
+        df = asyncio.run(run())
+        self.assertEqual(list(df['a']), [0, 100])
+        self.assertEqual(list(df['b']), [1, 100])
+
+    def test_related_topics_concurrent(self):
+        kw_list = ['a', 'b', 'c', 'd', 'e']
+        transport = _StandInTransport(kw_list)
+        trends_crawler = AsyncTrendReq(transport=transport, token_cache=TokenCache(), max_concurrency=3)
+
+        async def run():
+            await trends_crawler.build_payload(kw_list)
+            return await trends_crawler.related_topics()
+
+        result = asyncio.run(run())
+        self.assertEqual(list(result['keyword']), kw_list)
+        self.assertEqual(transport.max_in_flight, 3)
+
+    def test_interest_over_time_many(self):
+        transport = _StandInTransport(['a'])
+        trends_crawler = AsyncTrendReq(transport=transport, token_cache=TokenCache())
+        payloads = [{'kw_list': ['a'], 'timeframe': '2017-01-01 2017-0{0}-28'.format(m)} for m in range(1, 5)]
+        frames = asyncio.run(trends_crawler.interest_over_time_many(payloads))
+        self.assertEqual(len(frames), 4)
+        self.assertGreater(transport.max_in_flight, 1)
+
+    def test_prefetch_tokens(self):
+        transport = _StandInTransport(['a'])
+        trends_crawler = AsyncTrendReq(transport=transport, token_cache=TokenCache())
+        timeframes = ['2017-0{0}-01 2017-0{0}-28'.format(m) for m in range(1, 5)]
+
+        async def run():
+            widgets = await trends_crawler.prefetch_tokens(['a'], timeframes)
+            for timeframe in timeframes:
+                await trends_crawler.build_payload(['a'], timeframe=timeframe)
+            return widgets
+
+        self.assertEqual(sorted(asyncio.run(run())), timeframes)
+        self.assertEqual(transport.urls, [TrendReq.GENERAL_URL] * 4)
+        self.assertGreater(transport.max_in_flight, 1)
+
+    def test_category_name_through_transport(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        transport = _StandInTransport(['a'])
+        client = TrendReq(token_cache=TokenCache())
+        trends_crawler = AsyncTrendReq(client=client, transport=transport)
+
+        async def run():
+            await trends_crawler.build_payload(['a'], cat='Pop Music')
+            await trends_crawler.build_payload(['a'], cat='Sports News')
+
+        with patch('pytrends.asyncrequest.default_path', lambda hl: os.path.join(tmp_dir, hl + '.json')):
+            asyncio.run(run())
+        # the tree is downloaded once, by the transport rather than by the blocking client
+        self.assertEqual(transport.urls, [TrendReq.CATEGORIES_URL, TrendReq.GENERAL_URL, TrendReq.GENERAL_URL])
+        self.assertEqual(json.loads(client.token_payload['req'])['category'], 1077)
+        self.assertEqual(trends_crawler.kw_list, ['a'])
+
+    def test_payload_matches_blocking_client(self):
+        timeframes = ['2017-01-01 2017-02-28', '2017-03-01 2017-04-30']
+        client = TrendReq(token_cache=TokenCache())
+        client._set_payload(['a', 'a'], 0, timeframes, 'US', 'youtube')
+        trends_crawler = AsyncTrendReq(transport=_StandInTransport(['a', 'a']), token_cache=TokenCache())
+        asyncio.run(trends_crawler.build_payload_timeframes('a', timeframes, geo='US', gprop='youtube'))
+        # the payload state comes from the same request2 helpers
+        self.assertEqual(trends_crawler.client.token_payload, client.token_payload)
+        self.assertEqual(trends_crawler.client.token_key, client.token_key)
+        self.assertEqual(trends_crawler.client.timeframes, timeframes)
+        with self.assertRaises(ValueError):
+            asyncio.run(trends_crawler.build_payload_timeframes('a', timeframes * 3))
@@ -0,0 +1,44 @@
+import json
+from datetime import date
+from unittest import TestCase
+
+from pytrends.cache import ResponseCache, is_closed_timeframe
+from pytrends.request2 import TrendReq
+
+
+def _widget_params(timeframe, token='tok'):
+    return {'req': json.dumps({'time': timeframe, 'resolution': 'DAY'}), 'token': token, 'tz': 360}
+
+
+class TestResponseCache(TestCase):
+
+    def test_closed_timeframe(self):
+        today = date(2018, 6, 1)
+        self.assertTrue(is_closed_timeframe('2017-01-01 2017-12-31', today=today))
+        self.assertTrue(is_closed_timeframe('2018-05-01T00 2018-05-07T23', today=today))
+        self.assertFalse(is_closed_timeframe('2018-05-01 2018-05-31', today=today))
+        self.assertFalse(is_closed_timeframe('today 5-y', today=today))
+
+    def test_key_ignores_token_and_key_order(self):
+        params = _widget_params('2017-01-01 2017-01-31')
+        other = dict(params, token='other', req=json.dumps({'resolution': 'DAY', 'time': '2017-01-01 2017-01-31'}))
+        self.assertEqual(ResponseCache.key(TrendReq.INTEREST_OVER_TIME_URL, params),
+                         ResponseCache.key(TrendReq.INTEREST_OVER_TIME_URL, other))
+
+    def test_ttl_per_endpoint(self):
+        cache = ResponseCache(':memory:', token_ttl=60, open_ttl=3600, closed_ttl=None)
+        self.assertEqual(cache.ttl_for(TrendReq.GENERAL_URL, {'req': '{}'}), 60)
+        self.assertIsNone(cache.ttl_for(TrendReq.INTEREST_OVER_TIME_URL, _widget_params('2010-01-01 2010-01-31')))
+        self.assertEqual(cache.ttl_for(TrendReq.INTEREST_OVER_TIME_URL, _widget_params('today 3-m')), 3600)
+
+    def test_get_set_and_eviction(self):
+        cache = ResponseCache(':memory:', max_size=200, compress_level=0)
+        url = TrendReq.INTEREST_OVER_TIME_URL
+        cache.set(url, _widget_params('2010-01-01 2010-01-31'), b'a' * 100)
+        self.assertEqual(cache.get(url, _widget_params('2010-01-01 2010-01-31', token='new')), b'a' * 100)
+        cache.set(url, _widget_params('2010-02-01 2010-02-28'), b'b' * 100)
+        # the least recently used entry is dropped to stay under max_size
+        self.assertIsNone(cache.get(url, _widget_params('2010-01-01 2010-01-31')))
+        self.assertEqual(len(cache), 1)
+        cache.set(url, _widget_params('today 3-m'), b'c', ttl=0)
+        self.assertIsNone(cache.get(url, _widget_params('today 3-m')))
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from pytrends import categories
+from pytrends.categories import CategoryTree, load_categories
+
+TREE = {'name': 'All categories', 'id': 0, 'children': [
+    {'name': 'Arts & Entertainment', 'id': 3, 'children': [
+        {'name': 'Music & Audio', 'id': 35, 'children': [{'name': 'Pop Music', 'id': 1021}]},
+        {'name': 'News', 'id': 184}]},
+    {'name': 'News', 'id': 16, 'children': [{'name': 'Sports News', 'id': 1077}]}]}
+
+
+class TestCategoryTree(TestCase):
+
+    def test_indexes(self):
+        tree = CategoryTree(TREE)
+        self.assertEqual(len(tree), 7)
+        self.assertEqual(tree.name(1021), 'Pop Music')
+        self.assertEqual(tree.parent(1021), 35)
+        self.assertIsNone(tree.parent(0))
+        self.assertEqual(tree.chains[1021], (0, 3, 35, 1021))
+        self.assertEqual(tree.path(1021), ['All categories', 'Arts & Entertainment', 'Music & Audio', 'Pop Music'])
+        self.assertEqual(tree.children(3), [35, 184])
+        self.assertEqual(sorted(tree.find(' news')), [16, 184])
+
+    def test_resolve(self):
+        tree = CategoryTree(TREE)
+        self.assertEqual(tree.resolve(35), 35)
+        self.assertEqual(tree.resolve('35'), 35)
+        self.assertEqual(tree.resolve('pop music'), 1021)
+        with self.assertRaises(ValueError):
+            tree.resolve(99)
+        with self.assertRaises(ValueError):
+            tree.resolve('Jazz')
+        with self.assertRaises(ValueError) as cm:
+            tree.resolve('News')
+        self.assertIn('All categories > Arts & Entertainment > News', str(cm.exception))
+
+
+class TestLoadCategories(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'nested', 'categories.json')
+        self.fetched = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def fetch(self):
+        self.fetched.append(1)
+        return TREE
+
+    def test_fetched_once_then_read_from_file(self):
+        tree = load_categories(self.fetch, self.path)
+        self.assertIs(load_categories(self.fetch, self.path), tree)
+        self.assertEqual(len(self.fetched), 1)
+        with open(self.path) as tree_file:
+            self.assertEqual(json.load(tree_file), TREE)
+        # another process, or a forgotten in-memory copy, reads the file
+        categories._TREES.pop(self.path)
+        self.assertEqual(load_categories(self.fetch, self.path).resolve('Pop Music'), 1021)
+        self.assertEqual(len(self.fetched), 1)
+
+    def test_refresh_and_expiry(self):
+        load_categories(self.fetch, self.path)
+        load_categories(self.fetch, self.path, refresh=True)
+        self.assertEqual(len(self.fetched), 2)
+        categories._TREES.pop(self.path)
+        load_categories(self.fetch, self.path, ttl=0)
+        self.assertEqual(len(self.fetched), 3)
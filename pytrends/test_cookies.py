@@ -0,0 +1,70 @@
+from unittest import TestCase
+
+import requests
+
+from pytrends.cookies import CookieCache
+from pytrends.exceptions import ProxyPoolExhausted
+from pytrends.proxies import ProxyPool
+from pytrends.request import TrendReq
+from pytrends.request2 import TrendReq as TrendReq2
+from pytrends.test_fakes import FakeSession
+
+
+class TestCookieCache(TestCase):
+
+    def test_get_fetches_once(self):
+        cache = CookieCache(ttl=None)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return {'NID': 'abc'}
+
+        self.assertEqual(cache.get(None, fetch), {'NID': 'abc'})
+        self.assertEqual(cache.get(None, fetch), {'NID': 'abc'})
+        self.assertEqual(len(calls), 1)
+
+    def test_invalidate_and_expiry(self):
+        cache = CookieCache(ttl=0)
+        values = iter(['a', 'b', 'c'])
+        self.assertEqual(cache.get('p', lambda: {'NID': next(values)}), {'NID': 'a'})
+        # a zero ttl expires immediately
+        self.assertEqual(cache.get('p', lambda: {'NID': next(values)}), {'NID': 'b'})
+        cache.ttl = None
+        cache.invalidate('p')
+        self.assertNotIn('p', cache)
+        self.assertEqual(cache.get('p', lambda: {'NID': next(values)}), {'NID': 'c'})
+
+    def test_constructor_is_offline(self):
+        """ Constructing a crawler should not fetch the cookie.
+        """
+        cache = CookieCache()
+        trends_crawler = TrendReq(cookie_cache=cache)
+        self.assertNotIn(None, cache)
+        self.assertIs(trends_crawler.cookie_cache, cache)
+
+
+class TestProxyCookies(TestCase):
+
+    def test_one_bootstrap_per_proxy(self):
+        session = FakeSession()
+        trends_crawler = TrendReq2(proxies=['https://p1:80', 'https://p2:80'], session=session,
+                                   cookie_cache=CookieCache())
+        for _ in range(3):
+            for _ in range(2):
+                trends_crawler.GetGoogleCookie()
+                trends_crawler.GetNewProxy()
+        self.assertEqual(session.proxies, [{'https': 'https://p1:80'}, {'https': 'https://p2:80'}])
+        trends_crawler.cookie_cache.invalidate('https://p1:80')
+        self.assertEqual(trends_crawler.cookies, {'NID': 'nid-3'})
+
+    def test_dead_proxies_raise(self):
+        session = FakeSession(home_error=requests.exceptions.ProxyError('proxy down'))
+        pool = ProxyPool(['https://p1:80', 'https://p2:80'], cooldown=0., max_failures=2)
+        trends_crawler = TrendReq2(proxies=pool, session=session, cookie_cache=CookieCache())
+        # every proxy is dropped after two errors, no request leaves without one
+        with self.assertRaises(ProxyPoolExhausted):
+            trends_crawler.GetGoogleCookie()
+        self.assertEqual(len(session.proxies), 4)
+        self.assertNotIn(None, session.proxies)
+        self.assertEqual(trends_crawler.proxies, [])
@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import TestCase
+
+from pytrends.crawler import BatchCrawler, CrawlState
+from pytrends.exceptions import ResponseError
+from pytrends.ratelimit import RateLimiter
+from pytrends.test_fakes import FakeResponse
+
+
+class _OfflineCrawler(BatchCrawler):
+    """ Answers every request locally, throttled on the timeframes listed in fail_on, num_failures times each
+    if given.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.fail_on = kwargs.pop('fail_on', set())
+        self.num_failures = kwargs.pop('num_failures', None)
+        self.requests = []
+        self.prefetched = []
+        super(_OfflineCrawler, self).__init__(*args, **kwargs)
+
+    def _trend_req(self):
+        crawler = self
+
+        class _Tokens(object):
+            def prefetch_tokens(self, query_keyword, timeframes, **kwargs):
+                crawler.prefetched.append(timeframes)
+        return _Tokens()
+
+    def _resolve_topic(self, keyword, gt_queries):
+        self.requests.append('topic')
+        return {'mid': '/m/0' + keyword[:3], 'title': keyword, 'type': 'Song by someone', 'value': 100}
+
+    def _interest_over_time_windows(self, query_keyword, timeframes):
+        self.requests.append(tuple(timeframes))
+        return [self._series(timeframe) for timeframe in timeframes]
+
+    def _interest_over_time(self, query_keyword, timeframe):
+        self.requests.append(timeframe)
+        return self._series(timeframe)
+
+    def _series(self, timeframe):
+        if timeframe in self.fail_on and (self.num_failures is None or
+                                          self.requests.count(timeframe) <= self.num_failures):
+            raise ResponseError('The request failed: Google returned a response with code 429.',
+                                response=FakeResponse(429))
+        start, end = timeframe.split()
+        if timeframe == self.all_period:
+            return [100] * 91
+        num_days = (datetime.strptime(end, '%Y-%m-%d') - datetime.strptime(start, '%Y-%m-%d')).days + 1
+        return [1] * num_days
+
+
+class TestBatchCrawler(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.tmp_dir, 'in.json')
+        self.output_path = os.path.join(self.tmp_dir, 'out.json')
+        self.state_path = os.path.join(self.tmp_dir, 'out.json.state')
+        with open(self.input_path, 'w') as input_file:
+            input_file.write(json.dumps({'keyword': 'a - x', 'gt_queries': 'a x', 'start_date': '2017-01-05'}) + '\n')
+            input_file.write(json.dumps({'keyword': 'b - y', 'gt_queries': 'b y', 'start_date': '2015-08-10'}) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _crawler(self, **kwargs):
+        return _OfflineCrawler(self.state_path, max_workers=2, rate_limiter=RateLimiter(), **kwargs)
+
+    def _output(self):
+        with open(self.output_path) as output_file:
+            return {record['keyword']: record for record in map(json.loads, output_file)}
+
+    def test_resume_after_failure(self):
+        crawler = self._crawler(fail_on={'2015-07-01 2016-02-29'})
+        self.assertEqual(crawler.run(self.input_path, self.output_path), 1)
+        crawler.close()
+        # tokens of the all time period and of the query periods back to the start date
+        self.assertEqual(crawler.prefetched, [[crawler.all_period, '2016-11-01 2017-06-30', '2016-03-01 2016-10-31',
+                                               '2015-07-01 2016-02-29']])
+        self.assertEqual(list(self._output()), ['a - x'])
+
+        crawler = self._crawler()
+        self.assertEqual(crawler.run(self.input_path, self.output_path), 1)
+        crawler.close()
+        # only the failed period is requested again, no token is prefetched for a single period
+        self.assertEqual(crawler.requests, ['2015-07-01 2016-02-29'])
+        self.assertEqual(crawler.prefetched, [])
+        output = self._output()
+        self.assertEqual(len(output['a - x']['trends']['daily_search']), 177)
+        self.assertEqual(len(output['b - y']['trends']['daily_search']), 691)
+        self.assertEqual(output['b - y']['mid'], '/m/0b -')
+
+        crawler = self._crawler()
+        self.assertEqual(crawler.run(self.input_path, self.output_path), 0)
+        crawler.close()
+        self.assertEqual(crawler.requests, [])
+
+    def test_throttled_record_retried_in_run(self):
+        crawler = self._crawler(fail_on={'2015-07-01 2016-02-29'}, num_failures=2)
+        self.assertEqual(crawler.run(self.input_path, self.output_path), 2)
+        crawler.close()
+        # the throttled period alone is requested again, the others are checkpointed
+        self.assertEqual(crawler.requests.count('2015-07-01 2016-02-29'), 3)
+        self.assertEqual(crawler.requests.count('2016-03-01 2016-10-31'), 1)
+        self.assertEqual(len(self._output()['b - y']['trends']['daily_search']), 691)
+
+    def test_throttled_record_left_after_max_retries(self):
+        crawler = self._crawler(fail_on={'2015-07-01 2016-02-29'}, max_retries=2)
+        self.assertEqual(crawler.run(self.input_path, self.output_path), 1)
+        crawler.close()
+        self.assertEqual(crawler.requests.count('2015-07-01 2016-02-29'), 3)
+        self.assertEqual(list(self._output()), ['a - x'])
+
+    def test_multiplex(self):
+        crawler = self._crawler(multiplex=True)
+        self.assertEqual(crawler.run(self.input_path, self.output_path), 2)
+        crawler.close()
+        # the query periods of a record in one payload, no token prefetch
+        self.assertIn(('2016-11-01 2017-06-30', '2016-03-01 2016-10-31', '2015-07-01 2016-02-29'), crawler.requests)
+        self.assertEqual(crawler.requests.count(crawler.all_period), 1)
+        self.assertEqual(crawler.prefetched, [])
+        self.assertEqual(len(self._output()['b - y']['trends']['daily_search']), 691)
+
+    def test_state_compaction(self):
+        state = CrawlState(self.state_path)
+        for idx in (0, 1, 2, 5):
+            state.mark_done(idx)
+        state.save_step(7, 'topic', None)
+        state.close()
+        state = CrawlState(self.state_path)
+        state.close()
+        with open(self.state_path) as state_file:
+            self.assertEqual(json.loads(state_file.read()), {'done': [[0, 2], [5, 5]], 'steps': {'7': {'topic': None}}})
+        self.assertTrue(state.is_done(1))
+        self.assertEqual(state.get_steps(7), {'topic': None})
+
+    def test_state_compacts_while_running(self):
+        state = CrawlState(self.state_path, compact_every=10)
+        for idx in range(100):
+            state.save_step(idx, 'all', [100] * 50)
+            state.mark_done(idx)
+        state.save_step(100, 'topic', None)
+        # the steps of finished records do not outlive the last compaction
+        with open(self.state_path) as state_file:
+            lines = state_file.read().splitlines()
+        self.assertLessEqual(len(lines), 10)
+        self.assertEqual(json.loads(lines[0]), {'done': [[0, 99]], 'steps': {}})
+        state.close()
+        state = CrawlState(self.state_path)
+        state.close()
+        self.assertTrue(state.is_done(99))
+        self.assertEqual(state.get_steps(100), {'topic': None})
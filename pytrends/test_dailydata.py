@@ -0,0 +1,235 @@
+from datetime import date, timedelta
+from functools import partial
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from pytrends import dailydata
+from pytrends.exceptions import ResponseError
+from pytrends.ratelimit import RateLimiter
+from pytrends.test_fakes import FakeClock
+
+# true search volume of each word, in arbitrary units
+WEIGHTS = {'anchor': 3., 'a': 1., 'b': 2., 'c': 5., 'd': .5, 'e': 4., 'f': 1.5, 'quiet': 0.}
+
+
+def _volume(word, day):
+    return WEIGHTS[word] * (1 + (day.toordinal() * len(word)) % 7) * (1 + day.month / 10.)
+
+
+class _OfflineTrendReq(object):
+    """ Answers like Google Trends: daily points for windows up to 270 days, monthly points otherwise,
+    every payload normalised so that its busiest point is 100.
+    """
+
+    requests = []
+
+    proxies = []
+
+    def __init__(self, proxies='', **kwargs):
+        _OfflineTrendReq.proxies.append(proxies)
+        self.kw_list = []
+        self.timeframe = None
+
+    def prefetch_tokens(self, kw_list, timeframes, cat=0, geo='', gprop='', max_workers=4):
+        return dict()
+
+    def build_payload(self, kw_list, cat=0, timeframe='today 5-y', geo='', gprop=''):
+        self.kw_list = kw_list
+        self.timeframe = timeframe
+        _OfflineTrendReq.requests.append((tuple(kw_list), timeframe))
+
+    def build_payload_timeframes(self, keyword, timeframes, cat=0, geo='', gprop=''):
+        self.kw_list = [keyword]
+        self.timeframes = timeframes
+        _OfflineTrendReq.requests.append(((keyword,), tuple(timeframes)))
+
+    @staticmethod
+    def _window(kw_list, timeframe):
+        start, stop = [date.fromisoformat(x) for x in timeframe.split()]
+        days = [start + timedelta(days=i) for i in range((stop - start).days + 1)]
+        data = pd.DataFrame({word: [_volume(word, day) for day in days] for word in kw_list},
+                            index=pd.DatetimeIndex(days, name='date'))
+        if len(days) > 270:
+            data = data.groupby(data.index.to_period('M')).sum()
+            data.index = data.index.to_timestamp().rename('date')
+        return data
+
+    def interest_over_time(self):
+        data = self._window(self.kw_list, self.timeframe)
+        data = data * 100 / data.values.max()
+        data['isPartial'] = False
+        return data
+
+    def interest_over_time_windows(self):
+        windows = [self._window(self.kw_list, timeframe) for timeframe in self.timeframes]
+        peak = max(window.values.max() for window in windows)
+        for window in windows:
+            window[self.kw_list[0]] = (window[self.kw_list[0]] * 100 / peak).round()
+            window['isPartial'] = False
+        return windows
+
+
+@patch('pytrends.dailydata.TrendReq', _OfflineTrendReq)
+class TestDailyDataBatch(TestCase):
+
+    def setUp(self):
+        _OfflineTrendReq.requests = []
+
+    def test_same_shape_as_single_word(self):
+        single = dailydata.get_daily_data('c', 2017, 1, 2018, 4, verbose=False, wait_time=0)
+        frames = dailydata.get_daily_data_batch(['a', 'b', 'c'], 2017, 1, 2018, 4, verbose=False, wait_time=0)
+        self.assertEqual(sorted(frames), ['a', 'b', 'c'])
+        self.assertEqual(list(frames['c'].columns), list(single.columns))
+        np.testing.assert_allclose(frames['c']['c_unscaled'], single['c_unscaled'])
+
+    def test_parallel_workers(self):
+        _OfflineTrendReq.proxies = []
+        sequential = dailydata.get_daily_data('b', 2016, 1, 2017, 12, verbose=False, wait_time=0)
+        parallel = dailydata.get_daily_data('b', 2016, 1, 2017, 12, verbose=False, wait_time=0,
+                                            max_workers=4, proxies=['https://p1:80', 'https://p2:80'])
+        pd.testing.assert_frame_equal(sequential, parallel)
+        self.assertTrue(parallel.index.is_monotonic_increasing)
+        # one TrendReq per worker thread plus the one prefetching tokens, all sharing the proxy pool
+        self.assertLessEqual(len(_OfflineTrendReq.proxies), 1 + 1 + 4)
+        self.assertEqual(len(set(map(id, _OfflineTrendReq.proxies[1:]))), 1)
+        self.assertEqual(_OfflineTrendReq.proxies[1].proxies, ['https://p1:80', 'https://p2:80'])
+
+    def test_multiplex(self):
+        single = dailydata.get_daily_data('b', 2017, 1, 2018, 4, verbose=False, wait_time=0)
+        _OfflineTrendReq.requests = []
+        multiplexed = dailydata.get_daily_data('b', 2017, 1, 2018, 4, verbose=False, wait_time=0, multiplex=True)
+        # one monthly request then the 16 months five at a time
+        self.assertEqual([timeframes for _, timeframes in _OfflineTrendReq.requests][0], '2017-01-01 2018-04-30')
+        self.assertEqual([len(timeframes) for _, timeframes in _OfflineTrendReq.requests[1:]], [5, 5, 5, 1])
+        self.assertEqual(list(multiplexed.columns), list(single.columns))
+        # months are rescaled to peak at 100, only google's rounding differs
+        np.testing.assert_allclose(multiplexed['b'], single['b'], atol=1.5)
+        with self.assertRaises(ValueError):
+            dailydata._fetch_timeframes(None, ['a', 'b'], 'US', ['2017-01-01 2017-01-31'], False, multiplex=True)
+
+    def test_data_request_retried_with_its_payload(self):
+        interest_over_time = _OfflineTrendReq.interest_over_time
+        refused = []
+
+        def refuse_once(trends):
+            if trends.timeframe == '2017-02-01 2017-02-28' and not refused:
+                refused.append(trends.timeframe)
+                raise ResponseError('The request failed: Google returned a response with code 429.', response=None)
+            return interest_over_time(trends)
+
+        single = dailydata.get_daily_data('b', 2017, 1, 2017, 4, verbose=False, wait_time=0)
+        _OfflineTrendReq.requests = []
+        with patch.object(_OfflineTrendReq, 'interest_over_time', refuse_once):
+            retried = dailydata.get_daily_data('b', 2017, 1, 2017, 4, verbose=False, wait_time=0)
+        pd.testing.assert_frame_equal(single, retried)
+        # the refused month is built again before its data is requested again
+        self.assertEqual([timeframe for _, timeframe in _OfflineTrendReq.requests].count('2017-02-01 2017-02-28'), 2)
+
+    def test_retries_run_out(self):
+        built = []
+
+        def refuse(trends, **kwargs):
+            built.append(kwargs['timeframe'])
+            raise ResponseError('The request failed: Google returned a response with code 429.', response=None)
+
+        with patch.object(_OfflineTrendReq, 'build_payload', refuse):
+            with self.assertRaises(ResponseError):
+                dailydata.get_daily_data('b', 2017, 1, 2017, 4, verbose=False, wait_time=0)
+        # four attempts, then stop rather than read the widgets of another timeframe
+        self.assertEqual(built, ['2017-01-01 2017-04-30'] * 4)
+
+    def test_batches_and_anchor(self):
+        words = ['a', 'b', 'c', 'd', 'e', 'f']
+        frames = dailydata.get_daily_data_batch(words, 2017, 1, 2018, 4, anchor='anchor',
+                                                verbose=False, wait_time=0)
+        # two batches of four words plus the anchor, each one monthly request and 16 daily ones
+        self.assertEqual(len(_OfflineTrendReq.requests), 2 * 17)
+        self.assertTrue(all(kw_list[0] == 'anchor' for kw_list, _ in _OfflineTrendReq.requests))
+        # the anchor makes monthly values comparable across batches: true volumes have ratio e / a
+        ratio = frames['e']['e_monthly'] / frames['a']['a_monthly']
+        np.testing.assert_allclose(ratio, WEIGHTS['e'] / WEIGHTS['a'] * np.ones(len(ratio)), rtol=1e-6)
+
+    def test_anchor_without_volume(self):
+        # a batch the anchor does not show up in cannot be aligned on the others
+        with self.assertRaises(ValueError):
+            dailydata.get_daily_data_batch(['a', 'b', 'c', 'd', 'e'], 2017, 1, 2017, 4, anchor='quiet',
+                                           verbose=False, wait_time=0)
+
+
+@patch('pytrends.dailydata.TrendReq', _OfflineTrendReq)
+class TestDailyDataStitched(TestCase):
+
+    def setUp(self):
+        _OfflineTrendReq.requests = []
+
+    def test_plan_windows(self):
+        windows = dailydata.plan_windows(date(2013, 1, 1), date(2017, 12, 31), max_days=269, overlap=30)
+        self.assertEqual(len(windows), 8)
+        self.assertEqual(windows[0], (date(2013, 1, 1), date(2013, 9, 26)))
+        self.assertEqual(windows[1][0], date(2013, 8, 28))
+        self.assertEqual(windows[-1][1], date(2017, 12, 31))
+
+    def test_stitched_matches_true_volume(self):
+        complete = dailydata.get_daily_data_stitched('c', 2014, 1, 2017, 12, verbose=False, wait_time=0)
+        self.assertEqual(len(_OfflineTrendReq.requests), 6)
+        self.assertEqual(list(complete.columns), ['c_unscaled', 'scale', 'c'])
+        self.assertEqual(len(complete), (date(2017, 12, 31) - date(2014, 1, 1)).days + 1)
+        self.assertTrue(complete.index.is_unique)
+        expected = np.array([_volume('c', day.date()) for day in complete.index])
+        np.testing.assert_allclose(complete['c'], expected * 100 / expected.max())
+
+    def test_stitched_multiplex(self):
+        complete = dailydata.get_daily_data_stitched('c', 2014, 1, 2017, 12, verbose=False, wait_time=0,
+                                                     multiplex=True)
+        # six windows in two payloads
+        self.assertEqual(len(_OfflineTrendReq.requests), 2)
+        expected = np.array([_volume('c', day.date()) for day in complete.index])
+        np.testing.assert_allclose(complete['c'], expected * 100 / expected.max(), atol=1.5)
+
+    def test_stitched_empty_window(self):
+        interest_over_time = _OfflineTrendReq.interest_over_time
+
+        def drop_window(trends):
+            if trends.timeframe.startswith('2014-08-28'):
+                return pd.DataFrame()
+            return interest_over_time(trends)
+
+        with patch.object(_OfflineTrendReq, 'interest_over_time', drop_window):
+            with self.assertRaisesRegex(ValueError, '2014-08-28'):
+                dailydata.get_daily_data_stitched('c', 2014, 1, 2017, 12, verbose=False, wait_time=0)
+
+
+class TestDefaultRateLimiter(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.patcher = patch('pytrends.dailydata.RateLimiter',
+                             partial(RateLimiter, clock=self.clock, sleep=self.clock.sleep))
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_one_pair_per_wait_time(self):
+        limiter = dailydata._rate_limiter(None, 10.)
+        for _ in range(6):
+            limiter.acquire()
+        # three months of explore and multiline requests, the first pair goes at once
+        self.assertEqual(self.clock.now, 20.)
+        for _ in range(10):
+            limiter.on_success()
+        self.assertGreater(limiter.global_bucket.rate, 2 / 10.)
+
+    def test_throughput_grows_with_proxies(self):
+        durations = []
+        for num_proxies in (1, 2, 4):
+            self.clock.now = 0.
+            proxies = ['https://p{0}:80'.format(idx) for idx in range(num_proxies)]
+            limiter = dailydata._rate_limiter(None, 10., proxies)
+            for idx in range(48):
+                limiter.acquire(proxies[idx % num_proxies])
+            durations.append(self.clock.now)
+        self.assertEqual(durations, [230., 110., 50.])
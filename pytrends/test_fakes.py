@@ -0,0 +1,55 @@
+"""
+Fakes shared by the offline tests.
+"""
+
+from datetime import timedelta
+
+
+class FakeClock(object):
+    """ Monotonic clock whose sleep advances the time at once and records the waits.
+    """
+
+    def __init__(self, now=0.):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code=200, content=b'', elapsed=.05, cookies=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {'Content-Type': 'application/json; charset=UTF-8'}
+        self.elapsed = timedelta(seconds=elapsed)
+        self.cookies = cookies if cookies is not None else {'NID': 'nid'}
+
+
+class FakeSession(object):
+    """ Answers the homepage with a new NID cookie, or home_error, and api requests with the queued responses.
+
+    The proxies of every homepage request are recorded in order.
+    """
+
+    def __init__(self, responses=(), home_error=None):
+        self.headers = dict()
+        self.responses = list(responses)
+        self.home_error = home_error
+        self.proxies = []
+
+    def get(self, url, proxies=None, **kwargs):
+        if url.startswith('https://trends.google.com/?'):
+            self.proxies.append(proxies)
+            if self.home_error is not None:
+                raise self.home_error
+            return FakeResponse(cookies={'NID': 'nid-{0}'.format(len(self.proxies))})
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
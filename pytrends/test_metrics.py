@@ -0,0 +1,64 @@
+import json
+from unittest import TestCase
+
+import requests
+
+from pytrends.cookies import CookieCache
+from pytrends.metrics import Hooks, MetricsAggregator, endpoint_name
+from pytrends.request2 import TrendReq
+from pytrends.test_fakes import FakeResponse, FakeSession
+
+
+class TestHooks(TestCase):
+
+    def test_endpoint_name(self):
+        self.assertEqual(endpoint_name(TrendReq.INTEREST_OVER_TIME_URL), 'multiline')
+        self.assertEqual(endpoint_name(TrendReq.SUGGESTIONS_URL), 'autocomplete')
+        self.assertEqual(endpoint_name(TrendReq.SUGGESTIONS_URL + 'pizza%2Fpasta'), 'autocomplete')
+
+    def test_events_of_a_retried_request(self):
+        session = FakeSession([FakeResponse(401), FakeResponse(200, b")]}',\n{\"a\": 1}")])
+        hooks = Hooks()
+        events = []
+        for name in ('before_request', 'after_response', 'on_error', 'on_retry'):
+            hooks.register(name, lambda event: events.append((event['event'], event['attempt'], event['status'])))
+        trends = TrendReq(session=session, cookie_cache=CookieCache(), hooks=hooks)
+        self.assertEqual(trends._get_data(TrendReq.INTEREST_OVER_TIME_URL, trim_chars=5), {'a': 1})
+        self.assertEqual(events, [('before_request', 1, None), ('after_response', 1, 401), ('on_retry', 1, 401),
+                                  ('before_request', 2, None), ('after_response', 2, 200)])
+
+    def test_unknown_event(self):
+        with self.assertRaises(ValueError):
+            Hooks().register('on_success', print)
+
+
+class TestMetricsAggregator(TestCase):
+
+    def setUp(self):
+        self.metrics = MetricsAggregator(buckets=(.1, 1.))
+        session = FakeSession([FakeResponse(200, b")]}',\n{}", elapsed=.05),
+                                FakeResponse(429, elapsed=.5),
+                                requests.exceptions.ConnectionError()])
+        trends = TrendReq(session=session, cookie_cache=CookieCache(), hooks=self.metrics.hooks())
+        trends._get_data(TrendReq.INTEREST_OVER_TIME_URL, trim_chars=5)
+        with self.assertRaises(Exception):
+            trends._get_data(TrendReq.INTEREST_OVER_TIME_URL, trim_chars=5)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            trends._get_data(TrendReq.GENERAL_URL, trim_chars=4)
+
+    def test_snapshot(self):
+        snapshot = json.loads(self.metrics.to_json())
+        self.assertEqual(snapshot['multiline']['responses'], {'200': 1, '429': 1})
+        self.assertEqual(snapshot['multiline']['errors'], {'status_429': 1})
+        self.assertEqual(snapshot['multiline']['bytes'], 8)
+        self.assertEqual(snapshot['multiline']['latency']['ttfb']['buckets'], {'0.1': 1, '1.0': 2, '+Inf': 2})
+        self.assertEqual(snapshot['multiline']['latency']['parse']['count'], 1)
+        self.assertEqual(snapshot['explore']['errors'], {'ConnectionError': 1})
+
+    def test_prometheus(self):
+        text = self.metrics.to_prometheus()
+        self.assertIn('# TYPE pytrends_responses_total counter', text)
+        self.assertIn('pytrends_responses_total{endpoint="multiline",status="429"} 1', text)
+        self.assertIn('pytrends_request_duration_seconds_bucket{endpoint="multiline",phase="ttfb",le="+Inf"} 2',
+                      text)
+        self.assertIn('pytrends_errors_total{endpoint="explore",error="ConnectionError"} 1', text)
@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from benchmarks.mock_server import MockTrendsServer
+from pytrends import request, request2
+from pytrends.cookies import CookieCache
+from pytrends.exceptions import ResponseError
+from pytrends.tokens import TokenCache
+from pytrends.trending import TrendingPoller
+
+
+class TestMockTrendsServer(TestCase):
+
+    def setUp(self):
+        self.server = MockTrendsServer().start()
+        self.addCleanup(self.server.stop)
+        patched = self.server.patched(request.TrendReq, request2.TrendReq)
+        patched.__enter__()
+        self.addCleanup(patched.__exit__, None, None, None)
+
+    def test_request2_roundtrip(self):
+        trends = request2.TrendReq(cookie_cache=CookieCache(), token_cache=TokenCache())
+        self.assertTrue(trends.GENERAL_URL.startswith(self.server.base_url))
+        trends.build_payload(['Pizza', 'Pasta'], timeframe='2017-01-01 2017-06-30')
+        df = trends.interest_over_time()
+        self.assertEqual(list(df.columns), ['Pizza', 'Pasta', 'isPartial'])
+        self.assertEqual(len(df), 181)
+        self.assertEqual(df[['Pizza', 'Pasta']].values.max(), 100)
+        related = trends.related_topics()
+        self.assertEqual(sorted(related['keyword'].unique()), ['Pasta', 'Pizza'])
+        self.assertEqual(set(related['rank_type']), {'top', 'rising'})
+        queries = trends.related_queries(max_workers=1)
+        self.assertEqual(len(queries), len(related))
+        self.assertEqual(self.server.hits, {'explore': 1, 'multiline': 1, 'relatedsearches': 4})
+
+    def test_monthly_points_and_single_keyword_client(self):
+        trends = request.TrendReq(cookie_cache=CookieCache(), token_cache=TokenCache())
+        trends.build_payload(keyword='Pizza', timeframe='2015-01-01 2017-06-30')
+        self.assertEqual(len(trends.interest_over_time()), 30)
+        self.assertEqual(trends.related_topics()[0]['type'], 'Song by Artist 0')
+
+    def test_throttling(self):
+        self.server.throttle_every = 2
+        trends = request2.TrendReq(cookie_cache=CookieCache(), token_cache=TokenCache())
+        trends.build_payload(['Pizza'], timeframe='2017-01-01 2017-01-31')
+        with self.assertRaises(ResponseError) as cm:
+            trends.interest_over_time()
+        self.assertEqual(cm.exception.response.status_code, 429)
+        self.assertEqual(self.server.num_throttled, 1)
+
+    def test_rejected_token_is_invalidated(self):
+        tokens = TokenCache()
+        trends = request2.TrendReq(cookie_cache=CookieCache(), token_cache=tokens)
+        trends.build_payload(['Pizza'], timeframe='2017-01-01 2017-01-31')
+        self.assertEqual(len(tokens), 1)
+        respond = self.server.respond
+
+        def reject_widgets(path, query, headers=None):
+            if path.endswith('multiline'):
+                return 400, 'text/html; charset=UTF-8', b'Bad Request', []
+            return respond(path, query, headers)
+
+        with patch.object(self.server, 'respond', reject_widgets):
+            with self.assertRaises(ResponseError):
+                trends.interest_over_time()
+        self.assertEqual(len(tokens), 0)
+
+    def test_patched_restores_urls(self):
+        self.doCleanups()
+        self.assertEqual(request2.TrendReq.GENERAL_URL, 'https://trends.google.com/trends/api/explore')
+        self.assertEqual(request.TrendReq.HOME_URL, 'https://trends.google.com/')
+
+    def test_prefetch_tokens(self):
+        timeframes = ['2016-11-01 2017-06-30', '2016-03-01 2016-10-31', '2015-07-01 2016-02-29']
+        for trends in (request.TrendReq(cookie_cache=CookieCache(), token_cache=TokenCache()),
+                       request2.TrendReq(cookie_cache=CookieCache(), token_cache=TokenCache())):
+            self.server.reset()
+            kw = 'Pizza' if isinstance(trends, request.TrendReq) else ['Pizza']
+            self.assertEqual(sorted(trends.prefetch_tokens(kw, timeframes)), sorted(timeframes))
+            for timeframe in timeframes:
+                trends.build_payload(kw, timeframe=timeframe)
+                trends.interest_over_time()
+            self.assertEqual(self.server.hits, {'explore': 3, 'multiline': 3})
+
+    def test_interest_by_region(self):
+        trends = request2.TrendReq(cookie_cache=CookieCache(), token_cache=TokenCache())
+        trends.build_payload(['Pizza', 'Pasta'], timeframe='2017-01-01 2017-06-30', geo='US')
+        widget_request = dict(trends.interest_by_region_widget['request'])
+        df = trends.interest_by_region(resolution='REGION', inc_low_vol=True, inc_geo_code=True)
+        self.assertEqual(list(df.columns), ['geoCode', 'Pizza', 'Pasta'])
+        self.assertEqual(len(df), 51)
+        self.assertTrue(df.index.is_monotonic_increasing)
+        # the cached widget is left untouched
+        self.assertEqual(trends.interest_by_region_widget['request'], widget_request)
+
+    def test_categories(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        trends = request2.TrendReq(cookie_cache=CookieCache(), token_cache=TokenCache())
+        path = os.path.join(tmp_dir, 'categories.json')
+        self.assertEqual(trends.categories(path=path).resolve('Pizzerias'), 1093)
+        self.assertEqual(trends.categories(path=path).path(1093), ['All categories', 'Food & Drink', 'Restaurants',
+                                                                   'Pizzerias'])
+        self.assertEqual(self.server.hits, {'category': 1})
+        # names resolve to ids when building payloads, the default tree location is looked up once
+        with patch('pytrends.request2.default_path', return_value=path):
+            trends.build_payload(['Pizza'], cat='pizzerias', timeframe='2017-01-01 2017-01-31')
+        self.assertEqual(trends.interest_over_time_widget['request']['requestOptions']['category'], 1093)
+        self.assertEqual(self.server.hits, {'category': 1, 'explore': 1})
+
+    def test_timeframe_windows(self):
+        timeframes = ['2016-11-01 2017-06-30', '2016-03-01 2016-10-31', '2016-01-01 2016-01-31']
+        trends = request2.TrendReq(cookie_cache=CookieCache(), token_cache=TokenCache())
+        trends.build_payload_timeframes('Pizza', timeframes)
+        windows = trends.interest_over_time_windows()
+        self.assertEqual([len(window) for window in windows], [242, 245, 31])
+        self.assertEqual(str(windows[1].index[0].date()), '2016-03-01')
+        self.assertEqual(str(windows[2].index[-1].date()), '2016-01-31')
+        self.assertEqual(max(window['Pizza'].max() for window in windows), 100)
+        # same values as the single window request, up to the joint normalisation
+        trends.build_payload(['Pizza'], timeframe=timeframes[2])
+        alone = trends.interest_over_time()['Pizza']
+        self.assertLess(abs(alone / alone.max() - windows[2]['Pizza'] / windows[2]['Pizza'].max()).max(), .05)
+        self.assertEqual(self.server.hits, {'explore': 2, 'multiline': 2})
+
+        single = request.TrendReq(cookie_cache=CookieCache(), token_cache=TokenCache())
+        single.build_payload_timeframes('Pizza', timeframes)
+        self.assertEqual([len(window) for window in single.interest_over_time_windows()], [242, 245, 31])
+        with self.assertRaises(ValueError):
+            trends.build_payload_timeframes('Pizza', timeframes * 2)
+
+    def test_interest_over_time_geos(self):
+        trends = request2.TrendReq(cookie_cache=CookieCache(), token_cache=TokenCache())
+        geos = ['GB', 'FR', 'DE', 'US', 'IT', 'ES', 'JP']
+        df = trends.interest_over_time_geos('Pizza', geos, timeframe='2017-01-01 2017-03-31', anchor='US')
+        # two payloads of the anchor and four geos
+        self.assertEqual(self.server.hits, {'explore': 2, 'multiline': 2})
+        self.assertEqual(list(df.columns), ['date', 'geo', 'value', 'isPartial'])
+        self.assertEqual(sorted(df['geo'].unique()), sorted(geos))
+        self.assertEqual(len(df), 7 * 90)
+        # the anchor makes geos of different payloads comparable
+        totals = df.groupby('geo')['value'].sum()
+        pair = trends.interest_over_time_geos('Pizza', ['US', 'JP'], timeframe='2017-01-01 2017-03-31')
+        pair_totals = pair.groupby('geo')['value'].sum()
+        self.assertAlmostEqual(totals['JP'] / totals['US'], pair_totals['JP'] / pair_totals['US'], places=2)
+
+    def test_suggestions(self):
+        for trends in (request.TrendReq(cookie_cache=CookieCache()), request2.TrendReq(cookie_cache=CookieCache())):
+            topics = trends.suggestions('adele rolling in the deep')
+            self.assertEqual(topics[0]['type'], 'Song by Adele Rolling In The Deep')
+        self.assertEqual(self.server.hits, {'autocomplete': 2})
+
+    def test_trending_searches(self):
+        trends = request2.TrendReq(cookie_cache=CookieCache())
+        df = trends.trending_searches(pn='japan')
+        self.assertEqual(df[0].tolist()[:2], ['japan trend 1', 'japan trend 2'])
+        poller = TrendingPoller(trends.trending_body, ['united_states', 'japan'])
+        self.assertEqual(sum(len(change['added']) for change in poller.poll()), 40)
+        changes = poller.poll()
+        self.assertEqual(sorted(change['region'] for change in changes), ['japan', 'united_states'])
+        self.assertTrue(all(len(change['added']) == len(change['removed']) for change in changes))
+        self.assertEqual(self.server.hits['data'], 3)
+
+    def test_trending_not_modified(self):
+        self.server.trending_period = 2
+        trends = request2.TrendReq(cookie_cache=CookieCache())
+        poller = TrendingPoller(trends.trending_body, ['japan'])
+        self.assertEqual(len(poller.poll()), 1)
+        # the body lasts two requests, the second is answered with a 304
+        self.assertEqual(poller.poll(), [])
+        self.assertEqual(poller.num_unchanged, 1)
+        body, validators = trends.trending_body()
+        self.assertIn('ETag', validators)
+        self.assertEqual(trends.trending_body(validators), (None, validators))
@@ -0,0 +1,153 @@
+from unittest import TestCase
+
+import numpy as np
+
+from pytrends import parsing
+from pytrends.parsing import (GEO_TIMELINE_COLUMNS, GeoTables, RELATED_COLUMNS, geo_frame, geo_map_arrays,
+                              geo_timeline_frame, loads_trimmed,
+                              related_frame, timeline_arrays, timeline_frame, timeline_windows, window_frames)
+
+
+class TestTimelineParsing(TestCase):
+
+    timeline_data = [
+        {'time': '1483315200', 'formattedTime': 'Jan 2, 2017', 'value': [3, 40]},
+        {'time': '1483228800', 'formattedTime': 'Jan 1, 2017', 'value': [1, 100]},
+        {'time': '1483401600', 'formattedTime': 'Jan 3, 2017', 'value': [0, 7], 'isPartial': True},
+    ]
+
+    def test_timeline_arrays(self):
+        times, values, is_partial = timeline_arrays(self.timeline_data)
+        self.assertEqual(times.tolist(), [1483315200, 1483228800, 1483401600])
+        self.assertEqual(values.dtype, np.int64)
+        self.assertEqual(values.tolist(), [[3, 40], [1, 100], [0, 7]])
+        self.assertEqual(is_partial.tolist(), [False, False, True])
+
+    def test_timeline_frame(self):
+        df = timeline_frame(self.timeline_data, ['a', 'b'])
+        self.assertEqual(list(df.columns), ['a', 'b', 'isPartial'])
+        self.assertEqual(df['a'].tolist(), [1, 3, 0])
+        self.assertEqual(df['b'].tolist(), [100, 40, 7])
+        self.assertEqual(df['isPartial'].tolist(), [False, False, True])
+        self.assertEqual(str(df.index[0].date()), '2017-01-01')
+
+    def test_empty(self):
+        self.assertTrue(timeline_frame([], ['a']).empty)
+        self.assertEqual(timeline_arrays([])[1].shape, (0, 0))
+
+    def test_timeline_windows(self):
+        column_data = [
+            {'columnData': [{'time': '1483228800', 'value': 10}, {'time': '1451606400', 'value': 100}]},
+            {'columnData': [{'time': '1483315200', 'value': 20, 'isPartial': True}, {'hasData': False}]},
+        ]
+        (times, values, is_partial), (other_times, other_values, _) = timeline_windows(column_data, 2)
+        self.assertEqual(times.tolist(), [1483228800, 1483315200])
+        self.assertEqual(values.tolist(), [10, 20])
+        self.assertEqual(is_partial.tolist(), [False, True])
+        self.assertEqual((other_times.tolist(), other_values.tolist()), ([1451606400], [100]))
+        # one timeframe for all items, the points are shared
+        self.assertEqual([window[1].tolist() for window in timeline_windows(self.timeline_data, 2)],
+                         [[3, 1, 0], [40, 100, 7]])
+        frames = window_frames(column_data, 'a', 3)
+        self.assertEqual(list(frames[0].columns), ['a', 'isPartial'])
+        self.assertEqual(str(frames[1].index[0].date()), '2016-01-01')
+        self.assertTrue(frames[2].empty)
+        self.assertEqual(len(window_frames([], 'a', 2)), 2)
+
+    def test_geo_timeline_frame(self):
+        first = [{'time': '1483228800', 'value': [50, 100]}, {'time': '1483315200', 'value': [50, 20]}]
+        second = [{'time': '1483228800', 'value': [100, 10]}, {'time': '1483315200', 'value': [100, 30]}]
+        df = geo_timeline_frame([(['US', 'GB'], first), (['US', 'FR'], second)], anchor='US')
+        self.assertEqual(list(df.columns), GEO_TIMELINE_COLUMNS)
+        self.assertEqual(df['geo'].tolist(), ['US', 'US', 'GB', 'GB', 'FR', 'FR'])
+        # the second payload is halved so that the anchor matches
+        self.assertEqual(df['value'].tolist(), [50, 50, 100, 20, 5, 15])
+        self.assertEqual(str(df['date'].iloc[1].date()), '2017-01-02')
+        df = geo_timeline_frame([(['US', 'GB'], first), (['FR'], [])])
+        self.assertEqual(df['value'].dtype, np.int64)
+        self.assertEqual(len(df), 4)
+        self.assertTrue(geo_timeline_frame([]).empty)
+        # geos of a batch without anchor volume could not be compared to the others
+        quiet = [{'time': '1483228800', 'value': [0, 10]}, {'time': '1483315200', 'value': [0, 30]}]
+        with self.assertRaises(ValueError):
+            geo_timeline_frame([(['US', 'GB'], first), (['US', 'FR'], quiet)], anchor='US')
+
+
+class TestLoadsTrimmed(TestCase):
+
+    content = b")]}',\n{\"default\": {\"title\": \"caf\xc3\xa9\", \"value\": [1, 2]}}\n"
+
+    def test_backends_agree(self):
+        expected = {'default': {'title': u'caf\xe9', 'value': [1, 2]}}
+        for backend in ('json', 'ujson', 'orjson'):
+            if backend != 'json' and getattr(parsing, backend) is None:
+                continue
+            self.assertEqual(loads_trimmed(self.content, 5, backend=backend), expected)
+
+    def test_extra_data(self):
+        with self.assertRaises(ValueError):
+            loads_trimmed(b'{"a": 1} x', backend='json')
+
+
+class TestGeoParsing(TestCase):
+
+    geo_map_data = [
+        {'geoCode': 'US-NY', 'geoName': 'New York', 'value': [40, 7, 1], 'hasData': [True, True, True]},
+        {'geoCode': 'US-AL', 'geoName': 'Alabama', 'value': [100, 0, 3], 'hasData': [True, False, True]},
+        {'geoCode': 'US-CA', 'geoName': 'California', 'value': [55, 9, 2], 'hasData': [True, True, True]},
+    ]
+
+    def test_geo_map_arrays(self):
+        codes, names, values = geo_map_arrays(self.geo_map_data, 2)
+        self.assertEqual(codes, ('US-NY', 'US-AL', 'US-CA'))
+        self.assertEqual(values.dtype, np.int64)
+        self.assertEqual(values.tolist(), [[40, 7], [100, 0], [55, 9]])
+        # cities come without geoCode
+        self.assertEqual(geo_map_arrays([{'geoName': 'Paris', 'value': [1]}])[0], ('',))
+
+    def test_geo_frame(self):
+        tables = GeoTables()
+        df = geo_frame(self.geo_map_data, ['a', 'b'], inc_geo_code=True, geo_tables=tables)
+        self.assertEqual(list(df.columns), ['geoCode', 'a', 'b'])
+        self.assertEqual(df.index.name, 'geoName')
+        self.assertEqual(list(df.index), ['Alabama', 'California', 'New York'])
+        self.assertEqual(df['geoCode'].tolist(), ['US-AL', 'US-CA', 'US-NY'])
+        self.assertEqual(df['a'].tolist(), [100, 55, 40])
+        self.assertEqual(list(geo_frame(self.geo_map_data, ['c'], geo_tables=tables).columns), ['c'])
+        # the geo columns of the second response were reused
+        self.assertEqual(len(tables), 1)
+        self.assertTrue(geo_frame([], ['a']).empty)
+
+    def test_geo_tables_eviction(self):
+        tables = GeoTables(max_size=2)
+        for i in range(3):
+            tables.get(('c{0}'.format(i),), ('n{0}'.format(i),))
+        self.assertEqual(len(tables), 2)
+        first = tables.get(('c2',), ('n2',))
+        self.assertIs(tables.get(('c2',), ('n2',)), first)
+
+
+class TestRelatedParsing(TestCase):
+
+    topics = {'default': {'rankedList': [
+        {'rankedKeyword': [{'topic': {'mid': '/m/1', 'title': 'One', 'type': 'Song'}, 'value': 100},
+                           {'topic': {'mid': '/m/2', 'title': 'Two', 'type': 'Band'}, 'value': 30}]},
+        {'rankedKeyword': [{'topic': {'mid': '/m/3', 'title': 'Three', 'type': 'Song'}, 'value': 250,
+                            'formattedValue': '+250%'}]}]}}
+    queries = {'default': {'rankedList': [{'rankedKeyword': [{'query': 'pizza hut', 'value': 100}]},
+                                          {'rankedKeyword': []}]}}
+
+    def test_related_frame(self):
+        df = related_frame([('a', self.topics), ('b', self.queries), ('c', {'default': {'rankedList': []}})])
+        self.assertEqual(list(df.columns), RELATED_COLUMNS)
+        self.assertEqual(df['keyword'].tolist(), ['a', 'a', 'a', 'b'])
+        self.assertEqual(df['rank_type'].tolist(), ['top', 'top', 'rising', 'top'])
+        self.assertEqual(df['rank'].tolist(), [0, 1, 0, 0])
+        self.assertEqual(df['value'].dtype, np.int64)
+        self.assertEqual(df['title'].iloc[3], 'pizza hut')
+        self.assertTrue(df[['mid', 'type']].iloc[3].isna().all())
+
+    def test_empty(self):
+        df = related_frame([])
+        self.assertTrue(df.empty)
+        self.assertEqual(list(df.columns), RELATED_COLUMNS)
@@ -0,0 +1,78 @@
+from unittest import TestCase
+
+from pytrends.exceptions import ProxyPoolExhausted
+from pytrends.proxies import ProxyPool
+from pytrends.test_fakes import FakeClock
+
+
+class TestProxyPool(TestCase):
+
+    def test_rotates_between_healthy_proxies(self):
+        clock = FakeClock(1.)
+        pool = ProxyPool(['p1', 'p2', 'p3'], clock=clock, sleep=clock.sleep)
+        chosen = []
+        for _ in range(6):
+            chosen.append(pool.choose())
+            clock.now += 1
+        self.assertEqual(chosen, ['p1', 'p2', 'p3', 'p1', 'p2', 'p3'])
+
+    def test_prefers_healthy_proxy(self):
+        clock = FakeClock(1.)
+        pool = ProxyPool(['slow', 'fast'], clock=clock, sleep=clock.sleep)
+        pool.report_success('slow', latency=3.)
+        pool.report_success('fast', latency=.2)
+        pool.report_failure('slow')
+        self.assertEqual([pool.choose() for _ in range(3)], ['fast'] * 3)
+
+    def test_cooldown_and_reinstatement(self):
+        clock = FakeClock(1.)
+        pool = ProxyPool(['p1', 'p2'], cooldown=60., clock=clock, sleep=clock.sleep)
+        pool.report_failure('p1', cooldown=True)
+        self.assertEqual(pool.available(), ['p2'])
+        pool.report_failure('p2', cooldown=True)
+        pool.report_failure('p2', cooldown=True)
+        # nothing available: waits until p1 comes back, p2 rests twice as long
+        self.assertEqual(pool.choose(), 'p1')
+        self.assertEqual(clock.now, 61.)
+        self.assertEqual(pool.available(), ['p1'])
+        clock.now = 121.
+        self.assertEqual(sorted(pool.available()), ['p1', 'p2'])
+
+    def test_empty_pool(self):
+        with self.assertRaises(ProxyPoolExhausted):
+            ProxyPool([]).choose()
+
+    def test_failing_proxies_are_dropped(self):
+        clock = FakeClock(1.)
+        pool = ProxyPool(['p1', 'p2'], max_failures=3, clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            pool.report_failure('p1', proxy_error=True)
+        self.assertEqual(pool.proxies, ['p2'])
+        # plain failures and 429s lower the score or rest the proxy but never drop it
+        for _ in range(5):
+            pool.report_failure('p2')
+            pool.report_failure('p2', cooldown=True)
+        self.assertEqual(pool.proxies, ['p2'])
+        pool.report_success('p2', latency=.5)
+        for _ in range(3):
+            pool.choose()
+            pool.report_failure('p2', proxy_error=True)
+        with self.assertRaises(ProxyPoolExhausted):
+            pool.choose()
+
+    def test_success_resets_proxy_errors(self):
+        clock = FakeClock(1.)
+        pool = ProxyPool(['p1'], cooldown=0., max_failures=2, clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            pool.report_failure('p1', proxy_error=True)
+            pool.report_success('p1', latency=.5)
+        self.assertEqual(pool.proxies, ['p1'])
+
+    def test_throttling_extends_the_cooldown(self):
+        clock = FakeClock(1.)
+        pool = ProxyPool(['p1'], cooldown=60., max_failures=2, clock=clock, sleep=clock.sleep)
+        pool.report_failure('p1', proxy_error=True)
+        pool.report_failure('p1', cooldown=True)
+        pool.report_failure('p1', cooldown=True)
+        self.assertEqual(pool.stats['p1'].cooldown_until, 241.)
+        self.assertEqual(pool.proxies, ['p1'])
@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+from pytrends.ratelimit import RateLimiter, TokenBucket
+from pytrends.test_fakes import FakeClock
+
+
+class TestTokenBucket(TestCase):
+
+    def test_reserve_spaces_requests(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=0.5, capacity=1, clock=clock)
+        self.assertEqual(bucket.reserve(), 0.)
+        self.assertEqual(bucket.reserve(), 2.)
+        self.assertEqual(bucket.reserve(), 4.)
+        clock.now = 10.
+        self.assertEqual(bucket.reserve(), 0.)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(rate=None)
+        self.assertEqual([bucket.reserve() for _ in range(10)], [0.] * 10)
+
+
+class TestRateLimiter(TestCase):
+
+    def test_acquire_waits_for_global_and_proxy(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=1., per_proxy_rate=0.25, clock=clock, sleep=clock.sleep)
+        limiter.acquire('p1')
+        limiter.acquire('p2')
+        self.assertEqual(clock.now, 1.)
+        limiter.acquire('p1')
+        self.assertEqual(clock.now, 4.)
+
+    def test_throttle_backs_off_and_recovers(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=1., max_rate=1., increase=0.25, backoff=60., backoff_factor=2.,
+                              clock=clock, sleep=clock.sleep)
+        limiter.on_throttle()
+        self.assertEqual(limiter.delay(), 60.)
+        self.assertEqual(limiter.global_bucket.rate, 0.5)
+        limiter.on_throttle()
+        self.assertEqual(limiter.delay(), 120.)
+        self.assertEqual(limiter.global_bucket.rate, 0.25)
+        limiter.acquire()
+        self.assertEqual(clock.now, 120.)
+        for _ in range(10):
+            limiter.on_success()
+        self.assertEqual(limiter.delay(), 0.)
+        # the rate climbs back but never above max_rate
+        self.assertEqual(limiter.global_bucket.rate, 1.)
+
+    def test_rate_climbs_to_max_rate(self):
+        limiter = RateLimiter(rate=0.5, per_proxy_rate=0.5, increase=0.1)
+        for _ in range(10):
+            limiter.on_success()
+            limiter.on_success('p1')
+        # one request per second at most by default
+        self.assertAlmostEqual(limiter.global_bucket.rate, 1.)
+        self.assertAlmostEqual(limiter.proxy_buckets['p1'].rate, 1.)
+        limiter = RateLimiter(rate=2., max_rate=None, increase=0.1)
+        limiter.on_success()
+        self.assertAlmostEqual(limiter.global_bucket.rate, 2.1)
+        # a rate set above max_rate is kept, not lowered
+        limiter = RateLimiter(rate=2., increase=0.1)
+        limiter.on_success()
+        self.assertEqual(limiter.global_bucket.rate, 2.)
@@ -0,0 +1,93 @@
+import json
+from unittest import TestCase
+
+from pytrends.cache import ResponseCache
+from pytrends.cookies import CookieCache
+from pytrends.exceptions import ResponseError
+from pytrends.request2 import TrendReq
+from pytrends.tokens import TokenCache
+from pytrends.test_fakes import FakeClock, FakeResponse, FakeSession
+
+
+def _explore_response(token):
+    widgets = [{'id': 'TIMESERIES', 'token': token, 'request': {'time': '2010-01-01 2010-12-31'}}]
+    return FakeResponse(content=b")]}'" + json.dumps({'widgets': widgets}).encode('utf-8'))
+
+
+def _rejected_response():
+    response = FakeResponse(status_code=400, content=b'<html></html>')
+    response.headers['Content-Type'] = 'text/html; charset=UTF-8'
+    return response
+
+
+class TestTokenCache(TestCase):
+
+    def test_key(self):
+        self.assertEqual(TokenCache.key('a', timeframe='2017-01-01 2017-01-31'),
+                         TokenCache.key(['a'], 0, '2017-01-01 2017-01-31', '', '', 'en-US', 360))
+        self.assertNotEqual(TokenCache.key(['a'], geo='US'), TokenCache.key(['a']))
+        self.assertNotEqual(TokenCache.key(['a', 'b']), TokenCache.key(['b', 'a']))
+
+    def test_expiry(self):
+        clock = FakeClock()
+        cache = TokenCache(ttl=600, clock=clock)
+        key = TokenCache.key(['a'])
+        cache.set(key, [{'id': 'TIMESERIES'}])
+        clock.now = 599
+        self.assertEqual(cache.get(key), [{'id': 'TIMESERIES'}])
+        clock.now = 600
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = TokenCache(ttl=None)
+        key = TokenCache.key(['a'])
+        cache.set(key, [])
+        self.assertIn(key, cache)
+        cache.invalidate(key)
+        self.assertNotIn(key, cache)
+
+    def test_invalidate_token(self):
+        cache = TokenCache(ttl=None)
+        cache.set(TokenCache.key(['a']), [{'id': 'TIMESERIES', 'token': 't1'}, {'id': 'GEO_MAP', 'token': 't2'}])
+        cache.set(TokenCache.key(['b']), [{'id': 'TIMESERIES', 'token': 't3'}])
+        self.assertEqual(cache.invalidate_token('t2'), [])
+        self.assertNotIn(TokenCache.key(['a']), cache)
+        self.assertIn(TokenCache.key(['b']), cache)
+
+    def test_bounded(self):
+        clock = FakeClock()
+        cache = TokenCache(ttl=10, clock=clock)
+        for idx in range(100000):
+            cache.set(TokenCache.key(['a'], timeframe=str(idx)), [])
+            clock.sleep(1)
+        # expired entries are swept out once per ttl as new ones come in
+        self.assertLessEqual(len(cache), 20)
+        cache = TokenCache(ttl=None, max_size=3)
+        for keyword in 'abc':
+            cache.set(TokenCache.key(keyword), [])
+        cache.get(TokenCache.key('a'))
+        cache.set(TokenCache.key('d'), [])
+        # the least recently used payload goes first
+        self.assertEqual([key[0][0] for key in cache._entries], ['c', 'a', 'd'])
+
+    def test_invalidate_token_returns_explore_params(self):
+        cache = TokenCache(ttl=None)
+        cache.set(TokenCache.key(['a']), [{'id': 'TIMESERIES', 'token': 't1'}], {'req': 'a'})
+        cache.set(TokenCache.key(['b']), [{'id': 'TIMESERIES', 'token': 't1'}])
+        self.assertEqual(cache.invalidate_token('t1'), [{'req': 'a'}])
+        self.assertEqual(len(cache), 0)
+
+
+class TestRejectedToken(TestCase):
+
+    def test_explore_again_with_response_cache(self):
+        session = FakeSession([_explore_response('t1'), _rejected_response(), _explore_response('t2')])
+        trends = TrendReq(session=session, cookie_cache=CookieCache(), cache=ResponseCache(':memory:'),
+                          token_cache=TokenCache())
+        trends.build_payload(['a'], timeframe='2010-01-01 2010-12-31')
+        self.assertRaises(ResponseError, trends.interest_over_time)
+        # neither the token cache nor the cached explore response hand out the refused token again
+        trends.build_payload(['a'], timeframe='2010-01-01 2010-12-31')
+        self.assertEqual(trends.interest_over_time_widget['token'], 't2')
+        self.assertEqual(session.responses, [])
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from pytrends.crawler import match_song
+from pytrends.topics import TopicIndex, TopicResolver
+
+SONG = {'mid': '/m/0abc', 'title': 'Rolling in the Deep', 'type': 'Song by Adele'}
+
+
+class TestTopicIndex(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'topics', 'index.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_key(self):
+        self.assertEqual(TopicIndex.key('Adele - Rolling  in the Deep (Live)'), 'adele rolling in the deep')
+
+    def test_persisted_across_runs(self):
+        index = TopicIndex(self.path)
+        index.set('Adele - Rolling in the Deep', SONG)
+        index.set('nobody - nothing', None)
+        index.close()
+        with open(self.path, 'a') as index_file:
+            index_file.write('{"q": "cut sh')
+        index = TopicIndex(self.path)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.get('adele - rolling in the deep'), SONG)
+        # a miss is remembered too
+        self.assertIn('Nobody - Nothing', index)
+        self.assertIsNone(index.get('nobody - nothing', default='missing'))
+        self.assertEqual(index.get('someone - else', default='missing'), 'missing')
+        index.close()
+
+
+class TestTopicResolver(TestCase):
+
+    def test_autocomplete_first(self):
+        calls = []
+
+        def suggest(query):
+            calls.append(('suggest', query))
+            time.sleep(.01)
+            return [{'mid': '/g/11x', 'title': 'Adele', 'type': 'Singer'}, SONG]
+
+        def related(query):
+            calls.append(('related', query))
+            return []
+
+        resolver = TopicResolver(suggest, related, match=match_song)
+        threads = [threading.Thread(target=resolver.resolve, args=('adele - rolling in the deep',))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # duplicates in flight wait for the first lookup
+        self.assertEqual(calls, [('suggest', 'adele rolling in the deep')])
+        self.assertEqual(resolver.resolve('Adele - Rolling in the Deep'), SONG)
+
+    def test_related_fallback(self):
+        calls = []
+        resolver = TopicResolver(lambda query: calls.append('suggest') or [],
+                                 lambda query: calls.append(query) or [dict(SONG, value=100)], match=match_song)
+        self.assertEqual(resolver.resolve('x - y', related_query='"x" "y"')['mid'], '/m/0abc')
+        self.assertEqual(calls, ['suggest', '"x" "y"'])
+        resolver = TopicResolver(lambda query: [], None)
+        self.assertIsNone(resolver.resolve('x - y'))
+        self.assertIn('x - y', resolver.index)
@@ -0,0 +1,94 @@
+import json
+from unittest import TestCase
+
+import requests
+
+from pytrends.exceptions import ResponseError
+from pytrends.trending import TrendingPoller
+from pytrends.test_fakes import FakeClock
+
+
+class TestTrendingPoller(TestCase):
+
+    def setUp(self):
+        self.lists = {'united_states': ['a', 'b', 'c'], 'japan': ['x', 'y'], 'india': ['i']}
+        self.error = None
+        self.not_modified = False
+        self.validators = []
+        self.errors = []
+
+    def fetch(self, validators):
+        self.validators.append(validators)
+        if self.error is not None:
+            raise self.error
+        if self.not_modified:
+            return None, validators
+        lists = {region: entries for region, entries in self.lists.items() if entries is not None}
+        return json.dumps(lists).encode('utf-8'), {'ETag': '"{0}"'.format(len(self.validators))}
+
+    def test_diffs(self):
+        poller = TrendingPoller(self.fetch, ['united_states', 'japan'])
+        changes = poller.poll()
+        self.assertEqual([(change['region'], change['added'], change['removed']) for change in changes],
+                         [('united_states', ['a', 'b', 'c'], []), ('japan', ['x', 'y'], [])])
+        # the same body is dropped before parsing
+        self.assertEqual(poller.poll(), [])
+        self.assertEqual(poller.num_unchanged, 2)
+        self.lists['united_states'] = ['d', 'a', 'c']
+        self.lists['japan'] = None
+        changes = poller.poll()
+        self.assertEqual([(change['region'], change['added'], change['removed'], change['size'])
+                          for change in changes], [('united_states', ['d'], ['b'], 3)])
+        self.assertEqual(poller.num_missing, 1)
+        # a region missing from a body keeps its list, only reordered lists report nothing
+        self.lists['japan'] = ['y', 'x']
+        self.assertEqual(poller.poll(), [])
+        # one body per cycle, whatever the number of regions
+        self.assertEqual(len(self.validators), 4)
+
+    def test_conditional_fetch(self):
+        poller = TrendingPoller(self.fetch, ['united_states', 'japan'])
+        poller.poll()
+        self.not_modified = True
+        self.assertEqual(poller.poll(), [])
+        self.assertEqual(poller.num_unchanged, 2)
+        # every request carries the validators of the last response
+        self.assertEqual(self.validators, [None, {'ETag': '"1"'}])
+        self.not_modified = False
+        self.lists['japan'] = ['x']
+        self.assertEqual(poller.poll()[0]['removed'], ['y'])
+
+    def test_failures(self):
+        with self.assertRaises(ValueError):
+            TrendingPoller(self.fetch, ['united_states', 'atlantis'])
+        poller = TrendingPoller(self.fetch, ['united_states'], on_error=self.errors.append)
+        poller.poll()
+        failures = [ResponseError('The request failed: Google returned a response with code 429.', response=None),
+                    requests.exceptions.ConnectionError('connection dropped'),
+                    requests.exceptions.ProxyError('proxy down')]
+        for error in failures:
+            self.error = error
+            self.assertEqual(poller.poll(), [])
+        self.assertEqual(self.errors, failures)
+        self.assertEqual(poller.num_failed, 3)
+        self.error = None
+        self.lists['united_states'] = ['a', 'b']
+        self.assertEqual(poller.poll()[0]['removed'], ['c'])
+        # without a hook the failure goes to the caller
+        poller = TrendingPoller(self.fetch, ['united_states'])
+        self.error = requests.exceptions.ConnectionError('connection dropped')
+        self.assertRaises(requests.exceptions.ConnectionError, poller.poll)
+
+    def test_stream(self):
+        clock = FakeClock()
+        poller = TrendingPoller(self.fetch, ['united_states'], interval=60, clock=clock, sleep=clock.sleep,
+                                on_error=self.errors.append)
+        stream = poller.stream(max_cycles=3)
+        self.assertEqual(next(stream)['added'], ['a', 'b', 'c'])
+        self.lists['united_states'] = ['a', 'b']
+        self.assertEqual(next(stream)['removed'], ['c'])
+        self.error = requests.exceptions.ConnectionError('connection dropped')
+        self.assertEqual(list(stream), [])
+        self.assertEqual(clock.sleeps, [60., 60.])
+        self.assertEqual(len(self.validators), 3)
+        self.assertEqual(self.errors, [self.error])
@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+import numpy as np
+
+from pytrends.utils import (TopicMatcher, _remove_version, calendar_days, match_topic, normalize, reformat,
+                            reformat_all, rescale_by_month_weights)
+
+
+class TestCalendarDays(TestCase):
+
+    def test_calendar_days(self):
+        self.assertEqual(calendar_days('2015-07-01', '2016-02-29'), [31, 31, 30, 31, 30, 31, 31, 29])
+        self.assertEqual(calendar_days('2016-12-15', '2017-01-03'), [17, 3])
+        self.assertEqual(calendar_days('2017-06-30', '2017-06-30'), [1])
+        self.assertEqual(calendar_days('2017-06-30', '2017-06-01'), [])
+
+
+class TestRescale(TestCase):
+
+    def test_rescale_by_month_weights(self):
+        raw = [1] * 31 + [0] * 28 + [2] * 31
+        scaled = rescale_by_month_weights(raw, [62, 50, 31], '2017-01-01', '2017-03-31')
+        np.testing.assert_allclose(scaled, [2.] * 31 + [0.] * 28 + [1.] * 31)
+
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            rescale_by_month_weights([1] * 30, [1], '2017-01-01', '2017-01-31')
+
+
+class TestReformat(TestCase):
+
+    def test_reformat(self):
+        self.assertEqual(reformat('Florence + The Machine - Shake It Out (Official Video)'),
+                         'Florence and The Machine Shake It Out')
+        self.assertEqual(reformat('Adele’s "Rolling in the Deep": $ Remastered!'),
+                         'Adele Rolling in the Deep s Remastered')
+        self.assertEqual(reformat('a + b+c'), 'a and b+c')
+        self.assertEqual(reformat('(Live) Hello [2015]'), 'Hello')
+        self.assertEqual(_remove_version('a) b'), 'a')
+        self.assertEqual(_remove_version('“Intro” Song (feat. X)'), 'Song')
+        self.assertEqual(reformat_all(['a.b', 'c', 'a.b']), ['a b', 'c', 'a b'])
+        self.assertEqual(normalize('  Shake  IT out! '), 'shake it out')
+
+
+class TestTopicMatcher(TestCase):
+
+    topics = [{'mid': '/m/1', 'title': 'Adele', 'type': 'Singer', 'value': 100},
+              {'mid': '/m/2', 'title': 'Rolling in the Deep (Live)', 'type': 'Song by Adele and Friends', 'value': 10},
+              {'mid': '/m/3', 'title': 'Rolling in the Deep', 'type': 'Song by Adele', 'value': 5},
+              {'mid': '/m/4', 'title': 'Hello', 'type': 'Song by Adele', 'value': 50}]
+
+    def test_match(self):
+        matcher = TopicMatcher(self.topics)
+        self.assertEqual(matcher.match('adele - rolling in the deep')['mid'], '/m/2')
+        # artist and title are contained as substrings, whatever the case and punctuation
+        self.assertEqual(matcher.match('Adele - Roll')['mid'], '/m/2')
+        self.assertEqual(matcher.match('adel - deep (live)')['mid'], '/m/2')
+        self.assertEqual(matcher.match('friends - in the deep')['mid'], '/m/2')
+        # popular songs match anyway
+        self.assertEqual(matcher.match('other - deep')['mid'], '/m/4')
+        self.assertIsNone(matcher.match('other - deep', min_value=60))
+        self.assertIsNone(matcher.match('adele - rolling on', min_value=60))
+
+    def test_index_agrees_with_scan(self):
+        matcher = TopicMatcher(self.topics)
+        for keyword in ('adele - rolling in the deep', 'adele - roll', 'adele - ll', 'adele - ', 'a - hell',
+                        'adele - hello there', 'adele and - deep', 'x - deep'):
+            for min_value in (0, 40, 60):
+                self.assertEqual(matcher.match(keyword, min_value), match_topic(keyword, self.topics, min_value))
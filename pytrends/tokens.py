@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide cache of the widgets and tokens returned by the explore endpoint.
+
+Every data request needs the token of a widget, and build_payload fetches them with one explore request per
+payload. Payloads repeated within the token lifetime, or prefetched in bulk with TrendReq.prefetch_tokens, reuse
+the cached widgets and go straight to the data request.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# widget request statuses meaning google refused the token itself, 429 only asks to slow down
+TOKEN_REJECTED_CODES = tuple(code for code in range(400, 500) if code != 429)
+
+
+class TokenCache(object):
+    """ Thread-safe cache of explore widgets with a time to live, bounded to the max_size most recently used
+    payloads.
+
+    Entries are keyed by the payload: keyword list, category, timeframe, geo and google property, plus the language
+    and timezone the widgets were requested in. Expired entries are swept out by set() once per ttl, so a long crawl
+    through the process-wide cache keeps at most the tokens of the last ttl seconds.
+    """
+
+    def __init__(self, ttl=600, max_size=10000, clock=time.monotonic):
+        """ :param ttl: seconds a token is reused, None keeps it until invalidated or evicted
+        :param max_size: most payloads kept, the least recently used are evicted first, None for no bound
+        :param clock: monotonic clock returning seconds
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._purged = clock()
+
+    @staticmethod
+    def key(kw_list, cat=0, timeframe='today 5-y', geo='', gprop='', hl='en-US', tz=360):
+        """ Cache key of a payload, kw_list may be a list of keywords or a single keyword.
+        """
+        if isinstance(kw_list, str):
+            kw_list = [kw_list]
+        return tuple(kw_list), cat, timeframe, geo, gprop, hl, tz
+
+    def get(self, key):
+        """ Return the widgets stored under key, None if missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, self.clock()):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, widgets, params=None):
+        """ Store the widgets of a payload.
+
+        :param params: parameters of the explore request the widgets came from, returned by invalidate_token
+        """
+        with self._lock:
+            now = self.clock()
+            self._entries[key] = (now, widgets, params)
+            self._entries.move_to_end(key)
+            if self.ttl is not None and now - self._purged >= self.ttl:
+                self._purge(now)
+            while self.max_size is not None and len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry[0] >= self.ttl
+
+    def _purge(self, now):
+        for key in [key for key, entry in self._entries.items() if self._expired(entry, now)]:
+            del self._entries[key]
+        self._purged = now
+
+    def invalidate(self, key):
+        """ Drop the widgets stored under key, e.g. after google refused one of their tokens.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_token(self, token):
+        """ Drop every entry holding a widget with this token, for requests that only know the token.
+
+        :return: explore request parameters of the dropped entries that were stored with them, so that a response
+            cache can drop the explore responses holding the token as well
+        """
+        with self._lock:
+            keys = [key for key, (_, widgets, _) in self._entries.items()
+                    if any(widget.get('token') == token for widget in widgets)]
+            return [params for params in (self._entries.pop(key)[2] for key in keys) if params is not None]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# shared by every crawler that is not given its own cache
+DEFAULT_TOKEN_CACHE = TokenCache()
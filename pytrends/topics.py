@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Resolver of search terms to google topics (mid, title, type), backed by a persistent local index.
+
+A term is first looked up with the autocomplete endpoint, a single light request, and only when none of its
+suggestions matches with the related topics of a full explore payload. Every answer, misses included, is stored in the
+index under the normalised term, so that a term, or any spelling of it normalising to the same key, costs network
+requests once across records and across runs.
+"""
+
+import json
+import os
+import threading
+
+from pytrends.utils import normalize
+
+
+class TopicIndex(object):
+    """ Thread-safe map of normalised search terms to their topic, None when no topic matched.
+
+    Entries are persisted as an append-only log of json lines {"q": key, "t": topic}, read back when the index is
+    opened; the last entry of a key wins. Without a path the index only lives in memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = dict()
+        self._locks = dict()
+        self._lock = threading.Lock()
+        self._log = None
+        if path is not None:
+            if os.path.exists(path):
+                self._load()
+            elif os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._log = open(path, 'a')
+
+    # lower case, without punctuation, versions in parentheses nor double spaces
+    key = staticmethod(normalize)
+
+    def _load(self):
+        with open(self.path, 'r') as index_file:
+            for line in index_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line may be cut short by a crash
+                    continue
+                self._entries[entry['q']] = entry['t']
+
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def get(self, query, default=None):
+        """ Topic of query, None if no topic matched, default if query was never resolved.
+        """
+        return self._entries.get(self.key(query), default)
+
+    def set(self, query, topic):
+        key = self.key(query)
+        with self._lock:
+            self._entries[key] = topic
+            if self._log is not None:
+                self._log.write('{0}\n'.format(json.dumps({'q': key, 't': topic}, separators=(',', ':'))))
+                self._log.flush()
+
+    def resolve(self, query, fetch):
+        """ Return the topic of query, calling fetch() to find it if query was never resolved.
+
+        :param fetch: callable returning the topic dict, or None if there is none
+        :return: the topic dict or None
+        """
+        key = self.key(query)
+        if key in self._entries:
+            return self._entries[key]
+        # only one thread resolves a given key, others wait and reuse its answer
+        with self._key_lock(key):
+            if key in self._entries:
+                return self._entries[key]
+            topic = fetch()
+            self.set(query, topic)
+            return topic
+
+    def __contains__(self, query):
+        return self.key(query) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def first_topic(query, topics):
+    """ Default matcher of TopicResolver, the first topic if any.
+    """
+    return topics[0] if topics else None
+
+
+class TopicResolver(object):
+    """ Resolve search terms to topics with autocomplete first and related topics as a fallback, see the module
+    docstring.
+    """
+
+    def __init__(self, suggest, related=None, index=None, match=first_topic):
+        """ :param suggest: callable(term) returning the autocomplete topics of a term, e.g. TrendReq.suggestions
+        :param related: callable(term) returning the related topics of a term, None never falls back
+        :param index: TopicIndex holding the resolved terms, defaults to one in memory
+        :param match: callable(term, topics) picking the topic of term among topics, or None
+        """
+        self.suggest = suggest
+        self.related = related
+        self.index = index if index is not None else TopicIndex()
+        self.match = match
+
+    def resolve(self, query, related_query=None):
+        """ Topic of query, None if neither autocomplete nor related topics have a match.
+
+        :param related_query: term the related topics are requested for, defaults to query
+        """
+        return self.index.resolve(query, lambda: self._lookup(query, related_query or query))
+
+    def _lookup(self, query, related_query):
+        topic = self.match(query, self.suggest(self.index.key(query)))
+        if topic is None and self.related is not None:
+            topic = self.match(query, self.related(related_query))
+        return topic
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Poller of trending searches turning the full lists of many regions into a stream of changes.
+
+Google answers the hot searches of every region in one body, so every cycle fetches that body once. The request is
+conditional on the ETag and Last-Modified of the previous body, and a 304 or a body hashing to the same digest as the
+previous one ends the cycle before any parsing. A changed body is split by region, lists equal to their previous
+version are dropped, and only the entries added to and removed from the others are emitted, so consumers never
+reprocess full lists.
+
+Example:
+poller = TrendingPoller(TrendReq().trending_body, ['united_states', 'japan'], interval=300)
+for change in poller.stream():
+    print(change['region'], change['added'], change['removed'])
+"""
+
+import hashlib
+import json
+import time
+
+import requests
+
+from pytrends import exceptions
+from pytrends.parsing import loads_trimmed
+
+# regions of the hot searches payload
+REGIONS = ('argentina', 'australia', 'austria', 'belgium', 'brazil', 'canada', 'chile', 'colombia',
+           'czech_republic', 'denmark', 'egypt', 'finland', 'france', 'germany', 'greece', 'hong_kong', 'hungary',
+           'india', 'indonesia', 'israel', 'italy', 'japan', 'kenya', 'malaysia', 'mexico', 'netherlands',
+           'new_zealand', 'nigeria', 'norway', 'philippines', 'poland', 'portugal', 'romania', 'russia',
+           'saudi_arabia', 'singapore', 'south_africa', 'south_korea', 'sweden', 'switzerland', 'taiwan', 'thailand',
+           'turkey', 'ukraine', 'united_kingdom', 'united_states', 'vietnam')
+
+
+def _key(entry):
+    """ Hashable form of an entry, strings or json objects.
+    """
+    return entry if isinstance(entry, str) else json.dumps(entry, sort_keys=True)
+
+
+class TrendingPoller(object):
+    """ Poll the trending searches of many regions and emit what changed, see the module docstring.
+
+    Changes are dicts {'region': ..., 'added': [...], 'removed': [...], 'size': number of entries, 'time': unix
+    seconds}, added entries in the order of the list. The first cycle reports every entry as added. A failed cycle
+    leaves every region with its last list, the failure is passed to on_error, or raised if there is none.
+    """
+
+    def __init__(self, fetch, regions, interval=300, clock=time.monotonic, sleep=time.sleep, known_regions=REGIONS,
+                 on_error=None):
+        """ :param fetch: callable(validators) returning the raw body of the trending entries of every region, a json
+            object of lists keyed by region, and the validators of its response. The body is None when the
+            validators of the previous response show it did not change, e.g. TrendReq.trending_body
+        :param regions: regions to poll
+        :param interval: seconds between the starts of two cycles
+        :param clock: monotonic clock returning seconds
+        :param sleep: function waiting a number of seconds
+        :param known_regions: regions google answers for, regions outside of them are rejected
+        :param on_error: callable(exception) receiving the failure of a cycle, polling goes on after it returns
+        """
+        unknown = [region for region in regions if region not in known_regions]
+        if unknown:
+            raise ValueError('Unknown trending regions: {0}'.format(', '.join(map(repr, unknown))))
+        self.fetch = fetch
+        # unique, in the order given
+        self.regions = list(dict.fromkeys(regions))
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.on_error = on_error
+        # validators and digest of the last body, region -> last list seen
+        self._validators = None
+        self._digest = None
+        self._last = dict()
+        self.num_fetched = 0
+        self.num_unchanged = 0
+        self.num_failed = 0
+        self.num_missing = 0
+
+    def _fetch(self):
+        """ Parsed body of the cycle, None if it did not change since the last cycle.
+        """
+        body, validators = self.fetch(self._validators)
+        body_digest = None if body is None else hashlib.sha1(body).digest()
+        if body is not None and body_digest != self._digest:
+            lists = loads_trimmed(body)
+            self._digest = body_digest
+        else:
+            lists = None
+        self._validators = validators
+        return lists
+
+    def poll(self):
+        """ Fetch the lists of every region once and return the list of changes.
+        """
+        try:
+            lists = self._fetch()
+        except (exceptions.ResponseError, requests.exceptions.RequestException, ValueError) as e:
+            # every region keeps its last list and is fetched again next cycle
+            self.num_failed += 1
+            if self.on_error is None:
+                raise
+            self.on_error(e)
+            return []
+        if lists is None:
+            # a 304 or the same body as the last cycle
+            self.num_unchanged += len(self.regions)
+            return []
+        now = time.time()
+        changes = []
+        for region in self.regions:
+            entries = lists.get(region)
+            if not isinstance(entries, list):
+                # missing from this body, the region keeps its last list
+                self.num_missing += 1
+                continue
+            self.num_fetched += 1
+            last_entries = self._last.get(region, [])
+            if entries == last_entries:
+                self.num_unchanged += 1
+                continue
+            self._last[region] = entries
+            current, previous = set(map(_key, entries)), set(map(_key, last_entries))
+            added = [entry for entry in entries if _key(entry) not in previous]
+            removed = [entry for entry in last_entries if _key(entry) not in current]
+            if added or removed:
+                changes.append({'region': region, 'added': added, 'removed': removed, 'size': len(entries),
+                                'time': now})
+        return changes
+
+    def stream(self, max_cycles=None):
+        """ Yield the changes of every cycle as they come, polling every interval seconds.
+
+        :param max_cycles: stop after this many cycles, None polls forever
+        """
+        cycle = 0
+        while max_cycles is None or cycle < max_cycles:
+            start = self.clock()
+            for change in self.poll():
+                yield change
+            cycle += 1
+            if max_cycles is None or cycle < max_cycles:
+                self.sleep(max(0., self.interval - (self.clock() - start)))
@@ -4,60 +4,198 @@ Helper functions in pytrends.
 """
 
 import re
-from datetime import datetime, timedelta
-from collections import Counter
+from calendar import monthrange
+from datetime import datetime
+
+import numpy as np
 # import matplotlib.pyplot as plt
 # import matplotlib.dates as mdates
 
 
+# characters reformat turns into a space, '$' reads as an 's'
+_REFORMAT_TABLE = str.maketrans(dict({ch: ' ' for ch in '"!*.:‐-’\'/'}, **{'$': 's'}))
+_SPACES = re.compile(' +')
+# opening and closing brackets of versions, like '(live)' or '[remix]'
+_BRACKETS = re.compile(r'([()\[\]“”])')
+_OPENING_BRACKETS = frozenset('([“')
+
+
 def reformat(text):
     # remove punctuations and double whitespace
-    text = _remove_version(text)
-    for ch in ["’s", '"', '!', "*", '.', ':', '‐', '-', "’", "'", '/']:
-            text = text.replace(ch, ' ')
-    text = text.replace('$', 's')
+    text = _remove_version(text).replace("’s", ' ').translate(_REFORMAT_TABLE)
     for ch in ["+", "&"]:
+        if ch not in text:
+            continue
         if ' {0} '.format(ch) in text:
             text = text.replace(' {0} '.format(ch), ' and ')
-        elif ch in text:
+        else:
             text = text.replace(ch, ' and ')
-    return re.sub(' +', ' ', text).strip()
+    return _SPACES.sub(' ', text).strip()
+
+
+def reformat_all(texts):
+    """ reformat every text of a list, each distinct text once.
+    """
+    done = dict()
+    return [done[text] if text in done else done.setdefault(text, reformat(text)) for text in texts]
+
+
+def normalize(text):
+    """ Lower case reformat of text, words separated by single spaces.
+    """
+    return ' '.join(reformat(text.lower()).split())
 
 
 def _remove_version(text):
     """ Remove texts within parentheses and brackets.
     """
     text = text.replace('"', '')
-    ret = ''
+    pieces = _BRACKETS.split(text)
+    if len(pieces) == 1:
+        return text.strip()
+    # pieces alternate between text and a single bracket
+    kept = []
+    has_text = False
     cnt = 0
-    for ch in text:
-        if ch == '(' or ch == '[' or ch == '“':
-            if len(ret.strip()) == 0:
-                cnt += 1
-            else:
-                return ret.strip()
-        elif ch == ')' or ch == ']' or ch == '”':
+    for idx, piece in enumerate(pieces):
+        if idx % 2 == 0:
+            if cnt == 0 and piece:
+                kept.append(piece)
+                has_text = has_text or not piece.isspace()
+        elif piece in _OPENING_BRACKETS:
+            if has_text:
+                return ''.join(kept).strip()
+            cnt += 1
+        else:
             cnt -= 1
-        elif cnt == 0:
-            ret += ch
-    return ret.strip()
+    return ''.join(kept).strip()
+
+
+def _split_keyword(keyword):
+    """ Normalised (artist, title) of an 'artist - title' keyword.
+    """
+    artist, title = keyword.split(' - ', 1)
+    return normalize(artist), normalize(title)
+
+
+def _trigrams(text):
+    """ Distinct runs of three characters of text, empty for shorter texts.
+    """
+    return {text[idx:idx + 3] for idx in range(len(text) - 2)}
+
+
+def _song(topic):
+    """ Normalised (artist, title) of a song topic, whose type is 'Song by <artist>', None for other topics.
+    """
+    if not topic['type'].startswith('Song by'):
+        return None
+    return normalize(topic['type'][8:]), normalize(topic['title'])
+
+
+def match_topic(keyword, topics, min_value=40):
+    """ First song of topics that is scored above min_value or whose artist and title contain those of keyword, None
+    if there is none. Artists and titles are normalised, so containment ignores case, punctuation and spacing, and
+    a part of a word matches: 'adele - roll' matches 'Rolling in the Deep' by Adele. Autocomplete suggestions have no
+    value and must match.
+
+    Every song is compared once, see TopicMatcher to match many keywords against the same topics.
+    """
+    artist, title = _split_keyword(keyword)
+    for topic in topics:
+        song = _song(topic)
+        if song is not None and (topic.get('value', 0) > min_value or artist in song[0] and title in song[1]):
+            return topic
+    return None
+
+
+class TopicMatcher(object):
+    """ Song topics indexed by the trigrams of their normalised title, to match many 'artist - title' keywords against
+    the same topics without comparing every keyword with every topic.
+
+    match gives the topic match_topic would. Only the songs holding every trigram of the keyword title can contain
+    it, so only those are compared.
+    """
+
+    def __init__(self, topics):
+        """ :param topics: list of topic dicts with title and type, plus value for related topics
+        """
+        self.topics = list(topics)
+        # position -> (artist, title)
+        self._songs = dict()
+        # trigram of a song title -> positions of the songs
+        self._postings = dict()
+        for idx, topic in enumerate(self.topics):
+            song = _song(topic)
+            if song is None:
+                continue
+            self._songs[idx] = song
+            for trigram in _trigrams(song[1]):
+                self._postings.setdefault(trigram, set()).add(idx)
+        # positions of the songs, in the order of the topics
+        self._positions = sorted(self._songs)
+
+    def _candidates(self, title):
+        trigrams = _trigrams(title)
+        if not trigrams:
+            return set(self._songs)
+        postings = sorted((self._postings.get(trigram, set()) for trigram in trigrams), key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def match(self, keyword, min_value=40):
+        """ First song, in the order of the topics, that matches keyword or is scored above min_value, None if
+        there is none, see match_topic.
+        """
+        artist, title = _split_keyword(keyword)
+        matches = [idx for idx in self._candidates(title)
+                   if artist in self._songs[idx][0] and title in self._songs[idx][1]]
+        popular = (idx for idx in self._positions if self.topics[idx].get('value', 0) > min_value)
+        first = min(matches + [next(popular, len(self.topics))])
+        return self.topics[first] if first < len(self.topics) else None
 
 
 def calendar_days(start_date, end_date):
+    """ Number of days of each calendar month between two 'YYYY-MM-DD' dates, both ends inclusive.
+    """
     start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
     end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
 
-    num_days = (end_date_obj - start_date_obj).days + 1
-    full_days_obj = [start_date_obj + timedelta(days=di) for di in range(num_days)]
-    full_days_str = [datetime.strftime(x, '%Y-%m') for x in full_days_obj]
-
     ret = []
-    c = Counter(full_days_str)
-    for k in sorted(c.keys()):
-        ret.append(c[k])
+    year, month, first_day = start_date_obj.year, start_date_obj.month, start_date_obj.day
+    while (year, month) <= (end_date_obj.year, end_date_obj.month):
+        if (year, month) == (end_date_obj.year, end_date_obj.month):
+            last_day = end_date_obj.day
+        else:
+            last_day = monthrange(year, month)[1]
+        if last_day >= first_day:
+            ret.append(last_day - first_day + 1)
+        year, month, first_day = year + month // 12, month % 12 + 1, 1
     return ret
 
 
+def rescale_by_month_weights(raw_interest, month_weights, start_date, end_date):
+    """ Rescale daily interest so that the days of each month sum up to that month's weight.
+
+    :param raw_interest: daily interest from start_date to end_date, both ends inclusive
+    :param month_weights: one weight per calendar month of the period, e.g. its monthly interest
+    :param start_date: first day, 'YYYY-MM-DD'
+    :param end_date: last day, 'YYYY-MM-DD'
+    :return: a numpy array of scaled daily interest, days of months without interest are 0
+    """
+    days_in_month = np.array(calendar_days(start_date, end_date))
+    raw_interest = np.asarray(raw_interest, dtype=float)
+    if len(raw_interest) != days_in_month.sum():
+        raise ValueError('Expected {0} days of interest, got {1}'.format(days_in_month.sum(), len(raw_interest)))
+    if len(raw_interest) == 0:
+        return raw_interest
+
+    # total interest of each month, then one scale factor per day
+    month_starts = np.concatenate(([0], np.cumsum(days_in_month)[:-1]))
+    monthly_total_interest = np.add.reduceat(raw_interest, month_starts)
+    month_factor = np.divide(np.asarray(month_weights, dtype=float), monthly_total_interest,
+                             out=np.zeros(len(days_in_month)), where=monthly_total_interest != 0)
+    return raw_interest * np.repeat(month_factor, days_in_month)
+
+
 def diff_month(end_date_obj, start_date_obj):
     return (end_date_obj.year - start_date_obj.year) * 12 + end_date_obj.month - start_date_obj.month
 
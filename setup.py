@@ -28,6 +28,7 @@ setup(
         'License :: OSI Approved :: MIT License'
         ],
     install_requires=["requests", "pandas", 'lxml', 'numpy'],
+    extras_require={'fast': ['orjson']},
     keywords='google trends api search',
     packages=['pytrends'],
 )